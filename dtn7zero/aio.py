@@ -0,0 +1,156 @@
+"""
+DTN7-Zero asyncio API (CPython only)
+
+The asyncio counterpart of dtn7zero.api: the bundle protocol agent runs as task of the event loop,
+endpoints are awaited or iterated instead of polled or called back.
+
+    endpoint = await setup('dtn://node1/')
+    echo = register('echo')
+
+    async for payload, full_source_uri, full_destination_uri, primary_block in echo:
+        echo.send(payload, full_source_uri)
+"""
+import asyncio
+from typing import Optional, List, Tuple
+
+from dtn7zero.async_bundle_protocol_agent import AsyncBundleProtocolAgent
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters.async_mtcp import AsyncMTcpCLA
+from dtn7zero.data import Node
+from dtn7zero.endpoints import LocalEndpoint, LocalGroupEndpoint
+from dtn7zero.routers.simple_epidemic_router import SimpleEpidemicRouter
+from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
+from py_dtn7.bundle import Bundle, PrimaryBlock
+
+
+BPA: Optional[AsyncBundleProtocolAgent] = None
+MTCP_CLA: Optional[AsyncMTcpCLA] = None
+
+
+class _AsyncReceiver:
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def _queueing_callback(self, bundle: Bundle):
+        self._queue.put_nowait((bundle.payload_block.data, bundle.primary_block.full_source_uri, bundle.primary_block.full_destination_uri, bundle.primary_block))
+
+    async def receive(self) -> Tuple[bytes, str, str, PrimaryBlock]:
+        """ waits for the next payload(message)
+
+        use pythons value unpacking feature with the methods' signature like so:
+
+        payload, full_source_uri, full_destination_uri, primary_block = await my_endpoint.receive()
+        """
+        return await self._queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Tuple[bytes, str, str, PrimaryBlock]:
+        return await self.receive()
+
+
+class AsyncEndpoint(_AsyncReceiver):
+
+    def __init__(self, service_name: str):
+        super().__init__()
+        self._endpoint = LocalEndpoint(service_name, self._queueing_callback)
+
+    def send(self, payload: bytes, full_destination_address: str, anonymous: bool = False) -> str:
+        """ sends a payload(message) to the specified node_id and service_name, returns the bundle id
+        """
+        return self._endpoint.start_transmission(payload, full_destination_address, anonymous=anonymous)
+
+
+class AsyncGroupEndpoint(_AsyncReceiver):
+
+    def __init__(self, full_group_uri: str):
+        super().__init__()
+        self._endpoint = LocalGroupEndpoint(full_group_uri, self._queueing_callback)
+
+
+async def setup(full_node_uri: str) -> AsyncEndpoint:
+    """ initializes and starts the asyncio bundle protocol agent and returns the node-central endpoint
+
+    full_node_uri examples:
+            dtn addressing scheme -> "dtn://node1/", "dtn://cool-node/"  # '/' at the end is mandatory
+            ipn addressing scheme -> "ipn://12", "ipn://24.25"  # will be joined with the endpoints via '.'
+
+    call only once, from within the running event loop!
+    """
+    global BPA
+    global MTCP_CLA
+
+    if BPA is not None:
+        raise Exception('setup(node_id) was called twice!')
+
+    storage = SimpleInMemoryStorage()
+    MTCP_CLA = AsyncMTcpCLA()
+    router = SimpleEpidemicRouter({CONFIGURATION.IPND.IDENTIFIER_MTCP: MTCP_CLA}, storage)
+    BPA = AsyncBundleProtocolAgent(full_node_uri, storage, router)
+
+    await MTCP_CLA.start(BPA.wake_up)
+    await BPA.start()
+
+    # node specific endpoint works like a normal endpoint (only receives exactly matched bundles), but for the node itself
+    endpoint = AsyncEndpoint('')
+    BPA.register_endpoint(endpoint._endpoint)
+
+    return endpoint
+
+
+def register(endpoint_identifier: str) -> AsyncEndpoint:
+    """ registers an endpoint at the bundle protocol agent over which you can send/receive bundles(messages)
+
+    endpoint_identifier examples:
+        dtn addressing scheme -> "echo", "echo/subecho"
+        ipn addressing scheme -> "12", "24.15.16"
+    """
+    if BPA is None:
+        raise Exception('setup(node_id) was not called!')
+
+    endpoint = AsyncEndpoint(endpoint_identifier)
+    BPA.register_endpoint(endpoint._endpoint)
+
+    return endpoint
+
+
+def register_group(full_group_uri: str) -> AsyncGroupEndpoint:
+    """ registers a group-endpoint at the bundle protocol agent over which you can receive group-addressed bundles
+
+    full_group_uri examples:
+        "dtn://news/~sport", "dtn://my-group/interesting/new/~topics"
+    """
+    if BPA is None:
+        raise Exception('setup(node_id) was not called!')
+
+    endpoint = AsyncGroupEndpoint(full_group_uri)
+    BPA.register_group_endpoint(endpoint._endpoint)
+
+    return endpoint
+
+
+def discover() -> List[Node]:
+    """ returns a list of all currently known other nodes in the local network
+    """
+    if BPA is None:
+        raise Exception('setup(node_id) was not called!')
+
+    return list(BPA.storage.get_nodes())
+
+
+async def shutdown():
+    """ stops the bundle protocol agent and closes all connections, setup() may be called again afterwards
+    """
+    global BPA
+    global MTCP_CLA
+
+    if BPA is None:
+        raise Exception('setup(node_id) was not called!')
+
+    await BPA.stop()
+    await MTCP_CLA.close()
+
+    BPA = None
+    MTCP_CLA = None
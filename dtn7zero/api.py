@@ -5,8 +5,6 @@ Inspired by the networkzero library.
 
 Provides a simple NDN (named data network) interface on top of DTN7.
 """
-import time
-
 from typing import Optional, List, Tuple, Callable
 
 from dtn7zero.bundle_protocol_agent import BundleProtocolAgent
@@ -14,6 +12,7 @@ from dtn7zero.configuration import CONFIGURATION, RUNNING_MICROPYTHON
 from dtn7zero.convergence_layer_adapters.mtcp import MTcpCLA
 from dtn7zero.data import Node
 from dtn7zero.endpoints import LocalEndpoint, LocalGroupEndpoint
+from dtn7zero.reactor import Reactor
 from dtn7zero.routers.simple_epidemic_router import SimpleEpidemicRouter
 from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
 from dtn7zero.utility import get_current_clock_millis, is_timestamp_older_than_timeout
@@ -24,6 +23,8 @@ if RUNNING_MICROPYTHON:
 else:
     import threading
 
+    from dtn7zero.convergence_layer_adapters.threaded_cla import ThreadedCLA
+
 
 BPA: Optional[BundleProtocolAgent] = None
 BPA_THREAD = None
@@ -50,7 +51,8 @@ class SimpleEndpoint:
 
         payload, full_source_uri, full_destination_uri, primary_block = my_endpoint.poll()
 
-        the primary block is provided for direct access to additional information
+        the primary block is provided for direct access to additional information,
+        with CONFIGURATION.PAYLOAD_MEMORYVIEWS the payload is a read-only memoryview
         """
         bundle = self._endpoint.poll()
 
@@ -75,7 +77,8 @@ class SimpleGroupEndpoint:
 
         payload, full_source_uri, full_destination_uri, primary_block = my_endpoint.poll()
 
-        the primary block is provided for direct access to additional information
+        the primary block is provided for direct access to additional information,
+        with CONFIGURATION.PAYLOAD_MEMORYVIEWS the payload is a read-only memoryview
         """
         bundle = self._endpoint.poll()
 
@@ -108,7 +111,12 @@ def setup(full_node_uri: str, node_receive_callback: Callable[[bytes, str, str,
         raise Exception('setup(node_id) was called twice!')
 
     storage = SimpleInMemoryStorage()
-    router = SimpleEpidemicRouter({CONFIGURATION.IPND.IDENTIFIER_MTCP: MTcpCLA()}, storage)
+
+    mtcp_cla = MTcpCLA()
+    if CONFIGURATION.THREADED_CLAS and not RUNNING_MICROPYTHON:
+        mtcp_cla = ThreadedCLA(mtcp_cla)
+
+    router = SimpleEpidemicRouter({CONFIGURATION.IPND.IDENTIFIER_MTCP: mtcp_cla}, storage)
     BPA = BundleProtocolAgent(full_node_uri, storage, router)
 
     # node specific endpoint works like a normal endpoint (only receives exactly matched bundles), but for the node itself
@@ -179,13 +187,15 @@ def discover() -> List[Node]:
     if BPA is None:
         raise Exception('setup(node_id) was not called!')
 
-    return list(BPA.storage.get_nodes())
+    with BPA.lock:
+        return list(BPA.storage.get_nodes())
 
 
-def update():
+def update() -> bool:
     """ explicitly updates the bundle protocol agent
 
-    to be called in an endless loop if you want to write the loop yourself
+    to be called in an endless loop if you want to write the loop yourself,
+    returns True if work is pending and the next update should follow without sleeping
 
     the alternative solution (or inspiration) is: run_forever()
     """
@@ -194,12 +204,15 @@ def update():
     if BPA is None:
         raise Exception('setup(node_id was not called!')
 
-    BPA.update()
+    return BPA.update()
 
 
 def run_forever(loop_callback=None, loop_callback_interval_milliseconds=1000, sleep_time_milliseconds=10):
     """ update loop to run the bundle protocol agent until KeyboardInterrupt
 
+    event-driven: blocks until a socket of the bundle protocol agent becomes readable or its next timer is due,
+    sleep_time_milliseconds only caps the wait if a cla without sockets (ESP-NOW, LoRa, REST) is in use
+
     custom_logic_callback can be used for application specific logic after the bundle protocol agent was started
 
     custom_logic_callback signature:
@@ -212,27 +225,32 @@ def run_forever(loop_callback=None, loop_callback_interval_milliseconds=1000, sl
     if BPA is None:
         raise Exception('setup(node_id was not called!')
 
+    reactor = Reactor(BPA)
     last_callback_execution = get_current_clock_millis()
 
     try:
         while True:
-            BPA.update()
+            if loop_callback is None:
+                reactor.run_once(poll_interval_millis=sleep_time_milliseconds)
+                continue
 
-            if loop_callback is not None and is_timestamp_older_than_timeout(last_callback_execution, loop_callback_interval_milliseconds):
+            reactor.run_once(last_callback_execution + loop_callback_interval_milliseconds, sleep_time_milliseconds)
+
+            if is_timestamp_older_than_timeout(last_callback_execution, loop_callback_interval_milliseconds):
                 last_callback_execution = get_current_clock_millis()
                 loop_callback()
-
-            if RUNNING_MICROPYTHON:
-                time.sleep_ms(sleep_time_milliseconds)
-            else:
-                time.sleep(sleep_time_milliseconds / 1000.0)
     except KeyboardInterrupt:
         pass
+    finally:
+        reactor.close()
 
 
 def start_background_update_thread(sleep_time_milliseconds=10):
     """ (experimental) background update thread
 
+    event-driven like run_forever(), sleep_time_milliseconds caps the wait if a cla without sockets is in use.
+    On MicroPython it also is the latency of transmissions started from other threads (no wake-up socket pair).
+
     On MicroPython the limited RAM can lead to crashes (most prominently a maximum-recursion-depth RuntimeError).
     The _thread.stack_size(...) can be adjusted for compensation if needed and possible.
     """
@@ -248,17 +266,21 @@ def start_background_update_thread(sleep_time_milliseconds=10):
     if RUNNING_MICROPYTHON:
         _thread.stack_size(11500)  # experimental setting: 7000 does not run, 8000 does run, 11500 picked for leeway
 
+        reactor = Reactor(BPA)
+
         def update_runner():
             while True:
-                BPA.update()
-                time.sleep_ms(sleep_time_milliseconds)
+                reactor.run_once(get_current_clock_millis() + sleep_time_milliseconds, sleep_time_milliseconds)
 
         BPA_THREAD = _thread.start_new_thread(update_runner, ())
     else:
+        reactor = Reactor(BPA)
+
         def self_stopping_update_runner():
             while threading.main_thread().is_alive():
-                BPA.update()
-                time.sleep(sleep_time_milliseconds / 1000.0)
+                # bounded wait, the main thread might have ended in the meantime
+                reactor.run_once(get_current_clock_millis() + CONFIGURATION.REACTOR_MAX_WAIT_MILLISECONDS, sleep_time_milliseconds)
+            reactor.close()
 
         BPA_THREAD = threading.Thread(target=self_stopping_update_runner)
         BPA_THREAD.start()
@@ -0,0 +1,137 @@
+"""
+asyncio variant of the bundle protocol agent (CPython only).
+
+The bundle processing itself is the one of the BundleProtocolAgent, only the main loop and the I/O are driven
+by the event loop: the IPND socket is served by a datagram protocol, MTCP by the AsyncMTcpCLA (asyncio streams),
+and the agent is woken up by received bundles, local transmissions and its next deadline.
+"""
+import asyncio
+from typing import Optional, Tuple
+
+from dtn7zero.bundle_protocol_agent import BundleProtocolAgent
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.ipnd import IPND
+from dtn7zero.routers import Router
+from dtn7zero.storage import Storage
+from dtn7zero.utility import get_current_clock_millis
+
+
+class _BeaconProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, ipnd: 'AsyncIPND'):
+        self.ipnd = ipnd
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.ipnd.transport = transport
+
+    def datagram_received(self, data: bytes, address_tuple: Tuple[str, int]):
+        self.ipnd.receive_beacon(data, address_tuple[0])
+        self.ipnd.on_receive()
+
+
+class AsyncIPND(IPND):
+    """
+    receives beacons through a datagram protocol on the event loop, update() only broadcasts the own beacon
+    """
+
+    def __init__(self, eid_scheme: int, eid_specific_part: str, storage: Storage):
+        super().__init__(eid_scheme, eid_specific_part, storage)
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.on_receive = lambda: None
+
+    async def start(self):
+        if CONFIGURATION.IPND.ENABLED and self._was_enabled_once:
+            await asyncio.get_running_loop().create_datagram_endpoint(lambda: _BeaconProtocol(self), sock=self.sock)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+        else:
+            self.sock.close()
+
+    def update(self):
+        if CONFIGURATION.IPND.ENABLED and self._was_enabled_once:
+            self.broadcast_own_beacon_if_due()
+
+    def send_own_beacon_to(self, address: str):
+        if self.transport is None:
+            super().send_own_beacon_to(address)
+        else:
+            self.transport.sendto(self.own_beacon.to_cbor(), (address, CONFIGURATION.PORT.IPND))
+
+
+class AsyncBundleProtocolAgent(BundleProtocolAgent):
+
+    def __init__(self, full_node_uri: str, storage: Storage, router: Router):
+        """ The BundleProtocolAgent driven by an asyncio event loop, see dtn7zero/aio.py for the simplified api.
+
+        Asynchronous clas (AsyncMTcpCLA) have to be started with wake_up as receive callback.
+        """
+        super().__init__(full_node_uri, storage, router)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._work_available: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.wake_up = self._wake_up
+
+    def _create_ipnd(self, eid_scheme: int, eid_specific_part: str) -> IPND:
+        return AsyncIPND(eid_scheme, eid_specific_part, self.storage)
+
+    async def start(self):
+        """
+        starts the discovery and the main loop as task of the running event loop
+        """
+        self._loop = asyncio.get_running_loop()
+        self._work_available = asyncio.Event()
+
+        self.ipnd.on_receive = self._wake_up
+        await self.ipnd.start()
+
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        self.ipnd.close()
+
+    async def run(self):
+        while True:
+            self._work_available.clear()
+
+            if self.update():
+                await asyncio.sleep(0)  # let the connections make progress
+                continue
+
+            now = get_current_clock_millis()
+            deadline = self.get_next_deadline_millis()
+            timeout_millis = CONFIGURATION.REACTOR_MAX_WAIT_MILLISECONDS if deadline is None else min(deadline - now, CONFIGURATION.REACTOR_MAX_WAIT_MILLISECONDS)
+
+            if timeout_millis <= 0:
+                await asyncio.sleep(0)
+                continue
+
+            try:
+                await asyncio.wait_for(self._work_available.wait(), timeout_millis / 1000)
+            except asyncio.TimeoutError:
+                pass
+
+    def _wake_up(self):
+        if self._loop is None:
+            return  # not started yet, the first update will see the work
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self._loop:
+            self._work_available.set()
+        else:
+            self._loop.call_soon_threadsafe(self._work_available.set)
@@ -1,13 +1,14 @@
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 
-from dtn7zero.data import BundleInformation, BundleStatusReportReasonCodes
+from dtn7zero.data import BundleInformation, BundleStatusReportReasonCodes, SerializedBundleInformation
 from dtn7zero.configuration import CONFIGURATION, RUNNING_MICROPYTHON
 from dtn7zero.endpoints import LocalEndpoint, LocalGroupEndpoint, _LocalEndpoint
 from dtn7zero.ipnd import IPND
 from dtn7zero.routers import Router
+from dtn7zero.serialization import decode_without_payload, decode_with_payload_view, remove_extension_blocks
 from dtn7zero.storage import Storage
-from dtn7zero.utility import debug, is_correct_node_uri, is_correct_endpoint_uri, is_correct_group_uri
+from dtn7zero.utility import debug, create_reentrant_lock, get_current_clock_micros, get_current_clock_millis, is_correct_node_uri, is_correct_endpoint_uri, is_correct_group_uri
 from py_dtn7.bundle import PrimaryBlock
 
 if RUNNING_MICROPYTHON:
@@ -32,7 +33,11 @@ class BundleProtocolAgent:
 
         self.local_bundle_dispatch_queue: List[BundleInformation] = []  # this pipeline-stage is needed to prevent infinite-recursion if two local endpoints answer each other on every reception-callback
         self.storage_retry_generator = None
+        self.storage_hand_off_generator = None
         self.router_poll_generator = None
+        self.retry_resume_at_ms: Optional[int] = None  # set while a retry pass cut short by the work budget waits
+        self.wake_up: Optional[Callable[[], None]] = None  # set by an event-driven main loop (see dtn7zero/reactor.py)
+        self.lock = create_reentrant_lock()  # guards the bpa state against endpoints used from other threads
 
         # on micropython we need to handle wireless connections manually
         if RUNNING_MICROPYTHON and CONFIGURATION.MICROPYTHON_CHECK_WIFI:
@@ -40,9 +45,26 @@ class BundleProtocolAgent:
                 connect()  # the microcontroller may be moved around, so connect to any available network instead of reconnect
 
         scheme_encoded, node_encoded = PrimaryBlock.from_full_uri(full_node_uri)
-        self.ipnd = IPND(scheme_encoded, node_encoded, storage)
+        self.ipnd = self._create_ipnd(scheme_encoded, node_encoded)
 
-    def update(self):
+    def _create_ipnd(self, eid_scheme: int, eid_specific_part: str) -> IPND:
+        return IPND(eid_scheme, eid_specific_part, self.storage)
+
+    def update(self) -> bool:
+        """ Runs the bpa pipeline for one work budget (BPA_UPDATE_MAX_BUNDLES / BPA_UPDATE_MAX_MICROSECONDS).
+
+        The stages (contact hand-off, stored bundle retry, local dispatch queue, router poll) are served round-robin,
+        one bundle per stage and round, so a busy stage cannot starve the others. A generator stage that ran dry
+        is restarted with the next call only, this bounds the retry stage to one pass over the storage per call.
+        A retry pass cut short by the budget is resumed at BPA_RETRY_RESUME_MILLISECONDS (see get_next_deadline_millis).
+
+        returns True if work is left over and update() should be called again without sleeping, the rest of a
+        retry pass does not count
+        """
+        with self.lock:
+            return self._update()
+
+    def _update(self) -> bool:
         # on micropython we need to handle wireless connections manually
         if RUNNING_MICROPYTHON and CONFIGURATION.MICROPYTHON_CHECK_WIFI:
             if not isconnected():
@@ -51,97 +73,187 @@ class BundleProtocolAgent:
         # update discovery
         self.ipnd.update()
 
+        # bundles whose queued sends failed are offered to their nodes again
+        self.router.process_delivery_reports()
+
+        # delete expired stored bundles before they are offered to the router (and the radio) again
+        for bundle_information in self.storage.pop_expired_bundles(CONFIGURATION.EXPIRED_BUNDLES_PURGED_PER_UPDATE):
+            self.bundle_deletion(bundle_information, BundleStatusReportReasonCodes.LIFETIME_EXPIRED)
+
+        max_bundles = CONFIGURATION.BPA_UPDATE_MAX_BUNDLES
+        max_microseconds = CONFIGURATION.BPA_UPDATE_MAX_MICROSECONDS
+        started_at_us = get_current_clock_micros()
+
+        processed_bundles = 0
+        retry_stage = self._retry_stored_bundle
+        stages = [self._hand_off_stored_bundle, retry_stage, self._dispatch_local_bundle, self._receive_remote_bundle]
+        self.retry_resume_at_ms = None
+
+        while stages:
+            for stage in tuple(stages):
+                if not stage():
+                    stages.remove(stage)
+                    continue
+
+                processed_bundles += 1
+                if processed_bundles >= max_bundles or (max_microseconds and get_current_clock_micros() - started_at_us >= max_microseconds):
+                    if retry_stage in stages:
+                        self.retry_resume_at_ms = get_current_clock_millis() + CONFIGURATION.BPA_RETRY_RESUME_MILLISECONDS
+                    return any(x is not retry_stage for x in stages) or len(self.local_bundle_dispatch_queue) > 0
+
+        # local endpoints may have answered after their stage ran dry
+        return len(self.local_bundle_dispatch_queue) > 0
+
+    def _hand_off_stored_bundle(self) -> bool:
+        # hand off one stored bundle to a new contact
+        if self.storage_hand_off_generator is None:
+            self.storage_hand_off_generator = self.storage.get_bundles_to_hand_off()
+
+        try:
+            node, bundle_information = next(self.storage_hand_off_generator)
+        except StopIteration:
+            self.storage_hand_off_generator = None
+            return False
+
+        self.router.forward_to_node(self.full_node_uri, bundle_information, node)
+        return True
+
+    def _retry_stored_bundle(self) -> bool:
         # process stored/delayed bundle
         if self.storage_retry_generator is None:
             self.storage_retry_generator = self.storage.get_bundles_to_retry()
 
         try:
-            self.bundle_dispatching(next(self.storage_retry_generator))
+            bundle_information = next(self.storage_retry_generator)
         except StopIteration:
             self.storage_retry_generator = None
+            return False
+
+        self.bundle_dispatching(bundle_information)
+        return True
 
+    def _dispatch_local_bundle(self) -> bool:
         # process one new local bundle
-        if self.local_bundle_dispatch_queue:
-            self.bundle_reception(self.local_bundle_dispatch_queue.pop(0))
+        if not self.local_bundle_dispatch_queue:
+            return False
 
+        self.bundle_reception(self.local_bundle_dispatch_queue.pop(0))
+        return True
+
+    def _receive_remote_bundle(self) -> bool:
         # process new remote bundle
         if self.router_poll_generator is None:
             self.router_poll_generator = self.router.generator_poll_bundles()
 
         try:
-            self.bundle_reception(next(self.router_poll_generator))
+            bundle_information = next(self.router_poll_generator)
         except StopIteration:
             self.router_poll_generator = None
+            return False
+
+        self.bundle_reception(bundle_information)
+        return True
+
+    def get_selectable_sockets(self) -> Optional[List]:
+        """
+        returns the sockets that become readable when update() has something to do, None if it has to be polled periodically
+        """
+        router_sockets = self.router.get_selectable_sockets()
+
+        if router_sockets is None:
+            return None
+
+        return self.ipnd.get_selectable_sockets() + router_sockets
+
+    def get_next_deadline_millis(self) -> Optional[int]:
+        """
+        returns the clock time (get_current_clock_millis) at which update() has to run at the latest, None if there is none
+
+        covers the discovery beacon interval, cla timeouts, the next stored bundle expiry and a retry pass to resume
+        """
+        deadlines = [x for x in (self.ipnd.get_next_deadline_millis(), self.router.get_next_deadline_millis(), self.storage.get_next_expiry_millis(), self.retry_resume_at_ms) if x is not None]
+
+        return min(deadlines) if deadlines else None
 
     def register_endpoint(self, endpoint: LocalEndpoint) -> LocalEndpoint:
         """ RFC 9171, 3.3 Services Offered by Bundle Protocol Agents
         […] * commencing a registration (registering the node in an endpoint).
         """
-        endpoint.bpa_register(self)
+        with self.lock:
+            endpoint.bpa_register(self)
 
-        assert is_correct_endpoint_uri(endpoint.full_endpoint_uri)
+            assert is_correct_endpoint_uri(endpoint.full_endpoint_uri)
 
-        if endpoint.full_endpoint_uri in self.local_registered_endpoints:
-            endpoint.bpa_unregister()
-            raise Exception('tried to register local endpoint {}, which is already registered as a local endpoint'.format(endpoint.endpoint_identifier))
+            if endpoint.full_endpoint_uri in self.local_registered_endpoints:
+                endpoint.bpa_unregister()
+                raise Exception('tried to register local endpoint {}, which is already registered as a local endpoint'.format(endpoint.endpoint_identifier))
 
-        self.local_registered_endpoints[endpoint.full_endpoint_uri] = (endpoint,)
+            self.local_registered_endpoints[endpoint.full_endpoint_uri] = (endpoint,)
 
-        return endpoint
+            return endpoint
 
     def register_group_endpoint(self, endpoint: LocalGroupEndpoint) -> LocalGroupEndpoint:
         """ RFC 9171, 3.3 Services Offered by Bundle Protocol Agents
         […] * commencing a registration (registering the node in an endpoint).
         """
-        assert is_correct_group_uri(endpoint.full_endpoint_uri)
+        with self.lock:
+            assert is_correct_group_uri(endpoint.full_endpoint_uri)
 
-        endpoint.bpa_register(self)
+            endpoint.bpa_register(self)
 
-        if endpoint.full_endpoint_uri in self.local_registered_endpoints:
-            self.local_registered_endpoints[endpoint.full_endpoint_uri].append(endpoint)
-        else:
-            self.local_registered_endpoints[endpoint.full_endpoint_uri] = [endpoint]
+            if endpoint.full_endpoint_uri in self.local_registered_endpoints:
+                self.local_registered_endpoints[endpoint.full_endpoint_uri].append(endpoint)
+            else:
+                self.local_registered_endpoints[endpoint.full_endpoint_uri] = [endpoint]
 
-        return endpoint
+            return endpoint
 
     def unregister_endpoint(self, endpoint: LocalEndpoint):
         """ RFC 9171, 3.3 Services Offered by Bundle Protocol Agents
         […] * terminating a registration.
         """
-        if endpoint.full_endpoint_uri not in self.local_registered_endpoints:
-            raise Exception('tried to unregister non-existent local endpoint {}'.format(endpoint.endpoint_identifier))
+        with self.lock:
+            if endpoint.full_endpoint_uri not in self.local_registered_endpoints:
+                raise Exception('tried to unregister non-existent local endpoint {}'.format(endpoint.endpoint_identifier))
 
-        full_endpoint_uri = endpoint.full_endpoint_uri
-        self.local_registered_endpoints[full_endpoint_uri][0].bpa_unregister()
-        del self.local_registered_endpoints[full_endpoint_uri]
+            full_endpoint_uri = endpoint.full_endpoint_uri
+            self.local_registered_endpoints[full_endpoint_uri][0].bpa_unregister()
+            del self.local_registered_endpoints[full_endpoint_uri]
 
     def unregister_group_endpoint(self, endpoint: LocalGroupEndpoint):
         """ RFC 9171, 3.3 Services Offered by Bundle Protocol Agents
         […] * terminating a registration.
         """
-        if endpoint.full_endpoint_uri not in self.local_registered_endpoints:
-            raise Exception('tried to unregister non-existent local group endpoint {}'.format(endpoint.full_endpoint_uri))
+        with self.lock:
+            if endpoint.full_endpoint_uri not in self.local_registered_endpoints:
+                raise Exception('tried to unregister non-existent local group endpoint {}'.format(endpoint.full_endpoint_uri))
 
-        try:
-            self.local_registered_endpoints[endpoint.full_endpoint_uri].remove(endpoint)
-        except ValueError:
-            raise Exception('tried to unregister non-existent local group endpoint {}'.format(endpoint.full_endpoint_uri))
+            try:
+                self.local_registered_endpoints[endpoint.full_endpoint_uri].remove(endpoint)
+            except ValueError:
+                raise Exception('tried to unregister non-existent local group endpoint {}'.format(endpoint.full_endpoint_uri))
 
-        if not self.local_registered_endpoints[endpoint.full_endpoint_uri]:
-            del self.local_registered_endpoints[endpoint.full_endpoint_uri]
+            if not self.local_registered_endpoints[endpoint.full_endpoint_uri]:
+                del self.local_registered_endpoints[endpoint.full_endpoint_uri]
 
     def cancel_transmission(self, bundle_id: str) -> bool:
         """ RFC 9171, 3.3 Services Offered by Bundle Protocol Agents
         […] * canceling a transmission.
         """
-        # should only be called by a local endpoint
-        # returns True if the bundle was still in local storage to delete, False otherwise
-        return self.storage.remove_bundle(bundle_id)
+        with self.lock:
+            # should only be called by a local endpoint
+            # returns True if the bundle was still in local storage to delete, False otherwise
+            self.router.forget_bundle(bundle_id)
+            return self.storage.remove_bundle(bundle_id)
 
     def bundle_reception(self, bundle_information: BundleInformation):
         # bundles with the same ID should never land here -> either they are filtered by the router or uniquely created from an endpoint
 
-        bundle = bundle_information.bundle
+        if isinstance(bundle_information, SerializedBundleInformation):
+            # the checks below do not need the payload, removed blocks are written back to the serialized bundle
+            bundle = decode_without_payload(bundle_information.serialized_bundle)
+        else:
+            bundle = bundle_information.bundle
 
         """ RFC 9171, 5.6 Bundle Reception
         […] Step 1: The retention constraint "Dispatch pending" MUST be added to the bundle. […]
@@ -186,7 +298,8 @@ class BundleProtocolAgent:
         indicate that the block must be discarded, then processing continues with the next extension block that the 
         BPA cannot process, if any; otherwise, processing proceeds from Step 5. […]
         """
-        for block in bundle.other_blocks[:]:
+        discarded_block_indices = []
+        for index, block in enumerate(bundle.other_blocks[:]):
             flags = block.block_processing_control_flags
 
             if flags.report_status_if_block_cant_be_processed and CONFIGURATION.SEND_STATUS_REPORTS_ENABLED:
@@ -198,6 +311,10 @@ class BundleProtocolAgent:
                 return
             elif flags.discard_block_if_block_cant_be_processed:
                 bundle.other_blocks.remove(block)
+                discarded_block_indices.append(index)
+
+        if discarded_block_indices and isinstance(bundle_information, SerializedBundleInformation):
+            bundle_information.serialized_bundle = remove_extension_blocks(bundle_information.serialized_bundle, discarded_block_indices)
 
         """ 4.4.3 Hop Count
         […] When a bundle's hop count exceeds its hop limit, the bundle SHOULD be deleted for the reason "Hop limit 
@@ -226,7 +343,7 @@ class BundleProtocolAgent:
         the Bundle Delivery procedure defined in Section 5.7 MUST be followed and, […] the node SHALL NOT undertake to 
         forward the bundle to itself in the course of performing the procedure described in Section 5.4. […]
         """
-        if not bundle_information.locally_delivered and bundle_information.bundle.primary_block.full_destination_uri in self.local_registered_endpoints:
+        if not bundle_information.locally_delivered and bundle_information.full_destination_uri in self.local_registered_endpoints:
             self.local_bundle_delivery(bundle_information)
 
         """ RFC 9171, 5.3 Bundle Dispatching
@@ -256,8 +373,13 @@ class BundleProtocolAgent:
         bundle_information.locally_delivered = True
 
         # on group-endpoints there can be multiple registrations, on unicast-endpoints this is a 1-tuple
-        for endpoint in self.local_registered_endpoints[bundle_information.bundle.primary_block.full_destination_uri]:
-            endpoint.bpa_local_bundle_delivery(bundle_information.bundle)
+        if CONFIGURATION.PAYLOAD_MEMORYVIEWS and isinstance(bundle_information, SerializedBundleInformation):
+            bundle = decode_with_payload_view(bundle_information.serialized_bundle)
+        else:
+            bundle = bundle_information.bundle
+
+        for endpoint in self.local_registered_endpoints[bundle_information.full_destination_uri]:
+            endpoint.bpa_local_bundle_delivery(bundle)
 
     def bundle_forwarding(self, bundle_information: BundleInformation):
 
@@ -303,7 +425,7 @@ class BundleProtocolAgent:
                     reason = BundleStatusReportReasonCodes.DEPLETED_STORAGE
 
                 for removed_bundle_information in removed_bundle_informations:
-                    if len(removed_bundle_information.forwarded_to_nodes) > 0:
+                    if removed_bundle_information.forwarded_count > 0:
                         removed_bundle_reason = BundleStatusReportReasonCodes.NO_ADDITIONAL_INFORMATION
                     else:
                         removed_bundle_reason = BundleStatusReportReasonCodes.DEPLETED_STORAGE
@@ -345,7 +467,7 @@ class BundleProtocolAgent:
             for the bundle's report-to endpoint ID. The reason code on this bundle forwarding status report MUST 
             be "no additional information". […]
             """
-            if bundle_information.bundle.primary_block.bundle_processing_control_flags.status_of_report_forwarding_is_requested:
+            if bundle_information.bundle_processing_control_flags.status_of_report_forwarding_is_requested:
                 # todo: generate a status report
                 pass
 
@@ -360,7 +482,7 @@ class BundleProtocolAgent:
         set to 1 and if status reporting is enabled, then a bundle deletion status report citing the reason for
         deletion SHOULD be generated, destined for the bundle's report-to endpoint ID. […]
         """
-        flags = bundle_information.bundle.primary_block.bundle_processing_control_flags
+        flags = bundle_information.bundle_processing_control_flags
         if flags.status_of_report_deletion_is_requested and CONFIGURATION.SEND_STATUS_REPORTS_ENABLED:
             # todo: generate a status report
             pass
@@ -370,4 +492,7 @@ class BundleProtocolAgent:
         """
         bundle_information.retention_constraint = None
 
-        debug('bundle scheduled for deletion, reason: {}, bundle: {}'.format(reason, bundle_information.bundle.bundle_id))
+        # the cached serialization would keep the bundle (and a spilled payload) alive until evicted from the cache
+        self.router.forget_bundle(bundle_information.bundle_id)
+
+        debug('bundle scheduled for deletion, reason: {}, bundle: {}'.format(reason, bundle_information.bundle_id))
@@ -31,12 +31,88 @@ class _SubConfigurationMTCP:
             self.MAX_CONNECTIONS_STATE_WAITING = 2
             self.MAX_CONNECTIONS_STATE_OPEN_RECEIVE = 3
             self.TIMEOUT_MILLISECONDS_INACTIVE_RECEIVE = 5000
+            # outgoing connections are reused for following bundles, idle ones are closed before a micropython receiver does
+            self.MAX_CONNECTIONS_STATE_OPEN_SEND = 2
+            self.TIMEOUT_MILLISECONDS_INACTIVE_SEND = 4000
+            self.MAX_QUEUED_BUNDLES_PER_PEER = 4
+            # a connection announcing a longer bundle is discarded before its receive buffer is allocated
+            self.MAX_FRAME_LENGTH_BYTES = 64 * 1024
+            # no mmap on micropython, spilling is disabled
+            self.SPILL_THRESHOLD_BYTES = None
         else:
             self.MAX_CONNECTIONS_STATE_WAITING = 5
             self.MAX_CONNECTIONS_STATE_OPEN_RECEIVE = 10000
             self.TIMEOUT_MILLISECONDS_INACTIVE_RECEIVE = 1000000
+            self.MAX_CONNECTIONS_STATE_OPEN_SEND = 100
+            self.TIMEOUT_MILLISECONDS_INACTIVE_SEND = 60000
+            self.MAX_QUEUED_BUNDLES_PER_PEER = 64
+            # a connection announcing a longer bundle is discarded before its receive buffer is allocated
+            self.MAX_FRAME_LENGTH_BYTES = 1024 * 1024 * 1024
+            # incoming bundles of at least this size are received into a memory-mapped temporary file instead of RAM
+            self.SPILL_THRESHOLD_BYTES = 1024 * 1024
+
+        # the directory of the spill files, None -> the default temporary directory (may be a tmpfs in RAM)
+        self.SPILL_DIRECTORY = None
 
         self.TIMEOUT_MILLISECONDS_STALLED_SEND = 2000
+        # a partly sent bundle is continued after this time at the latest (the event-driven main loop waits no longer)
+        self.SEND_RETRY_MILLISECONDS = 5
+
+        # asyncio mtcp cla (CPython only): a peer with more unsent bytes queued does not get further bundles for now
+        self.ASYNC_MAX_WRITE_BUFFER_BYTES = 1024 * 1024
+
+
+class _SubConfigurationPersistentLogStorage:
+
+    def __init__(self):
+        self.DIRECTORY = 'dtn7zero_storage'
+
+        if RUNNING_MICROPYTHON:
+            self.MAX_STORED_BUNDLES = 200  # experimental setting, limited by flash size and index RAM
+            self.SEGMENT_MAX_BYTES = 16 * 1024
+        else:
+            self.MAX_STORED_BUNDLES = 100000
+            self.SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+
+        # an inactive segment is rewritten once this share of its bytes is dead, or if there are too many segments
+        self.COMPACTION_MIN_DEAD_RATIO = 0.5
+        self.COMPACTION_MAX_INACTIVE_SEGMENTS = 4
+        self.COMPACTION_RECORDS_PER_STEP = 4
+
+
+class _SubConfigurationRF95LoRa:
+
+    def __init__(self):
+        # the FROM byte of the RH_RF95 header, None -> the last byte of machine.unique_id()
+        self.ADDRESS = None
+        # bundles longer than one frame are sent in fragments, see convergence_layer_adapters/rf95_fragmentation.py
+        self.REASSEMBLY_TIMEOUT_MILLISECONDS = 60000
+        self.REASSEMBLY_MAX_BYTES = 8 * 1024
+        # frames are queued and sent at the earliest time the regional limits allow, see rf95_scheduling.py
+        # EU868 -> DUTY_CYCLE = 0.01 (1% per hour), AS923 -> MAX_DWELL_TIME_MILLISECONDS = 400, None disables a limit
+        self.DUTY_CYCLE = None
+        self.DUTY_CYCLE_WINDOW_MILLISECONDS = 3600000
+        self.MAX_DWELL_TIME_MILLISECONDS = None
+        self.MAX_QUEUED_FRAMES = 32
+        # listen-before-talk: a channel activity detection before every frame, see rf95_channel_access.py
+        # a busy channel holds the frame back for a random time out of a doubling window, up to MAX_ATTEMPTS times
+        self.LISTEN_BEFORE_TALK = False
+        self.BACKOFF_MIN_MILLISECONDS = 200
+        self.BACKOFF_MAX_MILLISECONDS = 6400
+        self.BACKOFF_MAX_ATTEMPTS = 6
+        # small bundles are collected this long and sent together in one frame, None disables it (see aggregation.py)
+        self.AGGREGATION_DELAY_MILLISECONDS = None
+        # sent bundles are header compressed, received ones are always expanded (see header_compression.py)
+        self.HEADER_COMPRESSION = False
+
+
+class _SubConfigurationEspNow:
+
+    def __init__(self):
+        # small bundles are collected this long and sent together in one message, None disables it (see aggregation.py)
+        self.AGGREGATION_DELAY_MILLISECONDS = None
+        # sent bundles are header compressed, received ones are always expanded (see header_compression.py)
+        self.HEADER_COMPRESSION = False
 
 
 class _SubConfigurationPORT:
@@ -51,6 +127,12 @@ class _SubConfigurationPORT:
 class _Configuration:
     RUNNING_MICROPYTHON = sys.implementation.name == 'micropython'
 
+    EVICTION_POLICY_OLDEST_RECEIVED = 'oldest-received'
+    EVICTION_POLICY_BYTE_BUDGET_LRU = 'byte-budget-lru'
+    EVICTION_POLICY_SHORTEST_REMAINING_LIFETIME = 'shortest-remaining-lifetime'
+    EVICTION_POLICY_MOST_FORWARDED = 'most-forwarded'
+    EVICTION_POLICY_PRIORITY_CLASS = 'priority-class'
+
     def __init__(self):
         self.DEBUG = False
         self.WARNING = True
@@ -61,18 +143,94 @@ class _Configuration:
         self.IPND: _SubConfigurationIPND = _SubConfigurationIPND()
         self.MTCP: _SubConfigurationMTCP = _SubConfigurationMTCP()
         self.PORT: _SubConfigurationPORT = _SubConfigurationPORT()
+        self.PERSISTENT_LOG_STORAGE: _SubConfigurationPersistentLogStorage = _SubConfigurationPersistentLogStorage()
+        self.RF95_LORA: _SubConfigurationRF95LoRa = _SubConfigurationRF95LoRa()
+        self.ESPNOW: _SubConfigurationEspNow = _SubConfigurationEspNow()
 
         self.SIMPLE_EPIDEMIC_ROUTER_MIN_NODES_TO_FORWARD_TO = 3
+        self.EXPIRED_BUNDLES_PURGED_PER_UPDATE = 4
+
+        # work budget of one BundleProtocolAgent.update() call, the pipeline stages are served round-robin until
+        # one of the limits is reached (BPA_UPDATE_MAX_MICROSECONDS = 0 disables the time limit)
+        if RUNNING_MICROPYTHON:
+            self.BPA_UPDATE_MAX_BUNDLES = 8  # experimental setting
+            self.BPA_UPDATE_MAX_MICROSECONDS = 20000
+        else:
+            self.BPA_UPDATE_MAX_BUNDLES = 256
+            self.BPA_UPDATE_MAX_MICROSECONDS = 20000
+
+        # a pass over the stored bundles cut short by the work budget is resumed this much later, the stored bundles
+        # are waiting for a contact and keep no update() busy
+        self.BPA_RETRY_RESUME_MILLISECONDS = 100
+
+        # event-driven main loop (see dtn7zero/reactor.py): longest time to block without a socket event or timer,
+        # stored bundles are offered to the router again at least this often
+        self.REACTOR_MAX_WAIT_MILLISECONDS = 1000
+
+        # CPython only: api.setup() wraps its clas into ThreadedCLAs (see convergence_layer_adapters/threaded_cla.py)
+        # sends run on a worker pool with a queue per peer, so one stalled peer does not block the bpa or the other peers
+        self.THREADED_CLAS = False
+        self.THREADED_CLA_WORKERS = 4
+        self.THREADED_CLA_MAX_QUEUED_PER_PEER = 32
+        self.THREADED_CLA_RECEIVE_POLL_MILLISECONDS = 10
+
         self.SOCKET_RECEIVE_BUFFER_SIZE = 512
 
+        # serialized bundles + block index kept by the router for repeated forwarding attempts (see dtn7zero/serialization.py)
+        if RUNNING_MICROPYTHON:
+            self.FORWARDING_ENCODER_CACHE_SIZE = 8
+        else:
+            self.FORWARDING_ENCODER_CACHE_SIZE = 1024
+
+        # CPython only: bundles received over mtcp are kept as their receive buffer (a SerializedBundleInformation),
+        # endpoints get the payload as a read-only memoryview slice of it instead of a copy
+        # (applications have to accept any bytes-like payload, e.g. bytes(payload).decode())
+        self.PAYLOAD_MEMORYVIEWS = False
+
+        # link-local header compression of the broadcast clas (RF95_LORA.HEADER_COMPRESSION, ESPNOW.HEADER_COMPRESSION),
+        # EIDs are sent as dictionary indices and defined again every REFRESH_INTERVAL uses for receivers that missed it
+        # see convergence_layer_adapters/header_compression.py
+        self.HEADER_COMPRESSION_DICTIONARY_SIZE = 16
+        self.HEADER_COMPRESSION_REFRESH_INTERVAL = 16
+        self.HEADER_COMPRESSION_MAX_NEIGHBORS = 8
+
         self.MICROPYTHON_CHECK_WIFI = True
 
+        # keep delayed bundles as cbor bytes plus a small header and decode them only when needed
+        # a decoded bundle costs several times its serialized size in RAM (see test/test-bundle-size.py)
         if RUNNING_MICROPYTHON:
-            self.SIMPLE_IN_MEMORY_STORAGE_MAX_STORED_BUNDLES = 7  # experimental setting
+            self.SIMPLE_IN_MEMORY_STORAGE_SERIALIZED_BUNDLES = True
+            self.SIMPLE_IN_MEMORY_STORAGE_MAX_STORED_BUNDLES = 7  # experimental setting, measured with decoded bundles
             self.SIMPLE_IN_MEMORY_STORAGE_MAX_KNOWN_BUNDLE_IDS = 18  # experimental setting
         else:
+            self.SIMPLE_IN_MEMORY_STORAGE_SERIALIZED_BUNDLES = False
             self.SIMPLE_IN_MEMORY_STORAGE_MAX_STORED_BUNDLES = 10000
             self.SIMPLE_IN_MEMORY_STORAGE_MAX_KNOWN_BUNDLE_IDS = 100000
 
+        # which stored bundle makes room once the storage is full, see dtn7zero/storage/eviction_policies.py
+        # the byte budget is only used by the byte-budget-lru policy, all policies also respect MAX_STORED_BUNDLES
+        self.SIMPLE_IN_MEMORY_STORAGE_EVICTION_POLICY = self.EVICTION_POLICY_OLDEST_RECEIVED
+        if RUNNING_MICROPYTHON:
+            self.SIMPLE_IN_MEMORY_STORAGE_MAX_STORED_BYTES = 16 * 1024  # experimental setting
+        else:
+            self.SIMPLE_IN_MEMORY_STORAGE_MAX_STORED_BYTES = 64 * 1024 * 1024
+
+        # priority-class policy: experimental extension block (type codes 192-255 are reserved for private use)
+        # carrying the priority as cbor unsigned integer, higher is more important
+        self.PRIORITY_BLOCK_TYPE_CODE = 193
+        self.DEFAULT_BUNDLE_PRIORITY = 1
+
+        # optional compact seen-set: a time-rotated bloom filter replaces the exact bundle-id ledger
+        # each of the two filter generations holds SEEN_FILTER_CAPACITY bundle ids at the given false positive rate
+        self.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_ENABLED = False
+        self.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_FALSE_POSITIVE_RATE = 0.01
+        self.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_ROTATION_MILLISECONDS = 3600 * 24 * 1000
+        self.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_MAX_PENDING_BUNDLE_IDS = 16
+
+        if RUNNING_MICROPYTHON:
+            self.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_CAPACITY = 2500  # experimental setting, about 3KB per generation
+        else:
+            self.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_CAPACITY = 100000
+
 
 CONFIGURATION = _Configuration()
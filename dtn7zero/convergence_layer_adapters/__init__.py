@@ -1,10 +1,14 @@
 from abc import ABC
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Iterable, Union
 
-from dtn7zero.data import Node
+from dtn7zero.data import Node, BundleInformation
 from py_dtn7 import Bundle
 
 
+# (node, serialized bundle, success)
+DeliveryReport = Tuple[Optional[Node], bytes, bool]
+
+
 class PullBasedCLA(ABC):
 
     def poll(self, bundle_id: str, node: Node) -> Tuple[Optional[Bundle], Optional[str]]:
@@ -16,11 +20,71 @@ class PullBasedCLA(ABC):
     def send_to(self, node: Node, serialized_bundle: bytes) -> bool:
         raise NotImplementedError('do not instantiate CLA class directly')
 
+    def get_selectable_sockets(self) -> Optional[List]:
+        """
+        returns the sockets that become readable when the cla has something to poll, None if it has to be polled periodically
+        """
+        return None
+
+    def get_next_deadline_millis(self) -> Optional[int]:
+        """
+        returns the clock time (get_current_clock_millis) at which the cla has to be polled again, None if there is none
+        """
+        return None
+
 
 class PushBasedCLA(ABC):
-    def poll(self) -> Tuple[Optional[Bundle], Optional[str]]:
+    # True if send_to() only queues the bundle, every queued bundle is then reported by poll_delivery_reports()
+    sends_are_queued = False
+
+    def poll(self) -> Tuple[Optional[Union[Bundle, BundleInformation]], Optional[str]]:
+        """
+        returns a received bundle (decoded, or as bundle information if the cla already built one) and the sender address
+        """
         raise NotImplementedError('do not instantiate CLA class directly')
 
+    def poll_serialized(self) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        like poll(), but returns the received bundle undecoded, for clas that receive whole cbor encoded bundles
+        """
+        raise NotImplementedError('{} does not hand out serialized bundles'.format(type(self).__name__))
+
     def send_to(self, node: Optional[Node], serialized_bundle: bytes) -> bool:
         raise NotImplementedError('do not instantiate CLA class directly')
 
+    def poll_delivery_reports(self) -> List[DeliveryReport]:
+        """
+        returns the outcomes of all sends finished since the last call, for clas whose send_to() only queues the bundle
+        """
+        return []
+
+    def get_selectable_sockets(self) -> Optional[List]:
+        """
+        returns the sockets that become readable when the cla has something to poll, None if it has to be polled periodically
+        """
+        return None
+
+    def get_next_deadline_millis(self) -> Optional[int]:
+        """
+        returns the clock time (get_current_clock_millis) at which the cla has to be polled again, None if there is none
+        """
+        return None
+
+
+def get_selectable_sockets_of(clas: Iterable[Union[PullBasedCLA, PushBasedCLA]]) -> Optional[List]:
+    """
+    returns the sockets of all given clas, None as soon as one of them has to be polled periodically
+    """
+    sockets = []
+    for cla in clas:
+        cla_sockets = cla.get_selectable_sockets()
+        if cla_sockets is None:
+            return None
+        sockets.extend(cla_sockets)
+    return sockets
+
+
+def get_next_deadline_millis_of(clas: Iterable[Union[PullBasedCLA, PushBasedCLA]]) -> Optional[int]:
+    deadlines = [x for x in (cla.get_next_deadline_millis() for cla in clas) if x is not None]
+    return min(deadlines) if deadlines else None
+
@@ -0,0 +1,110 @@
+"""
+Multi-bundle aggregation for the broadcast CLAs (LoRa, ESP-NOW).
+
+Small bundles are collected for a short delay and sent together in one radio message, so they share the per-frame
+cost (preamble, link header, ESP-NOW action frame). The aggregate is a length-prefixed container:
+    0x00 | length (u8) | serialized bundle | length (u8) | serialized bundle | ...
+
+A serialized bundle is a cbor array and never starts with 0x00, so plain bundles and aggregates are told apart by
+their first byte. A single collected bundle is sent plain, a bundle too long for the container bypasses it.
+"""
+from typing import List, Optional
+
+from dtn7zero.utility import get_current_clock_millis, is_timestamp_older_than_timeout
+
+
+AGGREGATE_MARKER = 0x00
+MAX_AGGREGATED_BUNDLE_LENGTH = 0xff
+
+
+def pack(serialized_bundles: List[bytes]) -> bytes:
+    parts = [bytes((AGGREGATE_MARKER,))]
+    for serialized_bundle in serialized_bundles:
+        parts.append(bytes((len(serialized_bundle),)))
+        parts.append(serialized_bundle)
+    return b''.join(parts)
+
+
+def unpack(message: bytes) -> List[bytes]:
+    """
+    returns the serialized bundles of a received message, raises ValueError on a truncated aggregate
+    """
+    if not message or message[0] != AGGREGATE_MARKER:
+        return [message]
+
+    serialized_bundles = []
+    index = 1
+    while index < len(message):
+        end = index + 1 + message[index]
+        if end > len(message):
+            raise ValueError('aggregate truncated after {} bundles'.format(len(serialized_bundles)))
+        serialized_bundles.append(message[index + 1:end])
+        index = end
+    return serialized_bundles
+
+
+class Aggregator:
+
+    def __init__(self, max_message_length: int, delay_milliseconds: int):
+        """ Collects small bundles into aggregates of at most max_message_length bytes.
+
+        delay_milliseconds: the longest time the first collected bundle waits for others
+        """
+        self.max_message_length = max_message_length
+        self.delay_milliseconds = delay_milliseconds
+
+        self._pending: List[bytes] = []
+        self._pending_length = 1  # the marker
+        self._first_added_at = 0
+
+    @property
+    def pending_bundles(self) -> int:
+        return len(self._pending)
+
+    def add(self, serialized_bundle: bytes) -> List[bytes]:
+        """
+        collects a bundle, returns the messages to send right away (a full aggregate, a bundle bypassing the container)
+        """
+        length = 1 + len(serialized_bundle)
+
+        if len(serialized_bundle) > MAX_AGGREGATED_BUNDLE_LENGTH or 1 + length > self.max_message_length:
+            messages = self.flush()
+            messages.append(serialized_bundle)
+            return messages
+
+        messages = []
+        if self._pending_length + length > self.max_message_length:
+            messages = self.flush()
+
+        if not self._pending:
+            self._first_added_at = get_current_clock_millis()
+
+        self._pending.append(serialized_bundle)
+        self._pending_length += length
+        return messages
+
+    def flush(self) -> List[bytes]:
+        """
+        returns the collected bundles as one message (plain if only one), an empty list if there are none
+        """
+        if not self._pending:
+            return []
+
+        message = self._pending[0] if len(self._pending) == 1 else pack(self._pending)
+
+        self._pending = []
+        self._pending_length = 1
+        return [message]
+
+    def flush_due(self) -> List[bytes]:
+        """
+        like flush(), but only once the delay of the first collected bundle is over
+        """
+        if self._pending and is_timestamp_older_than_timeout(self._first_added_at, self.delay_milliseconds):
+            return self.flush()
+        return []
+
+    def next_flush_millis(self) -> Optional[int]:
+        if not self._pending:
+            return None
+        return self._first_added_at + self.delay_milliseconds
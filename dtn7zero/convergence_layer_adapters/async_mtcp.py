@@ -0,0 +1,186 @@
+"""
+MTCP convergence layer on asyncio streams (CPython only), used by the AsyncBundleProtocolAgent.
+
+Every incoming connection is served by its own coroutine that reads complete cbor byte-string frames,
+so thousands of peers do not need thousands of polled sockets or threads.
+Outgoing connections are kept open per peer and reused for the following bundles.
+"""
+import asyncio
+import struct
+from collections import deque
+from typing import Optional, Dict, Tuple, Callable, Union
+
+try:
+    from cbor2 import dumps
+except ImportError:
+    from cbor import dumps
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters import PushBasedCLA
+from dtn7zero.convergence_layer_adapters.mtcp import TYPE_BYTES, _CBOR_TYPE_MASK, _CBOR_INFO_BITS, _CBOR_UINT8_FOLLOWS, \
+    _CBOR_UINT16_FOLLOWS, _CBOR_UINT32_FOLLOWS, _CBOR_UINT64_FOLLOWS, ReceivedInvalidDataOnSocketException
+from dtn7zero.data import Node, BundleInformation, SerializedBundleInformation
+from dtn7zero.serialization import read_header
+from dtn7zero.utility import debug, warning
+from py_dtn7 import Bundle
+
+
+_LENGTH_FORMATS = {
+    _CBOR_UINT8_FOLLOWS: (1, '!B'),
+    _CBOR_UINT16_FOLLOWS: (2, '!H'),
+    _CBOR_UINT32_FOLLOWS: (4, '!I'),
+    _CBOR_UINT64_FOLLOWS: (8, '!Q')
+}
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    """
+    reads one definite length cbor byte-string, raises asyncio.IncompleteReadError if the remote closed the connection
+    """
+    header = (await reader.readexactly(1))[0]
+
+    if header & _CBOR_TYPE_MASK != TYPE_BYTES:
+        raise ReceivedInvalidDataOnSocketException('mtcp cla received invalid header: only accepting type byte-string')
+
+    length = header & _CBOR_INFO_BITS
+
+    if length > 23:
+        if length not in _LENGTH_FORMATS:
+            raise ReceivedInvalidDataOnSocketException('mtcp cla received invalid header: only accepting definite length byte-strings')
+
+        num_bytes, length_format = _LENGTH_FORMATS[length]
+        length = struct.unpack(length_format, await reader.readexactly(num_bytes))[0]
+
+    if length > CONFIGURATION.MTCP.MAX_FRAME_LENGTH_BYTES:
+        raise ReceivedInvalidDataOnSocketException('mtcp cla received frame header of {} bytes, more than the maximum of {} bytes'.format(length, CONFIGURATION.MTCP.MAX_FRAME_LENGTH_BYTES))
+
+    return await reader.readexactly(length)
+
+
+class AsyncMTcpCLA(PushBasedCLA):
+
+    def __init__(self):
+        """ The asyncio counterpart of the MTcpCLA, start() has to be awaited inside the running event loop.
+        """
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.on_receive: Optional[Callable[[], None]] = None
+
+        self.received_bundles = deque()
+        self.open_receive_connections = 0
+
+        self.send_connections: Dict[Tuple[str, int], asyncio.StreamWriter] = {}
+        self.pending_send_connections: Dict[Tuple[str, int], asyncio.Task] = {}
+
+    async def start(self, on_receive: Optional[Callable[[], None]] = None):
+        """
+        starts listening, on_receive is called whenever a bundle was received and can be polled
+        """
+        self.on_receive = on_receive
+        self.server = await asyncio.start_server(self._serve_connection, '0.0.0.0', CONFIGURATION.PORT.MTCP, reuse_address=True)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+        for task in self.pending_send_connections.values():
+            task.cancel()
+
+        for writer in self.send_connections.values():
+            writer.close()
+
+        self.send_connections.clear()
+
+    def poll(self, bundle_id: str = None, node: Node = None) -> Tuple[Optional[Union[Bundle, BundleInformation]], Optional[str]]:
+        if bundle_id is not None or node is not None:
+            raise Exception('cannot poll specific bundle from specific node with mtcp cla')
+
+        while self.received_bundles:
+            serialized_bundle, from_node_address = self.received_bundles.popleft()
+
+            try:
+                if CONFIGURATION.PAYLOAD_MEMORYVIEWS:
+                    return SerializedBundleInformation(serialized_bundle, header=read_header(serialized_bundle)), from_node_address
+                return Bundle.from_cbor(serialized_bundle), from_node_address
+            except Exception as e:
+                warning('error during mtcp bundle deserialization, ignoring bundle. error: {}'.format(e))
+
+        return None, None
+
+    def send_to(self, node: Optional[Node], serialized_bundle: bytes) -> bool:
+        """
+        writes the bundle to an open connection, returns False while the connection to the node is still being established
+        """
+        if node is None:
+            raise Exception('cannot send bundle to unspecified node with mtcp cla')
+
+        if CONFIGURATION.IPND.IDENTIFIER_MTCP not in node.clas:
+            return False
+
+        peer = (node.address, node.clas[CONFIGURATION.IPND.IDENTIFIER_MTCP])
+        writer = self.send_connections.get(peer)
+
+        if writer is None or writer.is_closing():
+            if peer not in self.pending_send_connections:
+                self.pending_send_connections[peer] = asyncio.ensure_future(self._open_send_connection(peer, node))
+            return False
+
+        # back-pressure: a stalled peer does not get more bundles queued
+        if writer.transport.get_write_buffer_size() > CONFIGURATION.MTCP.ASYNC_MAX_WRITE_BUFFER_BYTES:
+            return False
+
+        writer.write(dumps(serialized_bundle))
+        return True
+
+    async def _open_send_connection(self, peer: Tuple[str, int], node: Node):
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(*peer), CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_STALLED_SEND / 1000)
+        except (OSError, asyncio.TimeoutError) as e:
+            debug('could not open mtcp connection to {}, error: {}'.format(peer, e))
+            node.clas.pop(CONFIGURATION.IPND.IDENTIFIER_MTCP, None)  # the node can re-announce it, but currently we cannot connect
+            return
+        finally:
+            self.pending_send_connections.pop(peer, None)
+
+        self.send_connections[peer] = writer
+
+        try:
+            # nothing is expected from the receiver, this only notices the connection being closed
+            while await reader.read(CONFIGURATION.SOCKET_RECEIVE_BUFFER_SIZE):
+                pass
+        except OSError:
+            pass
+        finally:
+            debug('mtcp send connection to {} closed'.format(peer))
+            if self.send_connections.get(peer) is writer:
+                del self.send_connections[peer]
+            writer.close()
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        address_tuple = writer.get_extra_info('peername')
+
+        if self.open_receive_connections >= CONFIGURATION.MTCP.MAX_CONNECTIONS_STATE_OPEN_RECEIVE:
+            debug('refusing incoming mtcp connection {}, too many open connections'.format(address_tuple))
+            writer.close()
+            return
+
+        self.open_receive_connections += 1
+
+        try:
+            while True:
+                serialized_bundle = await asyncio.wait_for(read_frame(reader), CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_INACTIVE_RECEIVE / 1000)
+
+                self.received_bundles.append((serialized_bundle, address_tuple[0]))
+                if self.on_receive is not None:
+                    self.on_receive()
+        except asyncio.IncompleteReadError:
+            debug('remote closed down incoming mtcp connection {}'.format(address_tuple))
+        except asyncio.TimeoutError:
+            debug('closing incoming mtcp connection {} due to inactivity timeout'.format(address_tuple))
+        except ReceivedInvalidDataOnSocketException as e:
+            warning('incoming mtcp connection {} sent invalid data, discarding connection, error: {}'.format(address_tuple, e))
+        except OSError as e:
+            debug('incoming mtcp connection {} failed, error: {}'.format(address_tuple, e))
+        finally:
+            self.open_receive_connections -= 1
+            writer.close()
@@ -2,19 +2,26 @@
 The espnow support is not yet officially released in MicroPython, but, the changes were recently merged into main.
 Therefore, until the next release, we can use the creators pre-builds of MicroPython:
 https://github.com/glenn20/micropython-espnow-images/tree/main/20230427-v1.20.0-espnow-2-gcc4c716f6
+
+Optionally sent bundles are header compressed (see header_compression.py).
+Optionally small bundles are collected and sent together in one message (see aggregation.py).
 """
 import espnow
 import network
 
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
 
 from py_dtn7 import Bundle
+from dtn7zero.configuration import CONFIGURATION
 from dtn7zero.convergence_layer_adapters import PushBasedCLA
+from dtn7zero.convergence_layer_adapters.aggregation import Aggregator, unpack
+from dtn7zero.convergence_layer_adapters.header_compression import HeaderCompressor, HeaderDecompressor
 from dtn7zero.data import Node
 from dtn7zero.utility import warning
 
 
 BROADCAST_MAC = b'\xff\xff\xff\xff\xff\xff'
+MAX_MESSAGE_LENGTH = 250
 
 
 class EspNowCLA(PushBasedCLA):
@@ -32,17 +39,44 @@ class EspNowCLA(PushBasedCLA):
         self.endpoint.active(True)
         self.endpoint.add_peer(BROADCAST_MAC)
 
+        self.aggregator = None
+        if CONFIGURATION.ESPNOW.AGGREGATION_DELAY_MILLISECONDS is not None:
+            self.aggregator = Aggregator(MAX_MESSAGE_LENGTH, CONFIGURATION.ESPNOW.AGGREGATION_DELAY_MILLISECONDS)
+
+        self.compressor = None
+        if CONFIGURATION.ESPNOW.HEADER_COMPRESSION:
+            self.compressor = HeaderCompressor(CONFIGURATION.HEADER_COMPRESSION_DICTIONARY_SIZE, CONFIGURATION.HEADER_COMPRESSION_REFRESH_INTERVAL)
+        # compressed bundles of the neighbors are expanded, whether this node compresses its own or not
+        self.decompressor = HeaderDecompressor(CONFIGURATION.HEADER_COMPRESSION_MAX_NEIGHBORS)
+
+        # (serialized bundle, from address) unpacked from a received aggregate, handed out one per poll
+        self.received_bundles: List[Tuple[bytes, bytes]] = []
+
     def poll(self, bundle_id: str = None, node: Node = None) -> Tuple[Optional[Bundle], Optional[str]]:
         if bundle_id is not None or node is not None:
             raise Exception('cannot poll specific bundle from specific node with espnow cla')
 
-        from_node_address, serialized_bundle = self.endpoint.recv(timeout_ms=0)
+        if self.aggregator is not None:
+            for message in self.aggregator.flush_due():
+                self.endpoint.send(BROADCAST_MAC, message)
 
-        if serialized_bundle:
-            try:
-                return Bundle.from_cbor(serialized_bundle), from_node_address
-            except Exception as e:
-                warning('error during espnow bundle deserialization, ignoring bundle. error: {}'.format(e))
+        if not self.received_bundles:
+            from_node_address, message = self.endpoint.recv(timeout_ms=0)
+
+            if message:
+                try:
+                    self.received_bundles = [(x, from_node_address) for x in unpack(message)]
+                except ValueError as e:
+                    warning('error during espnow aggregate unpacking, ignoring message. error: {}'.format(e))
+
+        if self.received_bundles:
+            message, from_node_address = self.received_bundles.pop(0)
+            serialized_bundle = self.decompressor.expand(message, from_node_address)
+            if serialized_bundle is not None:
+                try:
+                    return Bundle.from_cbor(serialized_bundle), from_node_address
+                except Exception as e:
+                    warning('error during espnow bundle deserialization, ignoring bundle. error: {}'.format(e))
 
         return None, None
 
@@ -50,9 +84,21 @@ class EspNowCLA(PushBasedCLA):
         if node is not None:
             raise Exception('cannot send bundle to specific node with espnow cla')
 
-        if len(serialized_bundle) > 250:
-            warning('cannot forward bundle through espnow cla because it is longer than 250 bytes: {}'.format(len(serialized_bundle)))
+        if self.compressor is not None:
+            serialized_bundle = self.compressor.compress(serialized_bundle)
+
+        if len(serialized_bundle) > MAX_MESSAGE_LENGTH:
+            warning('cannot forward bundle through espnow cla because it is longer than {} bytes: {}'.format(MAX_MESSAGE_LENGTH, len(serialized_bundle)))
             return False
 
-        self.endpoint.send(BROADCAST_MAC, serialized_bundle)
+        if self.aggregator is None:
+            self.endpoint.send(BROADCAST_MAC, serialized_bundle)
+        else:
+            for message in self.aggregator.add(serialized_bundle):
+                self.endpoint.send(BROADCAST_MAC, message)
         return True
+
+    def get_next_deadline_millis(self) -> Optional[int]:
+        if self.aggregator is None:
+            return None
+        return self.aggregator.next_flush_millis()
@@ -0,0 +1,341 @@
+"""
+Link-local bundle header compression for the broadcast CLAs (LoRa, ESP-NOW).
+
+The primary block, per-hop blocks and block headers of a small bundle are replaced by a compact cbor array:
+    0x01 | [presence, (flags), destination, source, (report-to), creation time delta, sequence number delta,
+            (lifetime), check, {block type, value}..., payload]
+
+    EIDs          -> an index into the dictionary of the sender, defined in full ([index, scheme, ssp]) on first use
+                     and again every refresh_interval uses, so receivers that missed a definition catch up
+    creation time -> deltas to the reference of the source EID, which is sent with each definition of it
+    and sequence     ([index, scheme, ssp, creation time, sequence number])
+    defaults      -> elided: version 7, no crc, flags 'do not fragment', lifetime of 24 h, report-to == source node,
+                     hop limit 32, block numbers and block flags as written by dtn7zero
+    check         -> crc-16 of the expanded bundle without the payload block, a frame expanded with a stale
+                     dictionary (e.g. a lost definition) is dropped instead of delivered with wrong header fields
+
+Receivers keep a dictionary per neighbor (link address). The expansion restores the original bytes: bundles that
+do not re-encode identically (other extension blocks, crcs, fragments, foreign encodings) are sent plain.
+A compressed bundle starts with 0x01, plain bundles (cbor array) and aggregates (0x00) are told apart by it.
+"""
+from typing import Dict, List, Optional
+
+from dtn7zero.configuration import RUNNING_MICROPYTHON
+from dtn7zero.utility import debug
+
+if not RUNNING_MICROPYTHON:
+    from cbor2 import dumps, loads
+else:
+    from cbor import dumps, loads
+
+
+HEADER_COMPRESSION_MARKER = 0x01
+
+BLOCK_TYPE_PAYLOAD = 1
+BLOCK_TYPE_PREVIOUS_NODE = 6
+BLOCK_TYPE_BUNDLE_AGE = 7
+BLOCK_TYPE_HOP_COUNT = 10
+
+URI_SCHEME_DTN_ENCODED = 1
+URI_SCHEME_IPN_ENCODED = 2
+
+DEFAULT_BUNDLE_PROCESSING_CONTROL_FLAGS = 0x04  # do not fragment, as set by LocalEndpoint.start_transmission
+DEFAULT_LIFETIME = 3600 * 24 * 1000
+DEFAULT_HOP_LIMIT = 32
+DEFAULT_PREVIOUS_NODE_BLOCK_FLAGS = 0x10  # discard block if it cannot be processed, as set by the ForwardingEncoder
+
+PRESENCE_FLAGS = 0x01
+PRESENCE_REPORT_TO = 0x02
+PRESENCE_LIFETIME = 0x04
+
+
+def crc16(data: bytes) -> int:
+    # CRC-16/CCITT-FALSE
+    crc = 0xffff
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1
+        crc &= 0xffff
+    return crc
+
+
+def _eid_key(eid: list) -> tuple:
+    scheme, specific_part = eid
+    return scheme, tuple(specific_part) if isinstance(specific_part, list) else specific_part
+
+
+def _node_of(eid: tuple) -> tuple:
+    scheme, specific_part = eid
+    if scheme == URI_SCHEME_IPN_ENCODED and isinstance(specific_part, tuple):
+        return scheme, (specific_part[0], 0)
+    if scheme == URI_SCHEME_DTN_ENCODED and isinstance(specific_part, str) and specific_part.startswith('//') and '/' in specific_part[2:]:
+        return scheme, specific_part[:specific_part.index('/', 2) + 1]
+    return eid
+
+
+class _Fields:
+    # the header fields of a compressible bundle, EIDs as (scheme, specific part) with tuples for ipn
+    def __init__(self, flags, destination, source, report_to, creation_time, sequence_number, lifetime, blocks, payload):
+        self.flags = flags
+        self.destination = destination
+        self.source = source
+        self.report_to = report_to
+        self.creation_time = creation_time
+        self.sequence_number = sequence_number
+        self.lifetime = lifetime
+        self.blocks = blocks  # [(block type, eid | age | (hop limit, hop count))] in order, the payload block excluded
+        self.payload = payload
+
+
+def _parse(serialized_bundle: bytes) -> Optional[_Fields]:
+    # None if the bundle has anything the compressed form cannot express
+    try:
+        blocks = loads(serialized_bundle)
+    except Exception:
+        return None
+
+    if not isinstance(blocks, list) or len(blocks) < 2:
+        return None
+
+    primary_block = blocks[0]
+    if len(primary_block) != 8 or primary_block[0] != 7 or primary_block[2] != 0:
+        return None
+
+    canonical_blocks = []
+    for block in blocks[1:-1]:
+        if len(block) != 5 or block[3] != 0:
+            return None
+        if block[0] == BLOCK_TYPE_PREVIOUS_NODE:
+            canonical_blocks.append((BLOCK_TYPE_PREVIOUS_NODE, _eid_key(loads(block[4]))))
+        elif block[0] == BLOCK_TYPE_BUNDLE_AGE:
+            canonical_blocks.append((BLOCK_TYPE_BUNDLE_AGE, loads(block[4])))
+        elif block[0] == BLOCK_TYPE_HOP_COUNT:
+            canonical_blocks.append((BLOCK_TYPE_HOP_COUNT, tuple(loads(block[4]))))
+        else:
+            return None
+
+    payload_block = blocks[-1]
+    if len(payload_block) != 5 or payload_block[0] != BLOCK_TYPE_PAYLOAD:
+        return None
+
+    return _Fields(primary_block[1], _eid_key(primary_block[3]), _eid_key(primary_block[4]), _eid_key(primary_block[5]),
+                   primary_block[6][0], primary_block[6][1], primary_block[7], canonical_blocks, payload_block[4])
+
+
+def _serialize(fields: _Fields) -> (bytes, bytes):
+    # returns (bundle head without the payload block, payload block and end), the bundle is their concatenation
+    parts = [b'\x9f', dumps([7, fields.flags, 0, list(fields.destination), list(fields.source), list(fields.report_to),
+                             [fields.creation_time, fields.sequence_number], fields.lifetime])]
+
+    # block numbers as assigned by py_dtn7 and the ForwardingEncoder: payload 1, the others counted up from 2 in order,
+    # an inserted previous node block gets the next free number
+    block_numbers = []
+    next_number = 2
+    for block_type, _ in fields.blocks:
+        if block_type == BLOCK_TYPE_PREVIOUS_NODE:
+            block_numbers.append(None)
+        else:
+            block_numbers.append(next_number)
+            next_number += 1
+
+    for (block_type, value), block_number in zip(fields.blocks, block_numbers):
+        if block_type == BLOCK_TYPE_PREVIOUS_NODE:
+            parts.append(dumps([block_type, next_number, DEFAULT_PREVIOUS_NODE_BLOCK_FLAGS, 0, dumps(list(value))]))
+        elif block_type == BLOCK_TYPE_BUNDLE_AGE:
+            parts.append(dumps([block_type, block_number, 0, 0, dumps(value)]))
+        else:
+            parts.append(dumps([block_type, block_number, 0, 0, dumps(list(value))]))
+
+    return b''.join(parts), dumps([BLOCK_TYPE_PAYLOAD, 1, 0, 0, fields.payload]) + b'\xff'
+
+
+class HeaderCompressor:
+
+    def __init__(self, dictionary_size: int, refresh_interval: int):
+        """ Compresses the bundles sent by this node, with one EID dictionary for all neighbors (broadcast).
+
+        dictionary_size: EIDs kept (at least 4, one bundle uses up to 4), the least recently used one makes room
+        refresh_interval: uses of an EID after which its definition is sent again
+        """
+        self.dictionary_size = max(dictionary_size, 4)
+        self.refresh_interval = refresh_interval
+
+        # eid -> [index, uses since definition, reference creation time, reference sequence number, last used]
+        self._entries: Dict[tuple, list] = {}
+        self._counter = 0
+
+        self.compressed_count = 0
+        self.plain_count = 0  # bundles the compressed form cannot express
+
+    def compress(self, serialized_bundle: bytes) -> bytes:
+        """
+        returns the compressed bundle, or the serialized bundle itself if it cannot be compressed losslessly
+        """
+        fields = _parse(serialized_bundle)
+
+        if fields is None or b''.join(_serialize(fields)) != serialized_bundle:
+            self.plain_count += 1
+            return serialized_bundle
+
+        self._counter += 1
+        presence = 0
+        items = [None]  # the presence bits, set once known
+
+        if fields.flags != DEFAULT_BUNDLE_PROCESSING_CONTROL_FLAGS:
+            presence |= PRESENCE_FLAGS
+            items.append(fields.flags)
+
+        items.append(self._encode_eid(fields.destination))
+        items.append(self._encode_eid(fields.source, fields.creation_time, fields.sequence_number))
+        # taken before a following definition of the same eid (e.g. as report-to) clears the reference
+        reference_creation_time, reference_sequence_number = self._entries[fields.source][2:4]
+
+        if fields.report_to != _node_of(fields.source):
+            presence |= PRESENCE_REPORT_TO
+            items.append(self._encode_eid(fields.report_to))
+
+        items.append(fields.creation_time - reference_creation_time)
+        items.append(fields.sequence_number - reference_sequence_number)
+
+        if fields.lifetime != DEFAULT_LIFETIME:
+            presence |= PRESENCE_LIFETIME
+            items.append(fields.lifetime)
+
+        items.append(crc16(_serialize(fields)[0]))
+
+        for block_type, value in fields.blocks:
+            items.append(block_type)
+            if block_type == BLOCK_TYPE_PREVIOUS_NODE:
+                items.append(self._encode_eid(value))
+            elif block_type == BLOCK_TYPE_HOP_COUNT:
+                items.append(value[1] if value[0] == DEFAULT_HOP_LIMIT else list(value))
+            else:
+                items.append(value)
+
+        items.append(fields.payload)
+        items[0] = presence
+
+        compressed_bundle = bytes((HEADER_COMPRESSION_MARKER,)) + dumps(items)
+        if len(compressed_bundle) >= len(serialized_bundle):
+            self.plain_count += 1
+            return serialized_bundle
+
+        self.compressed_count += 1
+        return compressed_bundle
+
+    def _encode_eid(self, eid: tuple, creation_time: int = None, sequence_number: int = None):
+        entry = self._entries.get(eid)
+
+        if entry is None:
+            if len(self._entries) < self.dictionary_size:
+                index = len(self._entries)
+            else:
+                # the least recently used eid not used by this bundle makes room, its index is reused
+                oldest = min((x for x in self._entries.items() if x[1][4] != self._counter), key=lambda x: x[1][4])
+                index = oldest[1][0]
+                del self._entries[oldest[0]]
+            entry = [index, self.refresh_interval, None, None, 0]
+            self._entries[eid] = entry
+
+        entry[4] = self._counter
+
+        with_reference = creation_time is not None
+        if entry[1] < self.refresh_interval and (not with_reference or entry[2] is not None):
+            entry[1] += 1
+            return entry[0]
+
+        entry[1] = 0
+        entry[2], entry[3] = creation_time, sequence_number
+        if with_reference:
+            return [entry[0], eid[0], list(eid[1]) if isinstance(eid[1], tuple) else eid[1], creation_time, sequence_number]
+        return [entry[0], eid[0], list(eid[1]) if isinstance(eid[1], tuple) else eid[1]]
+
+
+class HeaderDecompressor:
+
+    def __init__(self, max_neighbors: int):
+        """ Expands the compressed bundles received from any neighbor, with one EID dictionary per neighbor.
+
+        max_neighbors: dictionaries kept, an arbitrary one is dropped to make room
+        """
+        self.max_neighbors = max_neighbors
+
+        # neighbor address -> index -> [eid, reference creation time, reference sequence number]
+        self._dictionaries: Dict[object, Dict[int, list]] = {}
+
+        self.failed_count = 0  # compressed bundles that could not be expanded (stale or missing dictionary entries)
+
+    def expand(self, message: bytes, neighbor) -> Optional[bytes]:
+        """
+        returns the serialized bundle of a received message (unchanged if not compressed), None if it cannot be expanded
+        """
+        if not message or message[0] != HEADER_COMPRESSION_MARKER:
+            return message
+
+        try:
+            serialized_bundle = self._expand(loads(message[1:]), neighbor)
+        except Exception as e:
+            debug('cannot expand compressed bundle from {}: {}'.format(neighbor, e))
+            serialized_bundle = None
+
+        if serialized_bundle is None:
+            self.failed_count += 1
+        return serialized_bundle
+
+    def _expand(self, items: List, neighbor) -> Optional[bytes]:
+        dictionary = self._dictionaries.get(neighbor)
+        if dictionary is None:
+            while self._dictionaries and len(self._dictionaries) >= self.max_neighbors:
+                del self._dictionaries[next(iter(self._dictionaries))]
+            dictionary = {}
+            self._dictionaries[neighbor] = dictionary
+
+        items = iter(items)
+        presence = next(items)
+
+        flags = next(items) if presence & PRESENCE_FLAGS else DEFAULT_BUNDLE_PROCESSING_CONTROL_FLAGS
+        destination = self._decode_eid(dictionary, next(items))[0]
+        source, reference_creation_time, reference_sequence_number = self._decode_eid(dictionary, next(items))
+        report_to = self._decode_eid(dictionary, next(items))[0] if presence & PRESENCE_REPORT_TO else _node_of(source)
+
+        if reference_creation_time is None:
+            raise ValueError('no creation time reference for the source eid')
+        creation_time = reference_creation_time + next(items)
+        sequence_number = reference_sequence_number + next(items)
+
+        lifetime = next(items) if presence & PRESENCE_LIFETIME else DEFAULT_LIFETIME
+        check = next(items)
+
+        blocks = []
+        item = next(items)
+        while not isinstance(item, (bytes, bytearray)):
+            value = next(items)
+            if item == BLOCK_TYPE_PREVIOUS_NODE:
+                value = self._decode_eid(dictionary, value)[0]
+            elif item == BLOCK_TYPE_HOP_COUNT:
+                value = (value[0], value[1]) if isinstance(value, list) else (DEFAULT_HOP_LIMIT, value)
+            elif item != BLOCK_TYPE_BUNDLE_AGE:
+                raise ValueError('unknown compressed block type {}'.format(item))
+            blocks.append((item, value))
+            item = next(items)
+
+        fields = _Fields(flags, destination, source, report_to, creation_time, sequence_number, lifetime, blocks, item)
+        head, tail = _serialize(fields)
+
+        if crc16(head) != check:
+            debug('compressed bundle from {} does not match its check, dictionary out of date'.format(neighbor))
+            return None
+        return head + tail
+
+    @staticmethod
+    def _decode_eid(dictionary: Dict[int, list], item) -> list:
+        if isinstance(item, int):
+            return dictionary[item]
+
+        # a definition: [index, scheme, ssp] or with the time reference [index, scheme, ssp, creation time, sequence number]
+        entry = [_eid_key(item[1:3]), None, None]
+        if len(item) == 5:
+            entry[1], entry[2] = item[3], item[4]
+        dictionary[item[0]] = entry
+        return entry
@@ -1,18 +1,21 @@
+import errno
+import heapq
 import socket
 import struct
-from typing import Optional, Dict, Tuple
-
-try:
-    from cbor2 import dumps
-except ImportError:
-    from cbor import dumps
+from typing import Optional, Dict, List, Tuple, Union
 
 from dtn7zero.configuration import CONFIGURATION, RUNNING_MICROPYTHON
-from dtn7zero.convergence_layer_adapters import PushBasedCLA
-from dtn7zero.data import Node
-from dtn7zero.utility import get_current_clock_millis, is_timestamp_older_than_timeout, debug, warning
+from dtn7zero.convergence_layer_adapters import PushBasedCLA, DeliveryReport
+from dtn7zero.data import Node, BundleInformation, SerializedBundleInformation
+from dtn7zero.readiness import ReadinessSelector
+from dtn7zero.serialization import read_header
+from dtn7zero.utility import get_current_clock_millis, is_timestamp_older_than_timeout, debug, warning, create_reentrant_lock
 from py_dtn7 import Bundle
 
+if not RUNNING_MICROPYTHON:
+    import mmap
+    import tempfile
+
 
 TYPE_BYTES = 0x40
 
@@ -37,80 +40,189 @@ class ReceivedInvalidDataOnSocketException(Exception):
     pass
 
 
-def _poll_one_byte(connection):
-    try:
-        buf = connection.recv(1)
-    # if a non-blocking read fails we have read everything there is to read at the moment
-    # ,but we need to read exactly n bytes
-    except OSError:
-        return None
-    else:
-        # on 0 bytes received the socket connection is closed
-        # the desired 1 byte could not be received -> incomplete data -> discard
-        if len(buf) == 0:
-            raise RemoteClosedConnectionException()
+# "busy" errors of a non-blocking socket: MicroPython + CPython -> EAGAIN/EWOULDBLOCK, CPython+Windows -> 10035
+_WOULD_BLOCK_ERRNOS = (errno.EAGAIN, getattr(errno, 'EWOULDBLOCK', errno.EAGAIN), 10035)
 
-        return buf
 
+def _receive_into(connection, buffer):
+    # MicroPython sockets only offer readinto
+    if RUNNING_MICROPYTHON:
+        return connection.readinto(buffer)
+    return connection.recv_into(buffer)
 
-def _receive_exactly_n_bytes(connection, num_bytes):
-    result = b''
 
-    while True:
-        try:
-            buf = connection.recv(min(num_bytes, CONFIGURATION.SOCKET_RECEIVE_BUFFER_SIZE))
-        # if a non-blocking read fails we have read everything there is to read at the moment
-        # ,but we need to read exactly n bytes
-        except OSError:
-            pass
+# number of length bytes following the initial byte of a definite length cbor byte-string, with their struct format
+_CBOR_LENGTH_FORMATS = {
+    _CBOR_UINT8_FOLLOWS: (1, '!B'),
+    _CBOR_UINT16_FOLLOWS: (2, '!H'),
+    _CBOR_UINT32_FOLLOWS: (4, '!I'),
+    _CBOR_UINT64_FOLLOWS: (8, '!Q'),
+}
+
+
+def _create_spill_buffer(length):
+    """
+    a writable memory-mapped temporary file, its pages are written back to the file instead of staying resident,
+    the file is deleted once the buffer is released
+    """
+    with tempfile.TemporaryFile(dir=CONFIGURATION.MTCP.SPILL_DIRECTORY) as spill_file:
+        spill_file.truncate(length)
+        return mmap.mmap(spill_file.fileno(), length)
+
+
+def is_spilled(serialized_bundle) -> bool:
+    """
+    whether a received frame was spilled to a memory-mapped temporary file (see MTCP.SPILL_THRESHOLD_BYTES)
+    """
+    return not isinstance(serialized_bundle, bytes)
+
+
+class _FrameReceiver:
+    """
+    Incremental parser of the cbor byte-string frames of one mtcp connection.
+
+    Reads whatever the non-blocking socket has into a per-connection buffer (several small frames per read) and
+    keeps partly received frames between polls, so a slowly sending peer never blocks the caller.
+    The remainder of a large frame is read directly into the frame, a frame above MTCP.SPILL_THRESHOLD_BYTES
+    directly into a memory-mapped temporary file, which is handed out instead of bytes.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray(CONFIGURATION.SOCKET_RECEIVE_BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # the unparsed bytes are self._buffer[self._start:self._end]
+        self._end = 0
+
+        self._frame = None  # the partly received frame
+        self._frame_view = None
+        self._frame_received = 0
+
+        self.received_data = False  # whether the last poll read anything
+
+    def poll(self, connection) -> Optional[bytes]:
+        """
+        returns the next complete frame or None if it is not fully received yet
+        """
+        self.received_data = False
+
+        while True:
+            frame = self._parse()
+
+            if frame is not None:
+                return frame
+
+            if not self._receive(connection):
+                return None
+
+    def _parse(self):
+        if self._frame is None and not self._parse_header():
+            return None
+
+        remaining = len(self._frame) - self._frame_received
+        available = min(remaining, self._end - self._start)
+
+        if available > 0:
+            self._frame_view[self._frame_received:self._frame_received + available] = self._view[self._start:self._start + available]
+            self._frame_received += available
+            self._start += available
+
+        if self._frame_received < len(self._frame):
+            return None
+
+        if isinstance(self._frame, bytearray):
+            frame = bytes(self._frame)
         else:
-            # on 0 bytes received the socket connection is closed
-            # the desired num_bytes could not be received in total -> incomplete data -> discard
-            if len(buf) == 0:
-                raise RemoteClosedConnectionException()
+            self._frame_view.release()
+            frame = self._frame  # a copy would load the spilled frame into RAM
+
+        self._frame, self._frame_view = None, None
+        return frame
+
+    def _parse_header(self):
+        if self._start == self._end:
+            return False
+
+        header = self._buffer[self._start]
+
+        if header & _CBOR_TYPE_MASK != TYPE_BYTES:
+            raise ReceivedInvalidDataOnSocketException('mtcp cla received invalid header: only accepting type byte-string')
 
-            result += buf
-            num_bytes -= len(buf)
+        tag_aux = header & _CBOR_INFO_BITS
 
-            if num_bytes == 0:
-                return result
+        if tag_aux <= 23:
+            length = tag_aux
+            self._start += 1
+        elif tag_aux in _CBOR_LENGTH_FORMATS:
+            num_bytes, length_format = _CBOR_LENGTH_FORMATS[tag_aux]
 
+            if self._end - self._start < 1 + num_bytes:
+                return False
+
+            length = struct.unpack_from(length_format, self._buffer, self._start + 1)[0]
+            self._start += 1 + num_bytes
+        else:
+            raise ReceivedInvalidDataOnSocketException('mtcp cla received invalid header: only accepting definite length byte-strings')
+
+        if length > CONFIGURATION.MTCP.MAX_FRAME_LENGTH_BYTES:
+            raise ReceivedInvalidDataOnSocketException('mtcp cla received frame header of {} bytes, more than the maximum of {} bytes'.format(length, CONFIGURATION.MTCP.MAX_FRAME_LENGTH_BYTES))
 
-def _read_full_message_or_none(connection):
-    header = _poll_one_byte(connection)
+        spill_threshold = CONFIGURATION.MTCP.SPILL_THRESHOLD_BYTES
+
+        try:
+            if spill_threshold is not None and length >= max(spill_threshold, 1):
+                self._frame = _create_spill_buffer(length)
+            else:
+                self._frame = bytearray(length)
+        except (MemoryError, OSError) as e:
+            raise ReceivedInvalidDataOnSocketException('mtcp cla cannot allocate a frame of {} bytes: {}'.format(length, e))
+        self._frame_view = memoryview(self._frame)
+        self._frame_received = 0
+        return True
+
+    def _receive(self, connection):
+        """
+        returns False if nothing could be read at the moment
+        """
+        if self._start == self._end:
+            self._start, self._end = 0, 0
+
+        # the rest of a large frame goes directly into the frame, without the detour over the buffer
+        into_frame = self._frame is not None and self._start == self._end and len(self._frame) - self._frame_received >= len(self._buffer)
+
+        if into_frame:
+            target = self._frame_view[self._frame_received:]
+        else:
+            if self._end == len(self._buffer):
+                # only a partial header can be left, move it to the front
+                self._buffer[:self._end - self._start] = self._buffer[self._start:self._end]
+                self._start, self._end = 0, self._end - self._start
+            target = self._view[self._end:]
 
-    if header is None:
-        return None
+        try:
+            num_bytes = _receive_into(connection, target)
+        # if a non-blocking read fails we have read everything there is to read at the moment
+        except OSError:
+            return False
 
-    header = struct.unpack_from('!B', header, 0)[0]
+        # MicroPython's readinto returns None instead of raising if no data is available
+        if num_bytes is None:
+            return False
 
-    tag = header & _CBOR_TYPE_MASK
-    tag_aux = header & _CBOR_INFO_BITS
+        # on 0 bytes received the socket connection is closed, a partly received frame is incomplete -> discard
+        if num_bytes == 0:
+            raise RemoteClosedConnectionException()
 
-    if tag != TYPE_BYTES:
-        raise ReceivedInvalidDataOnSocketException('mtcp cla received invalid header: only accepting type byte-string')
+        if into_frame:
+            self._frame_received += num_bytes
+        else:
+            self._end += num_bytes
 
-    if tag_aux <= 23:
-        aux = tag_aux
-    elif tag_aux == _CBOR_UINT8_FOLLOWS:
-        data = _receive_exactly_n_bytes(connection, 1)
-        aux = struct.unpack_from('!B', data, 0)[0]
-    elif tag_aux == _CBOR_UINT16_FOLLOWS:
-        data = _receive_exactly_n_bytes(connection, 2)
-        aux = struct.unpack_from('!H', data, 0)[0]
-    elif tag_aux == _CBOR_UINT32_FOLLOWS:
-        data = _receive_exactly_n_bytes(connection, 4)
-        aux = struct.unpack_from('!I', data, 0)[0]
-    elif tag_aux == _CBOR_UINT64_FOLLOWS:
-        data = _receive_exactly_n_bytes(connection, 8)
-        aux = struct.unpack_from('!Q', data, 0)[0]
-    else:
-        raise ReceivedInvalidDataOnSocketException('mtcp cla received invalid header: only accepting definite length byte-strings')
+        self.received_data = True
 
-    return _receive_exactly_n_bytes(connection, aux)
+        return True
 
 
-def _send_message(address, port, message):
+def _open_send_connection(address, port):
     # create a standard ipv4 stream socket
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     client_socket.settimeout(0)
@@ -138,21 +250,33 @@ def _send_message(address, port, message):
         # this will raise an exception on non-blocking sockets
         pass
 
+    return client_socket
+
+
+def _is_would_block_error(e):
+    return e.args and e.args[0] in _WOULD_BLOCK_ERRNOS
+
+
+def _send_all(client_socket, message, connected):
+    """
+    connected: the socket already sent data successfully, every error except "busy" means the connection is broken
+    """
     deadlock_check = get_current_clock_millis()
     while len(message) > 0 and not is_timestamp_older_than_timeout(deadlock_check, CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_STALLED_SEND):
         try:
             bytes_sent = client_socket.send(message)
         # Windows behaviour??? If other end is forcibly closed it raises an ConnectionResetError -> OSError
-        except OSError:
-            # We ignore all OSErrors.
+        except OSError as e:
+            # On a new connection we ignore all OSErrors.
             # The correct way would be to check the errno for "busy" (MicroPython -> 11, CPython+Windows -> 10035)
-            # but, because it is implementation dependent, and we do not expect the receiver to immediately close the
-            # connection, we accept the rare case of a deadlock-timeout because of an early-closed socket.
-            pass
+            # but, because it is implementation dependent (also while connecting), and we do not expect the receiver
+            # to immediately close the connection, we accept the rare case of a deadlock-timeout because of an
+            # early-closed socket.
+            if connected and not _is_would_block_error(e):
+                raise RemoteClosedConnectionException(str(e))
         else:
             # on 0 bytes sent the socket connection is closed
             if bytes_sent == 0:
-                client_socket.close()
                 raise RemoteClosedConnectionException("0 bytes")
             # update the message and length to send
             message = message[bytes_sent:]
@@ -160,13 +284,84 @@ def _send_message(address, port, message):
             deadlock_check = get_current_clock_millis()
 
     if len(message) > 0:
-        client_socket.close()
         raise RemoteStalledConnectionException()
 
-    client_socket.close()
+
+def _is_send_connection_alive(client_socket):
+    # an mtcp receiver never sends data, a readable send connection was closed (or reset) by the remote
+    try:
+        client_socket.recv(1)
+    except OSError as e:
+        return _is_would_block_error(e)
+    return False
+
+
+def _close_connection(connection):
+    if not RUNNING_MICROPYTHON:
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # already closed by the remote
+    connection.close()
+
+
+def _send_message(address, port, message):
+    """
+    sends one message over a new connection, which is closed afterwards
+    """
+    client_socket = _open_send_connection(address, port)
+
+    try:
+        _send_all(client_socket, message, False)
+    finally:
+        client_socket.close()
+
+
+def _encode_frame_header(length):
+    """
+    the cbor byte-string head of a frame, the bundle bytes follow unchanged
+    """
+    if length <= 23:
+        return struct.pack('!B', TYPE_BYTES | length)
+    if length <= 0xff:
+        return struct.pack('!BB', TYPE_BYTES | _CBOR_UINT8_FOLLOWS, length)
+    if length <= 0xffff:
+        return struct.pack('!BH', TYPE_BYTES | _CBOR_UINT16_FOLLOWS, length)
+    if length <= 0xffffffff:
+        return struct.pack('!BI', TYPE_BYTES | _CBOR_UINT32_FOLLOWS, length)
+    return struct.pack('!BQ', TYPE_BYTES | _CBOR_UINT64_FOLLOWS, length)
+
+
+class _OutgoingConnection:
+    """
+    A pooled outgoing connection to one peer and the queue of bundles to send over it.
+
+    Frames are written without blocking, as much as the socket takes, the rest of a partly written frame is
+    written on the next attempt.
+    """
+
+    def __init__(self, address_tuple):
+        self.address_tuple = address_tuple
+
+        self.connection = None
+        self.connected = False  # data went out over the connection
+
+        self.queue = []  # (node, serialized bundle) waiting to be sent
+        self.current = None  # (node, serialized bundle) being sent
+        self.parts = []  # memoryviews of the unsent rest of the current frame
+        self.frame_started = False  # a part of the current frame went out
+        self.reconnected = False  # the current frame is already retried over a new connection
+
+        self.last_progress = get_current_clock_millis()
+        self.last_used = self.last_progress
+
+    @property
+    def is_idle(self):
+        return self.current is None and not self.queue
 
 
 class MTcpCLA(PushBasedCLA):
+    sends_are_queued = True
 
     def __init__(self):
         # a standard ipv4 stream socket
@@ -185,115 +380,343 @@ class MTcpCLA(PushBasedCLA):
 
         self.open_receive_connections: Dict[str, (socket.socket, int)] = {}
         self.gracefully_shutdown_connections: Dict[str, socket.socket] = {}
-
-    def poll(self, bundle_id: str = None, node: Node = None) -> Tuple[Optional[Bundle], Optional[str]]:
+        # the partly received frame of every incoming connection, kept while it is open or gracefully shut down
+        self.frame_receivers: Dict[str, _FrameReceiver] = {}
+
+        # only readable sockets are touched, thousands of idle incoming connections cost nothing per poll
+        self._receive_selector = ReadinessSelector()
+        self._receive_selector.register(self.socket)
+        self._receive_connection_addresses: Dict[socket.socket, Tuple[str, int]] = {}
+        self._ready_sockets: List[socket.socket] = []
+        # (inactivity deadline, address) min-heap of the open receive connections, refreshed lazily on expiry
+        self._receive_timeouts: List[Tuple[int, Tuple[str, int]]] = []
+
+        # outgoing connections are kept open and reused for all following bundles to the same peer,
+        # send_to() only queues the bundle, the queues are written without blocking on every send_to() and poll
+        self.open_send_connections: Dict[Tuple[str, int], _OutgoingConnection] = {}
+        self._delivery_reports: List[DeliveryReport] = []
+        # a ThreadedCLA sends and polls from different threads
+        self._send_lock = create_reentrant_lock()
+
+    def poll(self, bundle_id: str = None, node: Node = None) -> Tuple[Optional[Union[Bundle, BundleInformation]], Optional[str]]:
         if bundle_id is not None or node is not None:
             raise Exception('cannot poll specific bundle from specific node with mtcp cla')
 
-        # check for new incoming connections
-        self._check_for_new_connections()
-
-        # try to receive one bundle
-        serialized_bundle, from_node_address = self._poll_from_open_receive_connections()
-
-        if serialized_bundle is None:
-            serialized_bundle, from_node_address = self._poll_from_gracefully_shutdown_connections()
+        serialized_bundle, from_node_address = self.poll_serialized()
 
         if serialized_bundle is None:
             return None, None
 
         try:
+            if is_spilled(serialized_bundle) or CONFIGURATION.PAYLOAD_MEMORYVIEWS:
+                # only the header is decoded, the payload stays in the receive buffer (or spill file) until accessed
+                return SerializedBundleInformation(serialized_bundle, header=read_header(serialized_bundle)), from_node_address
             return Bundle.from_cbor(serialized_bundle), from_node_address
         except Exception as e:
             warning('error during mtcp bundle deserialization, ignoring bundle. error: {}'.format(e))
         return None, None
 
-    def _poll_from_open_receive_connections(self):
-        serialized_bundle, from_node_address = None, None
+    def poll_serialized(self) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        a frame above MTCP.SPILL_THRESHOLD_BYTES is returned as a memory-mapped temporary file (see is_spilled)
+        """
+        self._update_send_connections()
+        self._close_inactive_receive_connections()
 
-        for address_tuple, (connection, last_received) in tuple(self.open_receive_connections.items()):
-            try:
-                serialized_bundle = _read_full_message_or_none(connection)
-            except RemoteClosedConnectionException:
-                debug('remote closed down incoming mtcp connection {}'.format(address_tuple))
-                if not RUNNING_MICROPYTHON:
-                    connection.shutdown(socket.SHUT_RDWR)
-                connection.close()
-                del self.open_receive_connections[address_tuple]
-            except ReceivedInvalidDataOnSocketException as e:
-                warning('incoming mtcp connection {} sent invalid data, discarding connection, error: {}'.format(address_tuple, e))
-                if not RUNNING_MICROPYTHON:
-                    connection.shutdown(socket.SHUT_RDWR)
-                connection.close()
-                del self.open_receive_connections[address_tuple]
+        if not self._ready_sockets:
+            self._ready_sockets = self._receive_selector.select(0)
+
+        # try to receive one bundle, the ready connections are served round-robin
+        while self._ready_sockets:
+            connection = self._ready_sockets.pop(0)
+
+            # check for new incoming connections
+            if connection is self.socket:
+                self._check_for_new_connections()
+                continue
+
+            serialized_bundle, from_node_address = self._poll_from_receive_connection(connection)
+
+            if serialized_bundle is not None:
+                # more frames may already be in the receive buffer of the connection
+                self._ready_sockets.append(connection)
+                return serialized_bundle, from_node_address
+
+        return None, None
+
+    def get_selectable_sockets(self) -> Optional[List]:
+        # on CPython with epoll/kqueue the selector of the receive connections can be waited on as a whole
+        if self._receive_selector.nestable:
+            return [self._receive_selector]
+        return [self.socket] + list(self._receive_connection_addresses)
+
+    def get_next_deadline_millis(self) -> Optional[int]:
+        # inactive receive and send connections are closed on the next poll after their timeout
+        deadlines = []
+        if self._ready_sockets:
+            deadlines.append(get_current_clock_millis())  # frames left to read from already readable connections
+        if self._receive_timeouts:
+            deadlines.append(self._receive_timeouts[0][0])
+        for outgoing in tuple(self.open_send_connections.values()):
+            if outgoing.is_idle:
+                deadlines.append(outgoing.last_used + CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_INACTIVE_SEND)
             else:
-                if serialized_bundle is not None:
-                    from_node_address = address_tuple[0]
-                    self.open_receive_connections[address_tuple] = (connection, get_current_clock_millis())
-                    break
-                elif is_timestamp_older_than_timeout(last_received, CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_INACTIVE_RECEIVE):
-                    if not RUNNING_MICROPYTHON:
-                        debug('gracefully closing incoming mtcp connection {} due to inactivity timeout'.format(address_tuple))
-                        connection.shutdown(socket.SHUT_WR)
-                        self.gracefully_shutdown_connections[address_tuple] = connection
-                    else:
-                        debug('forcefully closing incoming mtcp connection {} due to inactivity timeout (no shutdown support on micropython)'.format(address_tuple))
-                        connection.close()
-                    del self.open_receive_connections[address_tuple]
-
-        return serialized_bundle, from_node_address
-
-    def _poll_from_gracefully_shutdown_connections(self):
-        serialized_bundle, from_node_address = None, None
-
-        for address_tuple, connection in tuple(self.gracefully_shutdown_connections.items()):
-            try:
-                serialized_bundle = _read_full_message_or_none(connection)
-            except RemoteClosedConnectionException:
+                # the socket did not take the whole frame yet, try again soon
+                deadlines.append(get_current_clock_millis() + CONFIGURATION.MTCP.SEND_RETRY_MILLISECONDS)
+        return min(deadlines) if deadlines else None
+
+    def poll_delivery_reports(self) -> List[DeliveryReport]:
+        with self._send_lock:
+            reports, self._delivery_reports = self._delivery_reports, []
+        return reports
+
+    def close(self):
+        """
+        closes the listening socket and all open connections
+        """
+        for outgoing in self.open_send_connections.values():
+            if outgoing.connection is not None:
+                _close_connection(outgoing.connection)
+        for connection, _ in self.open_receive_connections.values():
+            _close_connection(connection)
+        for connection in self.gracefully_shutdown_connections.values():
+            connection.close()
+
+        self.open_send_connections.clear()
+        self.open_receive_connections.clear()
+        self.gracefully_shutdown_connections.clear()
+        self.frame_receivers.clear()
+        self._receive_connection_addresses.clear()
+        self._ready_sockets = []
+        self._receive_timeouts = []
+
+        self._receive_selector.close()
+        self.socket.close()
+
+    def _poll_from_receive_connection(self, connection):
+        address_tuple = self._receive_connection_addresses.get(connection)
+        if address_tuple is None:
+            return None, None  # closed in the meantime
+
+        gracefully_shutdown = address_tuple in self.gracefully_shutdown_connections
+        frame_receiver = self.frame_receivers[address_tuple]
+
+        try:
+            serialized_bundle = frame_receiver.poll(connection)
+        except RemoteClosedConnectionException:
+            if gracefully_shutdown:
                 debug('gracefully shutdown mtcp connection closed by remote {}'.format(address_tuple))
-                connection.close()
-                del self.gracefully_shutdown_connections[address_tuple]
-            except ReceivedInvalidDataOnSocketException as e:
+            else:
+                debug('remote closed down incoming mtcp connection {}'.format(address_tuple))
+            self._remove_receive_connection(address_tuple, connection)
+            return None, None
+        except ReceivedInvalidDataOnSocketException as e:
+            if gracefully_shutdown:
                 debug('gracefully shutdown mtcp connection {} sent invalid data, discarding connection, error: {}'.format(address_tuple, e))
-                connection.close()
-                del self.gracefully_shutdown_connections[address_tuple]
             else:
-                if serialized_bundle is not None:
-                    from_node_address = address_tuple[0]
-                    break
+                warning('incoming mtcp connection {} sent invalid data, discarding connection, error: {}'.format(address_tuple, e))
+            self._remove_receive_connection(address_tuple, connection)
+            return None, None
+
+        # a complete bundle, or a large bundle still being received
+        if not gracefully_shutdown and (serialized_bundle is not None or frame_receiver.received_data):
+            self.open_receive_connections[address_tuple] = (connection, get_current_clock_millis())
+
+        if serialized_bundle is None:
+            return None, None
+
+        return serialized_bundle, address_tuple[0]
+
+    def _remove_receive_connection(self, address_tuple, connection):
+        self._receive_selector.unregister(connection)
 
-        return serialized_bundle, from_node_address
+        if address_tuple in self.open_receive_connections:
+            _close_connection(connection)
+            del self.open_receive_connections[address_tuple]
+        else:
+            connection.close()
+            del self.gracefully_shutdown_connections[address_tuple]
+
+        del self.frame_receivers[address_tuple]
+        del self._receive_connection_addresses[connection]
+
+    def _close_inactive_receive_connections(self):
+        now = get_current_clock_millis()
+
+        while self._receive_timeouts and self._receive_timeouts[0][0] <= now:
+            _, address_tuple = heapq.heappop(self._receive_timeouts)
+
+            entry = self.open_receive_connections.get(address_tuple)
+            if entry is None:
+                continue  # closed in the meantime
+
+            connection, last_received = entry
+            deadline = last_received + CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_INACTIVE_RECEIVE
+
+            if deadline > now:
+                # received data since the entry was made
+                heapq.heappush(self._receive_timeouts, (deadline, address_tuple))
+            elif not RUNNING_MICROPYTHON:
+                debug('gracefully closing incoming mtcp connection {} due to inactivity timeout'.format(address_tuple))
+                connection.shutdown(socket.SHUT_WR)
+                self.gracefully_shutdown_connections[address_tuple] = connection
+                del self.open_receive_connections[address_tuple]
+            else:
+                debug('forcefully closing incoming mtcp connection {} due to inactivity timeout (no shutdown support on micropython)'.format(address_tuple))
+                self._remove_receive_connection(address_tuple, connection)
 
     def _check_for_new_connections(self):
-        if len(self.open_receive_connections) < CONFIGURATION.MTCP.MAX_CONNECTIONS_STATE_OPEN_RECEIVE:
+        while len(self.open_receive_connections) < CONFIGURATION.MTCP.MAX_CONNECTIONS_STATE_OPEN_RECEIVE:
             try:
                 client_socket, address_tuple = self.socket.accept()
             except OSError:
                 # no new connect request waiting
-                pass
-            else:
-                # change to non-blocking mode to be able to poll without blocking
-                client_socket.settimeout(0)
-
-                # we allow multiple connections from one IP address, because if we accept the connection, the whole bundle
-                #  could be already transmitted before we can close the connection from our checks
-                #  -> would lead to false positive on the sender side
-                # next best thing: limit number of open-receive-connections
-                # print('new mtcp receive connection opened from address {}'.format(address_tuple))
-                self.open_receive_connections[address_tuple] = (client_socket, get_current_clock_millis())
+                return
+
+            # change to non-blocking mode to be able to poll without blocking
+            client_socket.settimeout(0)
+
+            # we allow multiple connections from one IP address, because if we accept the connection, the whole bundle
+            #  could be already transmitted before we can close the connection from our checks
+            #  -> would lead to false positive on the sender side
+            # next best thing: limit number of open-receive-connections
+            # print('new mtcp receive connection opened from address {}'.format(address_tuple))
+            now = get_current_clock_millis()
+            self.open_receive_connections[address_tuple] = (client_socket, now)
+            self.frame_receivers[address_tuple] = _FrameReceiver()
+            self._receive_connection_addresses[client_socket] = address_tuple
+            self._receive_selector.register(client_socket)
+            heapq.heappush(self._receive_timeouts, (now + CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_INACTIVE_RECEIVE, address_tuple))
+
+            # the first bundle may already be waiting
+            self._ready_sockets.append(client_socket)
 
     def send_to(self, node: Optional[Node], serialized_bundle: bytes) -> bool:
+        """
+        queues the bundle for the node, returns False if the node has no mtcp address or its queue is full,
+        the outcome of the actual send is available through poll_delivery_reports()
+        """
         if node is None:
             raise Exception('cannot send bundle to unspecified node with mtcp cla')
 
-        message = dumps(serialized_bundle)
+        if CONFIGURATION.IPND.IDENTIFIER_MTCP not in node.clas:
+            return False
 
-        if CONFIGURATION.IPND.IDENTIFIER_MTCP in node.clas:
-            try:
-                port = node.clas[CONFIGURATION.IPND.IDENTIFIER_MTCP]
-                _send_message(node.address, port, message)
-            except (RemoteClosedConnectionException, RemoteStalledConnectionException):
-                del node.clas[CONFIGURATION.IPND.IDENTIFIER_MTCP]  # the node can re-announce it, but currently we cannot connect
+        address_tuple = (node.address, node.clas[CONFIGURATION.IPND.IDENTIFIER_MTCP])
+
+        with self._send_lock:
+            outgoing = self.open_send_connections.get(address_tuple)
+
+            if outgoing is None:
+                if not self._make_room_for_send_connection():
+                    return False
+                outgoing = self.open_send_connections[address_tuple] = _OutgoingConnection(address_tuple)
+            elif len(outgoing.queue) >= CONFIGURATION.MTCP.MAX_QUEUED_BUNDLES_PER_PEER:
                 return False
+
+            outgoing.queue.append((node, serialized_bundle))
+
+            # small bundles usually go out right away
+            self._write(outgoing)
+
+        return True
+
+    def _make_room_for_send_connection(self):
+        if len(self.open_send_connections) < CONFIGURATION.MTCP.MAX_CONNECTIONS_STATE_OPEN_SEND:
             return True
-        return False
+
+        # keep the pool bounded, the least recently used idle connection makes room
+        idle = [x for x in self.open_send_connections.values() if x.is_idle]
+        if not idle:
+            return False
+
+        self._remove_send_connection(min(idle, key=lambda x: x.last_used))
+        return True
+
+    def _update_send_connections(self):
+        with self._send_lock:
+            for outgoing in tuple(self.open_send_connections.values()):
+                if not outgoing.is_idle:
+                    self._write(outgoing)
+                elif is_timestamp_older_than_timeout(outgoing.last_used, CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_INACTIVE_SEND):
+                    debug('closing outgoing mtcp connection {} due to inactivity timeout'.format(outgoing.address_tuple))
+                    self._remove_send_connection(outgoing)
+
+    def _write(self, outgoing: _OutgoingConnection):
+        while True:
+            if outgoing.current is None:
+                if not outgoing.queue:
+                    return
+
+                outgoing.current = outgoing.queue.pop(0)
+                serialized_bundle = outgoing.current[1]
+                outgoing.parts = [memoryview(_encode_frame_header(len(serialized_bundle))), memoryview(serialized_bundle)]
+                outgoing.frame_started = False
+                outgoing.reconnected = False
+                outgoing.last_progress = get_current_clock_millis()
+
+                # an idle pooled connection may have been closed by the remote in the meantime
+                if outgoing.connection is not None and not _is_send_connection_alive(outgoing.connection):
+                    debug('pooled outgoing mtcp connection {} was closed by remote, reconnecting'.format(outgoing.address_tuple))
+                    self._disconnect(outgoing)
+
+            if outgoing.connection is None:
+                outgoing.connection = _open_send_connection(*outgoing.address_tuple)
+                outgoing.connected = False
+
+            try:
+                bytes_sent = outgoing.connection.send(outgoing.parts[0])
+            # Windows behaviour??? If other end is forcibly closed it raises an ConnectionResetError -> OSError
+            except OSError as e:
+                # errors of a new connection are ignored until the stalled-send timeout (see _send_all)
+                if outgoing.connected and not _is_would_block_error(e):
+                    bytes_sent = 0
+                elif is_timestamp_older_than_timeout(outgoing.last_progress, CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_STALLED_SEND):
+                    self._fail(outgoing, 'stalled')
+                    return
+                else:
+                    return  # the socket is busy, continue later
+
+            # on 0 bytes sent the socket connection is closed
+            if bytes_sent == 0:
+                if outgoing.frame_started or outgoing.reconnected:
+                    self._fail(outgoing, 'closed by remote')
+                    return
+
+                debug('pooled outgoing mtcp connection {} was closed by remote, reconnecting'.format(outgoing.address_tuple))
+                self._disconnect(outgoing)
+                outgoing.reconnected = True
+                continue
+
+            outgoing.connected = True
+            outgoing.frame_started = True
+            outgoing.last_progress = get_current_clock_millis()
+            outgoing.last_used = outgoing.last_progress
+
+            outgoing.parts[0] = outgoing.parts[0][bytes_sent:]
+            if len(outgoing.parts[0]) == 0:
+                outgoing.parts.pop(0)
+
+            if not outgoing.parts:
+                self._delivery_reports.append((outgoing.current[0], outgoing.current[1], True))
+                outgoing.current = None
+
+    def _fail(self, outgoing: _OutgoingConnection, reason: str):
+        debug('outgoing mtcp connection {} failed ({}), dropping {} queued bundles'.format(outgoing.address_tuple, reason, len(outgoing.queue) + 1))
+
+        for node, serialized_bundle in [outgoing.current] + outgoing.queue:
+            self._delivery_reports.append((node, serialized_bundle, False))
+            node.clas.pop(CONFIGURATION.IPND.IDENTIFIER_MTCP, None)  # the node can re-announce it, but currently we cannot connect
+
+        outgoing.current, outgoing.queue, outgoing.parts = None, [], []
+        self._remove_send_connection(outgoing)
+
+    def _remove_send_connection(self, outgoing: _OutgoingConnection):
+        self._disconnect(outgoing)
+        del self.open_send_connections[outgoing.address_tuple]
+
+    @staticmethod
+    def _disconnect(outgoing: _OutgoingConnection):
+        if outgoing.connection is not None:
+            _close_connection(outgoing.connection)
+            outgoing.connection = None
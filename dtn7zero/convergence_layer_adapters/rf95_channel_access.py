@@ -0,0 +1,94 @@
+"""
+Listen-before-talk for the RF95 LoRa CLA.
+
+Before a frame is sent, a Channel Activity Detection (CAD) of the SX127x looks for LoRa symbols on the channel
+(SX1276 datasheet, 4.1.6). On a busy channel the frame is held back for a random time out of a window that doubles
+with every attempt (exponential backoff), after too many busy attempts the frame and the rest of its message are
+dropped. A clear channel resets the window.
+
+CAD runs on the registers directly, the sx127x driver offers no call for it:
+    RegOpMode   (0x01) <- LongRangeMode | CAD, the chip returns to standby once done
+    RegIrqFlags (0x12) -> CadDone (0x04), CadDetected (0x01), written back to clear them
+"""
+import random
+from typing import Optional
+
+from dtn7zero.utility import get_current_clock_millis, is_timestamp_older_than_timeout, debug
+
+
+REG_OP_MODE = 0x01
+REG_IRQ_FLAGS = 0x12
+
+MODE_LONG_RANGE_MODE = 0x80
+MODE_STDBY = 0x01
+MODE_CAD = 0x07
+
+IRQ_RX_DONE_MASK = 0x40
+IRQ_PAYLOAD_CRC_ERROR_MASK = 0x20
+IRQ_CAD_DONE_MASK = 0x04
+IRQ_CAD_DETECTED_MASK = 0x01
+
+
+def detect_channel_activity(lora, timeout_milliseconds: int) -> bool:
+    """
+    runs one CAD on the radio (anything with read_register and write_register), returns True if the channel is busy
+
+    a CAD that does not finish within the timeout counts as busy, the radio is left in standby
+    """
+    lora.write_register(REG_OP_MODE, MODE_LONG_RANGE_MODE | MODE_STDBY)
+    # only the CAD flags are cleared, a pending RX_DONE stays for the receiver
+    lora.write_register(REG_IRQ_FLAGS, IRQ_CAD_DONE_MASK | IRQ_CAD_DETECTED_MASK)
+    lora.write_register(REG_OP_MODE, MODE_LONG_RANGE_MODE | MODE_CAD)
+
+    start = get_current_clock_millis()
+    while True:
+        irq_flags = lora.read_register(REG_IRQ_FLAGS)
+        if irq_flags & IRQ_CAD_DONE_MASK:
+            break
+        if is_timestamp_older_than_timeout(start, timeout_milliseconds):
+            debug('lora channel activity detection timed out')
+            lora.write_register(REG_OP_MODE, MODE_LONG_RANGE_MODE | MODE_STDBY)
+            irq_flags = IRQ_CAD_DETECTED_MASK
+            break
+
+    lora.write_register(REG_IRQ_FLAGS, IRQ_CAD_DONE_MASK | IRQ_CAD_DETECTED_MASK)
+    return bool(irq_flags & IRQ_CAD_DETECTED_MASK)
+
+
+class ListenBeforeTalk:
+
+    def __init__(self, min_backoff_milliseconds: int, max_backoff_milliseconds: int, max_attempts: int):
+        """ Exponential randomized backoff for frames that found the channel busy.
+
+        min_backoff_milliseconds: the backoff window after the first busy attempt, doubled on every further one
+        max_backoff_milliseconds: upper limit of the backoff window
+        max_attempts: busy attempts of one frame before it is dropped
+        """
+        self.min_backoff_milliseconds = min_backoff_milliseconds
+        self.max_backoff_milliseconds = max_backoff_milliseconds
+        self.max_attempts = max_attempts
+
+        self._attempt = 0  # busy attempts of the current frame
+
+        self.busy_channel_count = 0  # CADs that found the channel busy
+        self.backoff_count = 0  # frames held back for a backoff
+        self.dropped_frame_count = 0  # frames dropped after max_attempts
+
+    def channel_clear(self):
+        self._attempt = 0
+
+    def channel_busy(self, now: int) -> Optional[int]:
+        """
+        returns the clock time of the next attempt, None if the frame is to be dropped
+        """
+        self.busy_channel_count += 1
+        self._attempt += 1
+
+        if self._attempt > self.max_attempts:
+            self._attempt = 0
+            self.dropped_frame_count += 1
+            return None
+
+        window = min(self.min_backoff_milliseconds << (self._attempt - 1), self.max_backoff_milliseconds)
+        self.backoff_count += 1
+        return now + 1 + random.getrandbits(30) % max(window, 1)
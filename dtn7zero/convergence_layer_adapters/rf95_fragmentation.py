@@ -0,0 +1,147 @@
+"""
+Link-layer fragmentation for the RF95 LoRa CLA.
+
+A LoRa frame holds at most 255 bytes (SX127x FIFO), 4 of them are the RH_RF95 header (TO, FROM, ID, FLAGS).
+A longer bundle is split into up to 16 fragments, numbered in the ID and FLAGS bytes:
+    ID    -> message id, counted up per sender
+    FLAGS -> high nibble: number of fragments - 1, low nibble: fragment index
+
+A bundle that fits one frame keeps the plain header (ID == FLAGS == 0), so single frames stay compatible to
+rf95modem and older nodes. Fragments are reassembled per (FROM, ID), incomplete messages are dropped after a
+timeout or once the reassembly buffers exceed their byte limit (oldest message first).
+No RFC 9171 fragmentation is involved, a lost fragment loses the whole bundle for this hop.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from dtn7zero.utility import get_current_clock_millis, is_timestamp_older_than_timeout, debug
+
+
+RH_BROADCAST_ADDRESS = 0xff
+RH_HEADER_LENGTH = 4
+
+MAX_FRAME_LENGTH = 255
+MAX_FRAGMENT_PAYLOAD_LENGTH = MAX_FRAME_LENGTH - RH_HEADER_LENGTH
+MAX_FRAGMENTS = 16
+MAX_MESSAGE_LENGTH = MAX_FRAGMENTS * MAX_FRAGMENT_PAYLOAD_LENGTH
+
+
+def encode_header(from_address: int, message_id: int, fragment_count: int, fragment_index: int) -> bytes:
+    return bytes((RH_BROADCAST_ADDRESS, from_address, message_id, (fragment_count - 1) << 4 | fragment_index))
+
+
+def fragment(message: bytes, from_address: int, message_id: int) -> List[bytes]:
+    """
+    returns the frames (RH_RF95 header + part of the message) to send, a single frame if the message fits one
+    """
+    if len(message) <= MAX_FRAGMENT_PAYLOAD_LENGTH:
+        return [encode_header(from_address, 0, 1, 0) + message]
+
+    if len(message) > MAX_MESSAGE_LENGTH:
+        raise ValueError('message of {} bytes exceeds the maximum of {} bytes in {} fragments'.format(len(message), MAX_MESSAGE_LENGTH, MAX_FRAGMENTS))
+
+    fragment_count = (len(message) + MAX_FRAGMENT_PAYLOAD_LENGTH - 1) // MAX_FRAGMENT_PAYLOAD_LENGTH
+
+    frames = []
+    for index in range(fragment_count):
+        start = index * MAX_FRAGMENT_PAYLOAD_LENGTH
+        frames.append(encode_header(from_address, message_id, fragment_count, index) + message[start:start + MAX_FRAGMENT_PAYLOAD_LENGTH])
+    return frames
+
+
+class Reassembler:
+
+    def __init__(self, timeout_milliseconds: int, max_bytes: int):
+        """ Collects the fragments of the messages of all senders.
+
+        timeout_milliseconds: an incomplete message is dropped this long after its first fragment was received
+        max_bytes: upper limit of the bytes of all incomplete messages, the oldest message is dropped to make room
+        """
+        self.timeout_milliseconds = timeout_milliseconds
+        self.max_bytes = max_bytes
+
+        # (from address, message id) -> [first received at, fragments (None if missing), number of missing fragments]
+        self._messages: Dict[Tuple[int, int], list] = {}
+        self._stored_bytes = 0
+
+        self.dropped_messages = 0  # incomplete messages dropped on timeout or for room
+
+    @property
+    def stored_bytes(self) -> int:
+        return self._stored_bytes
+
+    def add(self, frame: bytes) -> Tuple[Optional[bytes], Optional[int]]:
+        """
+        adds a received frame, returns (message, from address) once a message is complete, otherwise (None, None)
+        """
+        self.expire()
+
+        if len(frame) < RH_HEADER_LENGTH:
+            debug('ignoring lora frame without RH_RF95 header')
+            return None, None
+
+        from_address, message_id, flags = frame[1], frame[2], frame[3]
+        fragment_count, index = (flags >> 4) + 1, flags & 0x0f
+
+        if fragment_count == 1:
+            return frame[RH_HEADER_LENGTH:], from_address
+
+        if index >= fragment_count:
+            debug('ignoring lora fragment {} of {} from {}'.format(index, fragment_count, from_address))
+            return None, None
+
+        key = (from_address, message_id)
+        entry = self._messages.get(key)
+
+        if entry is not None and len(entry[1]) != fragment_count:
+            # the message id was reused by the sender for a new message (wrap-around or restart)
+            self._drop(key)
+            entry = None
+
+        payload = frame[RH_HEADER_LENGTH:]
+
+        if entry is None:
+            if not self._make_room(len(payload)):
+                debug('lora fragment of {} bytes exceeds the reassembly limit'.format(len(payload)))
+                return None, None
+
+            entry = [get_current_clock_millis(), [None] * fragment_count, fragment_count]
+            self._messages[key] = entry
+        elif entry[1][index] is not None:
+            return None, None  # duplicate
+        elif not self._make_room(len(payload), key):
+            debug('lora message {} from {} exceeds the reassembly limit'.format(message_id, from_address))
+            self._drop(key)
+            return None, None
+
+        entry[1][index] = payload
+        entry[2] -= 1
+        self._stored_bytes += len(payload)
+
+        if entry[2] > 0:
+            return None, None
+
+        del self._messages[key]
+        message = b''.join(entry[1])
+        self._stored_bytes -= len(message)
+        return message, from_address
+
+    def expire(self):
+        """
+        drops the incomplete messages older than the timeout
+        """
+        for key in [key for key, entry in self._messages.items() if is_timestamp_older_than_timeout(entry[0], self.timeout_milliseconds)]:
+            debug('lora reassembly of message {} from {} timed out'.format(key[1], key[0]))
+            self._drop(key)
+
+    def _make_room(self, length: int, keep: Tuple[int, int] = None) -> bool:
+        while self._stored_bytes + length > self.max_bytes:
+            candidates = [(entry[0], key) for key, entry in self._messages.items() if key != keep]
+            if not candidates:
+                return False
+            self._drop(min(candidates)[1])
+        return True
+
+    def _drop(self, key: Tuple[int, int]):
+        entry = self._messages.pop(key)
+        self._stored_bytes -= sum(len(x) for x in entry[1] if x is not None)
+        self.dropped_messages += 1
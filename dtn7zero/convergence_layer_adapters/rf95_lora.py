@@ -2,20 +2,34 @@
 An experimental LoRa CLA that broadcasts bundles like the ESPNOW CLA.
 
 It uses a message format compatible to the RH_RF95 library.
-    -> fixed header: (TO, FROM, ID, FLAGS) == \xff \xff \x00 \x00
+    -> header: (TO, FROM, ID, FLAGS) == \xff <node address> \x00 \x00
+    -> bundles longer than one frame are sent in up to 16 fragments numbered in ID and FLAGS (see rf95_fragmentation.py)
+
+Frames are queued and sent on the following polls as soon as the duty cycle allows (see rf95_scheduling.py).
+Optionally every frame waits for a clear channel first (listen-before-talk, see rf95_channel_access.py).
+Optionally sent bundles are header compressed (see header_compression.py).
+Optionally small bundles are collected and sent together in one frame (see aggregation.py).
 
 It offers modem configurations compatible to the rf95modem library.
     -> default: Bw125Cr45Sf128
 
-As the message payload contains simply the encoded bundle bytes, messages may be sent and/or received via rf95modem.
+As the message payload of an unfragmented bundle contains simply the encoded bundle bytes, such messages may be sent
+and/or received via rf95modem.
 """
-from typing import Tuple, Optional
-from machine import SoftSPI, Pin
+from typing import List, Tuple, Optional
+from machine import SoftSPI, Pin, unique_id
 
 from py_dtn7 import Bundle
+from dtn7zero.configuration import CONFIGURATION
 from dtn7zero.convergence_layer_adapters import PushBasedCLA
+from dtn7zero.convergence_layer_adapters.aggregation import Aggregator, unpack
+from dtn7zero.convergence_layer_adapters.header_compression import HeaderCompressor, HeaderDecompressor
+from dtn7zero.convergence_layer_adapters.rf95_channel_access import ListenBeforeTalk, detect_channel_activity, \
+    REG_IRQ_FLAGS, IRQ_RX_DONE_MASK, IRQ_PAYLOAD_CRC_ERROR_MASK
+from dtn7zero.convergence_layer_adapters.rf95_fragmentation import Reassembler, fragment, MAX_MESSAGE_LENGTH, MAX_FRAGMENT_PAYLOAD_LENGTH
+from dtn7zero.convergence_layer_adapters.rf95_scheduling import TransmitScheduler, time_on_air_millis, get_symbol_millis
 from dtn7zero.data import Node
-from dtn7zero.utility import warning, debug
+from dtn7zero.utility import warning, debug, get_current_clock_millis
 from sx127x import SX127x, DEVICE_CONFIG_ESP32_TTGO, LORA_PARAMETERS_RH_RF95_bw125cr45sf128, \
     LORA_PARAMETERS_RH_RF95_bw125cr45sf2048, LORA_PARAMETERS_RH_RF95_bw125cr48sf4096, \
     LORA_PARAMETERS_RH_RF95_bw31_25cr48sf512, LORA_PARAMETERS_RH_RF95_bw500cr45sf128
@@ -35,21 +49,80 @@ class RF95LoRaCLA(PushBasedCLA):
 
         self.lora = SX127x(device_spi, pins=device_config, parameters=lora_parameters)
 
+        self.address = CONFIGURATION.RF95_LORA.ADDRESS
+        if self.address is None:
+            self.address = unique_id()[-1]
+
+        self.next_message_id = 0
+        self.reassembler = Reassembler(CONFIGURATION.RF95_LORA.REASSEMBLY_TIMEOUT_MILLISECONDS, CONFIGURATION.RF95_LORA.REASSEMBLY_MAX_BYTES)
+
+        self.lora_parameters = lora_parameters
+        self.scheduler = TransmitScheduler(CONFIGURATION.RF95_LORA.DUTY_CYCLE, CONFIGURATION.RF95_LORA.DUTY_CYCLE_WINDOW_MILLISECONDS,
+                                           CONFIGURATION.RF95_LORA.MAX_DWELL_TIME_MILLISECONDS, CONFIGURATION.RF95_LORA.MAX_QUEUED_FRAMES)
+
+        self.listen_before_talk = None
+        if CONFIGURATION.RF95_LORA.LISTEN_BEFORE_TALK:
+            self.listen_before_talk = ListenBeforeTalk(CONFIGURATION.RF95_LORA.BACKOFF_MIN_MILLISECONDS, CONFIGURATION.RF95_LORA.BACKOFF_MAX_MILLISECONDS,
+                                                       CONFIGURATION.RF95_LORA.BACKOFF_MAX_ATTEMPTS)
+        # a CAD takes about two symbols, the timeout leaves plenty of room
+        self.cad_timeout_milliseconds = int(8 * get_symbol_millis(lora_parameters)) + 10
+
+        self.corrupted_frame_count = 0  # frames received with a payload crc error, mostly collisions
+
+        # while paused, queued frames stay queued and the radio only receives (e.g. for half-duplex time slots)
+        self.transmitting_paused = False
+
+        # an aggregate fills at most one frame
+        self.aggregator = None
+        if CONFIGURATION.RF95_LORA.AGGREGATION_DELAY_MILLISECONDS is not None:
+            self.aggregator = Aggregator(MAX_FRAGMENT_PAYLOAD_LENGTH, CONFIGURATION.RF95_LORA.AGGREGATION_DELAY_MILLISECONDS)
+
+        self.compressor = None
+        if CONFIGURATION.RF95_LORA.HEADER_COMPRESSION:
+            self.compressor = HeaderCompressor(CONFIGURATION.HEADER_COMPRESSION_DICTIONARY_SIZE, CONFIGURATION.HEADER_COMPRESSION_REFRESH_INTERVAL)
+        # compressed bundles of the neighbors are expanded, whether this node compresses its own or not
+        self.decompressor = HeaderDecompressor(CONFIGURATION.HEADER_COMPRESSION_MAX_NEIGHBORS)
+
+        # (serialized bundle, from address) unpacked from a received aggregate, handed out one per poll
+        self.received_bundles: List[Tuple[bytes, int]] = []
+
     def poll(self, bundle_id: str = None, node: Node = None) -> Tuple[Optional[Bundle], Optional[str]]:
         if bundle_id is not None or node is not None:
             raise Exception('cannot poll specific bundle from specific node with lora cla')
 
-        serialized_message = self.lora.try_receive()
-
-        if serialized_message:
-            debug('received LoRa message')
-            try:
-                # removing rh_rf95 header (TO, FROM, ID, FLAGS)
-                serialized_bundle = serialized_message[4:]
-                from_node_address = serialized_message[1]
-                return Bundle.from_cbor(serialized_bundle), from_node_address
-            except Exception as e:
-                warning('error during lora bundle deserialization, ignoring bundle. error: {}'.format(e))
+        if self.aggregator is not None:
+            for message in self.aggregator.flush_due():
+                self._queue_message(message)
+
+        self._transmit_due_frame()
+
+        if not self.received_bundles:
+            irq_flags = self.lora.read_register(REG_IRQ_FLAGS)
+            if irq_flags & IRQ_RX_DONE_MASK and irq_flags & IRQ_PAYLOAD_CRC_ERROR_MASK:
+                self.corrupted_frame_count += 1
+
+            serialized_message = self.lora.try_receive()
+
+            if serialized_message:
+                debug('received LoRa message')
+                # removing rh_rf95 header (TO, FROM, ID, FLAGS), a fragment is kept until its message is complete
+                message, from_node_address = self.reassembler.add(serialized_message)
+                if message:
+                    try:
+                        self.received_bundles = [(x, from_node_address) for x in unpack(message)]
+                    except ValueError as e:
+                        warning('error during lora aggregate unpacking, ignoring message. error: {}'.format(e))
+            else:
+                self.reassembler.expire()
+
+        if self.received_bundles:
+            message, from_node_address = self.received_bundles.pop(0)
+            serialized_bundle = self.decompressor.expand(message, from_node_address)
+            if serialized_bundle is not None:
+                try:
+                    return Bundle.from_cbor(serialized_bundle), from_node_address
+                except Exception as e:
+                    warning('error during lora bundle deserialization, ignoring bundle. error: {}'.format(e))
 
         return None, None
 
@@ -57,10 +130,76 @@ class RF95LoRaCLA(PushBasedCLA):
         if node is not None:
             raise Exception('cannot send bundle to specific node with lora cla')
 
-        # adding default rh_rf95 broadcast header (TO, FROM, ID, FLAGS)
-        serialized_message = b'\xff\xff\x00\x00' + serialized_bundle
+        if self.compressor is not None:
+            serialized_bundle = self.compressor.compress(serialized_bundle)
 
-        debug('started sending bundle via LoRa')
-        self.lora.send(serialized_message)
-        debug('finished sending bundle via LoRa')
+        if len(serialized_bundle) > MAX_MESSAGE_LENGTH:
+            warning('cannot forward bundle through lora cla because it is longer than {} bytes: {}'.format(MAX_MESSAGE_LENGTH, len(serialized_bundle)))
+            return False
+
+        if self.aggregator is None:
+            messages = [serialized_bundle]
+        else:
+            messages = self.aggregator.add(serialized_bundle)
+
+        success = True
+        for message in messages:
+            success = self._queue_message(message) and success
+
+        self._transmit_due_frame()
+        return success
+
+    def pause_transmitting(self):
+        self.transmitting_paused = True
+
+    def resume_transmitting(self):
+        self.transmitting_paused = False
+
+    def get_next_deadline_millis(self) -> Optional[int]:
+        deadlines = []
+        if not self.transmitting_paused:
+            deadlines.append(self.scheduler.next_release_millis(get_current_clock_millis()))
+        if self.aggregator is not None:
+            deadlines.append(self.aggregator.next_flush_millis())
+        deadlines = [x for x in deadlines if x is not None]
+        return min(deadlines) if deadlines else None
+
+    def _queue_message(self, message: bytes) -> bool:
+        # adding rh_rf95 broadcast header (TO, FROM, ID, FLAGS)
+        frames = fragment(message, self.address, self.next_message_id)
+
+        if not self.scheduler.queue([(frame, time_on_air_millis(len(frame), self.lora_parameters)) for frame in frames]):
+            return False
+
+        if len(frames) > 1:
+            self.next_message_id = (self.next_message_id + 1) & 0xff
+
+        debug('queued message for LoRa in {} frame(s)'.format(len(frames)))
         return True
+
+    def _transmit_due_frame(self):
+        # one frame per call, the radio blocks for the airtime and cannot receive meanwhile
+        if self.transmitting_paused:
+            return
+
+        now = get_current_clock_millis()
+
+        if self.listen_before_talk is not None and self.scheduler.is_due(now):
+            if detect_channel_activity(self.lora, self.cad_timeout_milliseconds):
+                next_attempt = self.listen_before_talk.channel_busy(now)
+                if next_attempt is None:
+                    warning('lora channel busy for {} attempts, dropping the frame and the rest of its bundle'.format(self.listen_before_talk.max_attempts))
+                    self.scheduler.drop_message()
+                else:
+                    debug('lora channel busy, backing off for {} ms'.format(next_attempt - now))
+                    self.scheduler.defer(next_attempt)
+                self.lora.receive()
+                return
+            self.listen_before_talk.channel_clear()
+
+        frame = self.scheduler.pop_due(now)
+
+        if frame is not None:
+            debug('started sending frame via LoRa')
+            self.lora.send(frame)
+            debug('finished sending frame via LoRa')
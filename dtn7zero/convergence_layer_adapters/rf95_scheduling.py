@@ -0,0 +1,168 @@
+"""
+Airtime-aware transmit scheduling for the RF95 LoRa CLA.
+
+The time-on-air of every frame is computed from the modem configuration (SX1276 datasheet, 4.1.1.7).
+Frames are queued and released at the earliest time the regional limits allow:
+    duty cycle -> the airtime within any observation window stays below the share (e.g. 1% of 1 hour in EU868)
+    dwell time -> a single frame longer than this is never sent (e.g. 400 ms in AS923)
+
+The transmission history is kept in a fixed number of buckets per window, so the memory is bounded on any
+transmission rate. The bucketing is conservative: a transmission may be counted up to one bucket longer.
+"""
+from typing import List, Optional, Tuple
+
+from dtn7zero.utility import debug
+
+
+HISTORY_BUCKETS = 60
+
+# defaults of the sx127x driver for parameters missing in lora_parameters
+DEFAULT_SPREADING_FACTOR = 7
+DEFAULT_SIGNAL_BANDWIDTH = 125E3
+DEFAULT_CODING_RATE = 5  # denominator of 4/5
+DEFAULT_PREAMBLE_LENGTH = 8
+
+
+def get_symbol_millis(lora_parameters: dict) -> float:
+    spreading_factor = lora_parameters.get('spreading_factor', DEFAULT_SPREADING_FACTOR)
+    bandwidth = lora_parameters.get('signal_bandwidth', DEFAULT_SIGNAL_BANDWIDTH)
+    return (1 << spreading_factor) / bandwidth * 1000
+
+
+def time_on_air_millis(payload_length: int, lora_parameters: dict) -> float:
+    """
+    the airtime of one frame of payload_length bytes (RH_RF95 header included) with the given modem configuration
+    """
+    spreading_factor = lora_parameters.get('spreading_factor', DEFAULT_SPREADING_FACTOR)
+    coding_rate = lora_parameters.get('coding_rate', DEFAULT_CODING_RATE) - 4
+    preamble_length = lora_parameters.get('preamble_length', DEFAULT_PREAMBLE_LENGTH)
+    implicit_header = 1 if lora_parameters.get('implicit_header', False) else 0
+    crc = 1 if lora_parameters.get('enable_CRC', True) else 0
+
+    symbol_millis = get_symbol_millis(lora_parameters)
+    # low data rate optimization is mandated above 16 ms per symbol
+    low_data_rate_optimization = 1 if symbol_millis > 16 else 0
+
+    numerator = 8 * payload_length - 4 * spreading_factor + 28 + 16 * crc - 20 * implicit_header
+    denominator = 4 * (spreading_factor - 2 * low_data_rate_optimization)
+    payload_symbols = 8 + max(-(-numerator // denominator) * (coding_rate + 4), 0)
+
+    return (preamble_length + 4.25 + payload_symbols) * symbol_millis
+
+
+class TransmitScheduler:
+
+    def __init__(self, duty_cycle: Optional[float], window_milliseconds: int, max_dwell_milliseconds: Optional[int], max_queued_frames: int):
+        """ Queues frames and releases them once the duty cycle budget allows.
+
+        duty_cycle: share of the window the radio may transmit (0.01 -> 1%), None disables the budget
+        max_dwell_milliseconds: longest allowed airtime of a single frame, None disables the limit
+        """
+        self.duty_cycle = duty_cycle
+        self.window_milliseconds = window_milliseconds
+        self.max_dwell_milliseconds = max_dwell_milliseconds
+        self.max_queued_frames = max_queued_frames
+
+        self._bucket_milliseconds = max(window_milliseconds // HISTORY_BUCKETS, 1)
+        self._history: List[list] = []  # [bucket start, airtime], oldest first
+        self._queue: List[Tuple[bytes, float, bool]] = []  # (frame, airtime, last frame of its message)
+        self._not_before = 0  # the next frame is held back until then (see defer)
+
+        self.transmitted_airtime_milliseconds = 0.0
+
+    @property
+    def queued_frames(self) -> int:
+        return len(self._queue)
+
+    def queue(self, frames: List[Tuple[bytes, float]]) -> bool:
+        """
+        queues the frames of one message (frame, airtime), all or none, returns False if they cannot be sent
+        """
+        if len(self._queue) + len(frames) > self.max_queued_frames:
+            debug('lora transmit queue is full, {} frames waiting'.format(len(self._queue)))
+            return False
+
+        for _, airtime in frames:
+            if self.max_dwell_milliseconds is not None and airtime > self.max_dwell_milliseconds:
+                debug('lora frame of {:.0f} ms exceeds the dwell time of {} ms'.format(airtime, self.max_dwell_milliseconds))
+                return False
+            if self.duty_cycle is not None and airtime > self.duty_cycle * self.window_milliseconds:
+                debug('lora frame of {:.0f} ms exceeds the duty cycle budget'.format(airtime))
+                return False
+
+        for i, (frame, airtime) in enumerate(frames):
+            self._queue.append((frame, airtime, i == len(frames) - 1))
+        return True
+
+    def pop_due(self, now: int) -> Optional[bytes]:
+        """
+        returns the next queued frame if it may be sent now, its airtime is accounted as sent now
+        """
+        if not self._queue:
+            return None
+
+        frame, airtime, _ = self._queue[0]
+        if self.earliest_transmit_millis(airtime, now) > now:
+            return None
+
+        self._queue.pop(0)
+        self._record(airtime, now)
+        return frame
+
+    def is_due(self, now: int) -> bool:
+        return bool(self._queue) and self.earliest_transmit_millis(self._queue[0][1], now) <= now
+
+    def next_release_millis(self, now: int) -> Optional[int]:
+        if not self._queue:
+            return None
+        return self.earliest_transmit_millis(self._queue[0][1], now)
+
+    def defer(self, until: int):
+        """
+        holds the next frame back until the given clock time, e.g. while the channel is busy
+        """
+        self._not_before = until
+
+    def drop_message(self):
+        """
+        drops the next frame and the remaining frames of its message
+        """
+        while self._queue:
+            if self._queue.pop(0)[2]:
+                break
+
+    def earliest_transmit_millis(self, airtime: float, now: int) -> int:
+        now = max(now, self._not_before)
+
+        if self.duty_cycle is None:
+            return now
+
+        self._expire(now)
+
+        budget = self.duty_cycle * self.window_milliseconds
+        used = sum(x[1] for x in self._history)
+
+        if used + airtime <= budget:
+            return now
+
+        # wait until enough of the oldest transmissions left the window
+        for bucket_start, bucket_airtime in self._history:
+            used -= bucket_airtime
+            if used + airtime <= budget:
+                return bucket_start + self._bucket_milliseconds + self.window_milliseconds
+
+        return now  # not reached, a single frame never exceeds the budget (checked on queue)
+
+    def _record(self, airtime: float, now: int):
+        bucket_start = now - now % self._bucket_milliseconds
+
+        if self._history and self._history[-1][0] == bucket_start:
+            self._history[-1][1] += airtime
+        else:
+            self._history.append([bucket_start, airtime])
+
+        self.transmitted_airtime_milliseconds += airtime
+
+    def _expire(self, now: int):
+        while self._history and self._history[0][0] + self._bucket_milliseconds + self.window_milliseconds <= now:
+            self._history.pop(0)
@@ -0,0 +1,176 @@
+"""
+Concurrent CLA I/O for CPython: a wrapped push based cla sends and receives on worker threads,
+the bpa only exchanges bundles with it through queues.
+
+Every peer has its own send queue, a shared pool of worker threads serves the peers one bundle at a time and
+never two workers the same peer (bundle order per peer is kept). A stalled peer only occupies one worker
+until the stalled-send timeout, the other peers keep being served by the remaining workers.
+"""
+import socket
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, List, Tuple, Deque
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters import PushBasedCLA, DeliveryReport
+from dtn7zero.data import Node
+from dtn7zero.readiness import ReadinessSelector
+from dtn7zero.utility import warning
+from py_dtn7 import Bundle
+
+
+class ThreadedCLA(PushBasedCLA):
+    sends_are_queued = True
+
+    def __init__(self, cla: PushBasedCLA, workers: int = None):
+        """ Wraps a push based cla, workers defaults to CONFIGURATION.THREADED_CLA_WORKERS.
+
+        send_to() returns True once the bundle is queued for the peer (False if the peer queue is full),
+        the outcome of the actual send is available through poll_delivery_reports(). If the wrapped cla only queues
+        the bundle too, its own delivery reports are handed on instead.
+        """
+        self.cla = cla
+
+        self._lock = threading.Lock()
+        self._work_available = threading.Condition(self._lock)
+        self._running = True
+
+        self._send_queues: Dict[Optional[str], Deque[Tuple[Optional[Node], bytes]]] = {}
+        self._ready_peers: Deque[Optional[str]] = deque()  # peers with queued bundles and no worker
+        self._busy_peers = set()
+
+        self._received_bundles = deque()
+        self._delivery_reports: Deque[DeliveryReport] = deque()
+
+        # readable while received bundles are waiting, lets an event-driven main loop wait on this cla
+        self._ready_receiver, self._ready_sender = socket.socketpair()
+        self._ready_receiver.setblocking(False)
+        self._ready_sender.setblocking(False)
+
+        self._threads = [threading.Thread(target=self._send_worker, daemon=True) for _ in range(workers or CONFIGURATION.THREADED_CLA_WORKERS)]
+        self._threads.append(threading.Thread(target=self._receive_worker, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def poll(self, bundle_id: str = None, node: Node = None) -> Tuple[Optional[Bundle], Optional[str]]:
+        try:
+            self._ready_receiver.recv(64)
+        except OSError:
+            pass
+
+        try:
+            return self._received_bundles.popleft()
+        except IndexError:
+            return None, None
+
+    def send_to(self, node: Optional[Node], serialized_bundle: bytes) -> bool:
+        peer = None if node is None else node.address
+
+        with self._lock:
+            send_queue = self._send_queues.get(peer)
+
+            if send_queue is None:
+                send_queue = self._send_queues[peer] = deque()
+            elif len(send_queue) >= CONFIGURATION.THREADED_CLA_MAX_QUEUED_PER_PEER:
+                return False
+
+            send_queue.append((node, serialized_bundle))
+
+            if peer not in self._busy_peers and len(send_queue) == 1:
+                self._ready_peers.append(peer)
+                self._work_available.notify()
+
+        return True
+
+    def poll_delivery_reports(self) -> List[DeliveryReport]:
+        """
+        returns the (node, serialized bundle, success) outcomes of all sends finished since the last call
+        """
+        reports = []
+        while self._delivery_reports:
+            reports.append(self._delivery_reports.popleft())
+
+        if self.cla.sends_are_queued:
+            reports.extend(self.cla.poll_delivery_reports())
+        return reports
+
+    def get_queued_bundles(self, node: Optional[Node]) -> int:
+        with self._lock:
+            return len(self._send_queues.get(None if node is None else node.address, ()))
+
+    def get_selectable_sockets(self) -> Optional[List]:
+        return [self._ready_receiver]
+
+    def close(self):
+        with self._lock:
+            self._running = False
+            self._work_available.notify_all()
+
+        for thread in self._threads:
+            thread.join()
+
+        self._ready_receiver.close()
+        self._ready_sender.close()
+
+    def _send_worker(self):
+        while True:
+            with self._lock:
+                while self._running and not self._ready_peers:
+                    self._work_available.wait()
+
+                if not self._running:
+                    return
+
+                peer = self._ready_peers.popleft()
+                node, serialized_bundle = self._send_queues[peer].popleft()
+                self._busy_peers.add(peer)
+
+            try:
+                success = self.cla.send_to(node, serialized_bundle)
+            except Exception as e:
+                warning('threaded cla send to {} failed, error: {}'.format(peer, e))
+                success = False
+
+            if not success or not self.cla.sends_are_queued:
+                # a bundle accepted by a queueing cla is reported by the cla itself once it is sent
+                self._delivery_reports.append((node, serialized_bundle, success))
+
+            with self._lock:
+                self._busy_peers.discard(peer)
+
+                if self._send_queues[peer]:
+                    self._ready_peers.append(peer)
+                    self._work_available.notify()
+                else:
+                    del self._send_queues[peer]
+
+    def _receive_worker(self):
+        selector = ReadinessSelector()
+
+        while self._running:
+            try:
+                bundle, from_node_address = self.cla.poll()
+            except Exception as e:
+                warning('threaded cla receive failed, error: {}'.format(e))
+                bundle, from_node_address = None, None
+
+            if bundle is not None:
+                self._received_bundles.append((bundle, from_node_address))
+                try:
+                    self._ready_sender.send(b'\x00')
+                except OSError:
+                    pass  # still readable from earlier bundles
+                continue
+
+            # nothing to receive, wait for the sockets of the wrapped cla (or poll it periodically)
+            cla_sockets = self.cla.get_selectable_sockets()
+
+            if cla_sockets is None:
+                time.sleep(CONFIGURATION.THREADED_CLA_RECEIVE_POLL_MILLISECONDS / 1000)
+                continue
+
+            selector.set_sockets(cla_sockets)
+            selector.wait(CONFIGURATION.THREADED_CLA_RECEIVE_POLL_MILLISECONDS)
+
+        selector.close()
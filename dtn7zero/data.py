@@ -1,7 +1,8 @@
-from typing import List, Tuple, Dict
+from typing import Tuple, Dict, Optional
 
-from dtn7zero.utility import get_current_clock_millis
+from dtn7zero.utility import get_current_clock_millis, get_expiry_clock_millis
 from py_dtn7 import Bundle
+from py_dtn7.bundle import BundleProcessingControlFlags
 
 
 class BundleStatusReportReasonCodes:
@@ -35,6 +36,8 @@ class Node:
 
         self.latest_discovery = get_current_clock_millis()
 
+        self.index: Optional[int] = None  # small integer id, interned by the storage on add_node (bit in the forwarded bitmap)
+
     def merge_new_info(self, eid_scheme: int, eid_specific_part: str, clas: Dict[str, int]):
         if eid_specific_part is not None:
             self.eid = (eid_scheme, eid_specific_part)
@@ -42,6 +45,17 @@ class Node:
 
         self.latest_discovery = get_current_clock_millis()
 
+    @property
+    def full_node_uri(self) -> Optional[str]:
+        # same form as get_node_uri_of_endpoint_uri, which keys the stored bundles by destination node
+        scheme, specific_part = self.eid
+        if specific_part is None:
+            return None
+        if scheme == 2:
+            # (node number, service number)
+            return 'ipn://{}'.format(specific_part[0])
+        return 'dtn:' + specific_part
+
     def advance_sequence_number(self, new_sequence_number: int) -> bool:
         old_sequence_number = self.sequence_number
         self.sequence_number = new_sequence_number
@@ -57,4 +71,130 @@ class BundleInformation:
         self.retention_constraint = None
         self.locally_delivered = False
         self.received_at_ms = get_current_clock_millis()
-        self.forwarded_to_nodes: List[Node] = []
+        self.forwarded_to_bitmap = 0  # bit n is set if the bundle was forwarded to (or received from) the node with index n
+        self.forwarded_count = 0
+
+    def mark_forwarded_to(self, node: Node):
+        assert node.index is not None, 'node {} was not added to the storage'.format(node.address)
+
+        bit = 1 << node.index
+        if not self.forwarded_to_bitmap & bit:
+            self.forwarded_to_bitmap |= bit
+            self.forwarded_count += 1
+
+    def unmark_forwarded_to(self, node: Node):
+        bit = 1 << node.index
+        if self.forwarded_to_bitmap & bit:
+            self.forwarded_to_bitmap &= ~bit
+            self.forwarded_count -= 1
+
+    def is_forwarded_to(self, node: Node) -> bool:
+        return node.index is not None and bool(self.forwarded_to_bitmap >> node.index & 1)
+
+    @property
+    def bundle_id(self) -> str:
+        return self.bundle.bundle_id
+
+    @property
+    def full_destination_uri(self) -> str:
+        return self.bundle.primary_block.full_destination_uri
+
+    @property
+    def bundle_processing_control_flags(self) -> BundleProcessingControlFlags:
+        return self.bundle.primary_block.bundle_processing_control_flags
+
+    @property
+    def serialized_bundle(self) -> bytes:
+        return self.bundle.to_cbor()
+
+    @property
+    def expires_at_ms(self) -> Optional[int]:
+        bundle = self.bundle
+        age_milliseconds = bundle.bundle_age_block.age_milliseconds if bundle.bundle_age_block else None
+
+        return get_expiry_clock_millis(bundle.primary_block.bundle_creation_time, bundle.primary_block.lifetime, age_milliseconds, self.received_at_ms)
+
+
+class SerializedBundleInformation(BundleInformation):
+
+    def __init__(self, serialized_bundle: bytes, bundle: Bundle = None, header: tuple = None):
+        """ Keeps a bundle as its cbor bytes plus a small decoded header.
+
+        A decoded Bundle costs several times its cbor size in RAM (see test/test-bundle-size.py).
+        The full bundle is decoded on every access of the bundle property and not kept,
+        so changes to the returned Bundle object are not stored.
+
+        bundle may be supplied if it is already decoded, or header (see get_header) if it was decoded elsewhere,
+        to skip decoding for the header.
+        """
+        if header is None:
+            header = SerializedBundleInformation.get_header(Bundle.from_cbor(serialized_bundle) if bundle is None else bundle)
+
+        self._serialized_bundle = serialized_bundle
+
+        self._bundle_id, self._full_destination_uri, self._bundle_processing_control_flags, \
+            self.bundle_creation_time, self.lifetime, self.bundle_age_milliseconds = header
+
+        self.retention_constraint = None
+        self.locally_delivered = False
+        self.received_at_ms = get_current_clock_millis()
+        self.forwarded_to_bitmap = 0
+        self.forwarded_count = 0
+
+    @staticmethod
+    def get_header(bundle: Bundle) -> tuple:
+        """
+        returns the header fields kept besides the cbor bytes, as plain (picklable) values
+        """
+        return (
+            bundle.bundle_id,
+            bundle.primary_block.full_destination_uri,
+            bundle.primary_block.bundle_processing_control_flags.flags,
+            bundle.primary_block.bundle_creation_time,
+            bundle.primary_block.lifetime,
+            bundle.bundle_age_block.age_milliseconds if bundle.bundle_age_block else None
+        )
+
+    @staticmethod
+    def from_bundle_information(bundle_information: BundleInformation):
+        if isinstance(bundle_information, SerializedBundleInformation):
+            return bundle_information
+
+        serialized_bundle_information = SerializedBundleInformation(bundle_information.serialized_bundle, bundle_information.bundle)
+
+        serialized_bundle_information.retention_constraint = bundle_information.retention_constraint
+        serialized_bundle_information.locally_delivered = bundle_information.locally_delivered
+        serialized_bundle_information.received_at_ms = bundle_information.received_at_ms
+        serialized_bundle_information.forwarded_to_bitmap = bundle_information.forwarded_to_bitmap
+        serialized_bundle_information.forwarded_count = bundle_information.forwarded_count
+
+        return serialized_bundle_information
+
+    @property
+    def bundle(self) -> Bundle:
+        return Bundle.from_cbor(self._serialized_bundle)
+
+    @property
+    def bundle_id(self) -> str:
+        return self._bundle_id
+
+    @property
+    def full_destination_uri(self) -> str:
+        return self._full_destination_uri
+
+    @property
+    def bundle_processing_control_flags(self) -> BundleProcessingControlFlags:
+        return BundleProcessingControlFlags(self._bundle_processing_control_flags)
+
+    @property
+    def serialized_bundle(self) -> bytes:
+        return self._serialized_bundle
+
+    @serialized_bundle.setter
+    def serialized_bundle(self, serialized_bundle: bytes):
+        # only for changes that keep the header, e.g. removed extension blocks
+        self._serialized_bundle = serialized_bundle
+
+    @property
+    def expires_at_ms(self) -> Optional[int]:
+        return get_expiry_clock_millis(self.bundle_creation_time, self.lifetime, self.bundle_age_milliseconds, self.received_at_ms)
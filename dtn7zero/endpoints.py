@@ -105,6 +105,9 @@ class LocalEndpoint(_LocalEndpoint):
 
         hop_count_block = HopCountBlock.from_objects(hop_limit=32, hop_count=0)
 
+        if isinstance(payload, memoryview):
+            payload = bytes(payload)  # e.g. a received payload view (CONFIGURATION.PAYLOAD_MEMORYVIEWS) sent on, cbor cannot encode it
+
         payload_block = PayloadBlock.from_objects(data=payload)
 
         bundle = Bundle(
@@ -116,7 +119,10 @@ class LocalEndpoint(_LocalEndpoint):
 
         debug('starting transmission of bundle: {}'.format(bundle.bundle_id))
 
-        self.bpa.local_bundle_dispatch_queue.append(BundleInformation(bundle))
+        with self.bpa.lock:
+            self.bpa.local_bundle_dispatch_queue.append(BundleInformation(bundle))
+        if self.bpa.wake_up is not None:
+            self.bpa.wake_up()  # an event-driven main loop might be waiting in another thread
 
         return bundle.bundle_id
 
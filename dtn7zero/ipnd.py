@@ -225,40 +225,50 @@ class IPND:
         except MemoryError:
             warning('MEMORY ERROR DURING BEACON RECEIVE, PASS')
         else:
-            try:
-                # eid_scheme, eid_specific_part, clas, services = extract_beacon_information_from(raw_data)
-                beacon = Beacon.from_cbor(raw_data)
-            except Exception as e:
-                warning('could not decode beacon. error: {}'.format(e))
-            else:
-                if address not in self.own_addresses:
-                    existing_node = self.storage.get_node(address)
+            self.receive_beacon(raw_data, address)
 
-                    if existing_node is None:
-                        debug('received beacon from new node: {}, {}'.format(address, beacon))
+        self.broadcast_own_beacon_if_due()
 
-                        new_node = Node(address, (beacon.eid_scheme, beacon.eid_specific_part), dict(beacon.service_block[0]), beacon.beacon_sequence_number)
-                        self.storage.add_node(new_node)
+    def receive_beacon(self, raw_data: bytes, address: str):
+        try:
+            # eid_scheme, eid_specific_part, clas, services = extract_beacon_information_from(raw_data)
+            beacon = Beacon.from_cbor(raw_data)
+        except Exception as e:
+            warning('could not decode beacon. error: {}'.format(e))
+        else:
+            if address not in self.own_addresses:
+                existing_node = self.storage.get_node(address)
+
+                if existing_node is None:
+                    debug('received beacon from new node: {}, {}'.format(address, beacon))
 
-                        sequence_number_matches = False
-                    else:
-                        debug('received beacon from known node: {}, {}'.format(address, beacon))
-                        # existing_node.merge_new_info(eid_scheme, eid_specific_part, dict(clas))
-                        existing_node.merge_new_info(beacon.eid_scheme, beacon.eid_specific_part, dict(beacon.service_block[0]))
+                    new_node = Node(address, (beacon.eid_scheme, beacon.eid_specific_part), dict(beacon.service_block[0]), beacon.beacon_sequence_number)
+                    self.storage.add_node(new_node)
+
+                    sequence_number_matches = False
+                else:
+                    debug('received beacon from known node: {}, {}'.format(address, beacon))
+                    # existing_node.merge_new_info(eid_scheme, eid_specific_part, dict(clas))
+                    existing_node.merge_new_info(beacon.eid_scheme, beacon.eid_specific_part, dict(beacon.service_block[0]))
 
-                        sequence_number_matches = existing_node.advance_sequence_number(beacon.beacon_sequence_number)
+                    sequence_number_matches = existing_node.advance_sequence_number(beacon.beacon_sequence_number)
 
                     if not sequence_number_matches:
-                        # send back a uni-cast beacon to a previously unknown node for faster knowledge spread
-                        # ideal case: it never received a beacon from us -> current state (sequence number) is new to the node
-                        # not ideal case: beacons were exchanged concurrently -> state (sequence number) is duplicate, which is unspecified and ideally ignored
-                        # dtn7zero specific detail: we add unicast information to the beacon, so there is no second unicast beacon sent back to us
+                        # missed beacons -> the node was out of reach (or restarted), offer it everything again
+                        self.storage.add_contact(existing_node)
 
-                        if not (42 in beacon.service_block[1] and beacon.service_block[1][42] == b'unicast'):
-                            self.own_beacon.service_block[1][42] = b'unicast'
-                            self.send_own_beacon_to(address)
-                            del self.own_beacon.service_block[1][42]
+                if not sequence_number_matches:
+                    # send back a uni-cast beacon to a previously unknown node for faster knowledge spread
+                    # ideal case: it never received a beacon from us -> current state (sequence number) is new to the node
+                    # not ideal case: beacons were exchanged concurrently -> state (sequence number) is duplicate, which is unspecified and ideally ignored
+                    # dtn7zero specific detail: we add unicast information to the beacon, so there is no second unicast beacon sent back to us
 
+                    if not (42 in beacon.service_block[1] and beacon.service_block[1][42] == b'unicast'):
+                        self.own_beacon.service_block[1][42] = b'unicast'
+                        self.send_own_beacon_to(address)
+                        del self.own_beacon.service_block[1][42]
+
+    def broadcast_own_beacon_if_due(self):
         if is_timestamp_older_than_timeout(self.last_beacon_broadcast, CONFIGURATION.IPND.SEND_INTERVAL_MILLISECONDS):
             # Increase before sending because it might happen that a unicast-reply with that number was already sent
             self.own_beacon.increment_beacon_sequence_number_by_one()
@@ -266,6 +276,14 @@ class IPND:
                 self.send_own_beacon_to(address)
             self.last_beacon_broadcast = get_current_clock_millis()
 
+    def get_selectable_sockets(self) -> List[socket.socket]:
+        return [self.sock] if CONFIGURATION.IPND.ENABLED else []
+
+    def get_next_deadline_millis(self) -> Optional[int]:
+        if not CONFIGURATION.IPND.ENABLED:
+            return None
+        return self.last_beacon_broadcast + CONFIGURATION.IPND.SEND_INTERVAL_MILLISECONDS
+
     def send_own_beacon_to(self, address: str):
         message = self.own_beacon.to_cbor()
 
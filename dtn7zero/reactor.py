@@ -0,0 +1,96 @@
+"""
+Event-driven main loop for the bundle protocol agent.
+
+Instead of calling BundleProtocolAgent.update() in a fixed interval, the reactor blocks until one of the sockets
+of the bpa (IPND, MTCP listen and receive connections) becomes readable or the next timer is due
+(beacon interval, cla timeouts, bundle expiry, retry of stored bundles).
+CLAs without sockets (ESP-NOW, LoRa, dtn7-rs REST) cannot be waited on, with one of them the wait is capped
+to the given poll interval.
+"""
+import socket
+from typing import Optional
+
+from dtn7zero.bundle_protocol_agent import BundleProtocolAgent
+from dtn7zero.configuration import CONFIGURATION, RUNNING_MICROPYTHON
+from dtn7zero.readiness import ReadinessSelector
+from dtn7zero.utility import get_current_clock_millis
+
+
+class Reactor:
+
+    def __init__(self, bpa: BundleProtocolAgent):
+        """ Runs the bpa whenever there is something to do.
+
+        On CPython a socket pair is used to wake the reactor up when a local endpoint starts a transmission
+        from another thread. MicroPython has no socket pair, a background update thread has to pass a deadline instead.
+        """
+        self.bpa = bpa
+        self.selector = ReadinessSelector()
+
+        self._wake_up_receiver = None
+        self._wake_up_sender = None
+
+        if not RUNNING_MICROPYTHON:
+            self._wake_up_receiver, self._wake_up_sender = socket.socketpair()
+            self._wake_up_receiver.setblocking(False)
+            self._wake_up_sender.setblocking(False)
+            bpa.wake_up = self.wake_up
+
+    def wake_up(self):
+        try:
+            self._wake_up_sender.send(b'\x00')
+        except OSError:
+            pass  # the socket buffer is full, the reactor is awake anyways
+
+    def run_once(self, deadline_millis: Optional[int] = None, poll_interval_millis: int = 10) -> bool:
+        """ Updates the bpa and then blocks until there is something to do, but at most until deadline_millis.
+
+        poll_interval_millis caps the wait if a cla cannot be waited on.
+
+        returns True if the bpa has pending work or a socket became readable
+        """
+        if self.bpa.update():
+            return True
+
+        now = get_current_clock_millis()
+
+        deadlines = [now + CONFIGURATION.REACTOR_MAX_WAIT_MILLISECONDS]
+        for deadline in (deadline_millis, self.bpa.get_next_deadline_millis()):
+            if deadline is not None:
+                deadlines.append(deadline)
+
+        sockets = self.bpa.get_selectable_sockets()
+
+        if sockets is None:
+            deadlines.append(now + poll_interval_millis)
+            sockets = []
+
+        if self._wake_up_receiver is not None:
+            sockets.append(self._wake_up_receiver)
+
+        timeout_millis = min(deadlines) - now
+        if timeout_millis <= 0:
+            return False
+
+        self.selector.set_sockets(sockets)
+        readable = self.selector.wait(timeout_millis)
+
+        if self._wake_up_receiver is not None:
+            self._drain_wake_up()
+
+        return readable
+
+    def close(self):
+        self.selector.close()
+
+        if self._wake_up_receiver is not None:
+            self.bpa.wake_up = None
+            self._wake_up_receiver.close()
+            self._wake_up_sender.close()
+
+    def _drain_wake_up(self):
+        try:
+            while self._wake_up_receiver.recv(64):
+                pass
+        except OSError:
+            pass
@@ -0,0 +1,105 @@
+"""
+Waiting for readable sockets on CPython (selectors) and MicroPython (select.poll).
+"""
+import socket
+from typing import List
+
+from dtn7zero.configuration import RUNNING_MICROPYTHON
+
+if RUNNING_MICROPYTHON:
+    import select
+else:
+    import selectors
+
+
+class ReadinessSelector:
+
+    def __init__(self):
+        """ Waits for readable sockets, selectors on CPython and select.poll on MicroPython.
+        """
+        if RUNNING_MICROPYTHON:
+            self._poll = select.poll()
+        else:
+            self._selector = selectors.DefaultSelector()
+
+        self._sockets = set()
+
+    def set_sockets(self, sockets: List[socket.socket]):
+        """
+        registers exactly the given sockets, closed sockets that are not given any more are unregistered
+        """
+        sockets = set(sockets)
+
+        # unregister first, a new socket might have gotten the file descriptor of a closed one
+        for sock in self._sockets - sockets:
+            self._unregister(sock)
+
+        for sock in sockets - self._sockets:
+            self._register(sock)
+
+        self._sockets = sockets
+
+    def register(self, sock: socket.socket):
+        if sock not in self._sockets:
+            self._register(sock)
+            self._sockets.add(sock)
+
+    def unregister(self, sock: socket.socket):
+        """
+        unregister a socket before closing it, its file descriptor may be reused by the next socket
+        """
+        if sock in self._sockets:
+            self._unregister(sock)
+            self._sockets.discard(sock)
+
+    def select(self, timeout_millis: int = 0) -> List[socket.socket]:
+        """
+        returns the readable sockets (or those with an error to detect), waits at most timeout_millis
+        """
+        if RUNNING_MICROPYTHON:
+            return [x[0] for x in self._poll.poll(timeout_millis)]
+
+        return [x.fileobj for x, _ in self._selector.select(timeout_millis / 1000.0)]
+
+    @property
+    def nestable(self) -> bool:
+        """
+        True if this selector can itself be waited on by another selector (CPython epoll/kqueue), see fileno()
+        """
+        return not RUNNING_MICROPYTHON and hasattr(self._selector, 'fileno')
+
+    def fileno(self) -> int:
+        """
+        the file descriptor of the epoll/kqueue object, readable while one of the registered sockets is
+        """
+        return self._selector.fileno()
+
+    def wait(self, timeout_millis: int) -> bool:
+        """
+        blocks until one of the sockets is readable or the timeout has passed, returns True if a socket is readable
+        """
+        if RUNNING_MICROPYTHON:
+            return len(self._poll.poll(timeout_millis)) > 0
+
+        return len(self._selector.select(timeout_millis / 1000.0)) > 0
+
+    def close(self):
+        self.set_sockets([])
+
+        if not RUNNING_MICROPYTHON:
+            self._selector.close()
+
+    def _register(self, sock: socket.socket):
+        if RUNNING_MICROPYTHON:
+            self._poll.register(sock, select.POLLIN)
+        else:
+            self._selector.register(sock, selectors.EVENT_READ)
+
+    def _unregister(self, sock: socket.socket):
+        try:
+            if RUNNING_MICROPYTHON:
+                self._poll.unregister(sock)
+            else:
+                self._selector.unregister(sock)
+        except (KeyError, ValueError, OSError):
+            pass  # already closed
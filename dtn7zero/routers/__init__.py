@@ -1,14 +1,26 @@
 import time
 from abc import ABC
-from typing import Iterable
+from typing import Dict, Iterable, List, Optional, Union
 
 from dtn7zero.configuration import CONFIGURATION
-from dtn7zero.data import BundleInformation
+from dtn7zero.convergence_layer_adapters import PullBasedCLA, PushBasedCLA
+from dtn7zero.data import BundleInformation, Node
+from dtn7zero.serialization import ForwardingEncoder, read_bundle_id
+from dtn7zero.storage import Storage
+from dtn7zero.utility import warning
 from py_dtn7 import Bundle
 from py_dtn7.bundle import PreviousNodeBlock, BlockProcessingControlFlags
 
 
 class Router(ABC):
+    _forwarding_encoder: ForwardingEncoder = None  # created on first use, router subclasses do not call super().__init__
+
+    # bundle id -> [stored bundle information, number of sends queued by clas], created on first use
+    _queued_deliveries: Dict[str, list] = None
+
+    # set by the router subclasses
+    clas: Dict[str, Union[PullBasedCLA, PushBasedCLA]] = {}
+    storage: Optional[Storage] = None
 
     def prepare_and_serialize_bundle(self, full_node_uri: str, bundle_information: BundleInformation) -> bytes:
         """ RFC 9171, 5.4 Bundle Forwarding
@@ -27,9 +39,18 @@ class Router(ABC):
         difference between the current time and the time at which the bundle was received (or, if the local node is
         the source of the bundle, created).
         """
+        if self._forwarding_encoder is None:
+            self._forwarding_encoder = ForwardingEncoder(CONFIGURATION.FORWARDING_ENCODER_CACHE_SIZE)
 
+        try:
+            return self._forwarding_encoder.encode(full_node_uri, bundle_information)
+        except Exception as e:
+            warning('falling back to full re-serialization of bundle {}, error: {}'.format(bundle_information.bundle_id, e))
+            return self._prepare_and_serialize_decoded_bundle(full_node_uri, bundle_information)
+
+    def _prepare_and_serialize_decoded_bundle(self, full_node_uri: str, bundle_information: BundleInformation) -> bytes:
         # copy bundle to not alter the storage instance
-        bundle = Bundle.from_cbor(bundle_information.bundle.to_cbor())
+        bundle = Bundle.from_cbor(bundle_information.serialized_bundle)
 
         if bundle.previous_node_block:
             bundle.remove_block(bundle.previous_node_block)
@@ -62,3 +83,87 @@ class Router(ABC):
 
     def send_to_previous_node(self, full_node_uri: str, bundle_information: BundleInformation) -> bool:
         raise NotImplementedError('do not instantiate Router class directly')
+
+    def forward_to_node(self, full_node_uri: str, bundle_information: BundleInformation, node: Node) -> bool:
+        """
+        hands a stored bundle to one specific node (a new contact), returns True on success
+        """
+        raise NotImplementedError('do not instantiate Router class directly')
+
+    def forget_bundle(self, bundle_id: str):
+        """
+        drops the cached serialization of a deleted bundle
+        """
+        if self._forwarding_encoder is not None:
+            self._forwarding_encoder.forget(bundle_id)
+
+    def process_delivery_reports(self):
+        """
+        takes the outcomes of queued sends from the clas, a bundle whose delivery failed is offered to the node again
+        """
+        self._revert_failed_deliveries(self.clas.values(), self.storage)
+
+    def _track_queued_delivery(self, cla: Union[PullBasedCLA, PushBasedCLA], bundle_information: BundleInformation):
+        """
+        keeps the stored form of a bundle accepted by a queueing cla until its delivery is reported
+        """
+        if not isinstance(cla, PushBasedCLA) or not cla.sends_are_queued:
+            return
+
+        if self._queued_deliveries is None:
+            self._queued_deliveries = {}
+
+        entry = self._queued_deliveries.get(bundle_information.bundle_id)
+        if entry is None:
+            self._queued_deliveries[bundle_information.bundle_id] = [bundle_information, 1]
+        else:
+            entry[1] += 1
+
+    def _release_queued_delivery(self, bundle_id: str) -> Optional[BundleInformation]:
+        entry = self._queued_deliveries.get(bundle_id) if self._queued_deliveries else None
+        if entry is None:
+            return None
+
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._queued_deliveries[bundle_id]
+        return entry[0]
+
+    def _revert_failed_deliveries(self, clas: Iterable[Union[PullBasedCLA, PushBasedCLA]], storage: Storage):
+        for cla in clas:
+            if not isinstance(cla, PushBasedCLA):
+                continue
+
+            for node, serialized_bundle, success in cla.poll_delivery_reports():
+                if node is None or (success and not self._queued_deliveries):
+                    continue
+
+                try:
+                    bundle_id = read_bundle_id(serialized_bundle)
+                except Exception as e:
+                    warning('could not read the bundle id of a delivery report for {}, error: {}'.format(node.address, e))
+                    continue
+
+                bundle_information = self._release_queued_delivery(bundle_id)
+
+                if success or storage.unmark_forwarded(bundle_id, node):
+                    continue
+
+                if bundle_information is None:
+                    continue  # not queued by a forwarding attempt, e.g. sent back to the previous node
+
+                # the queued send was counted as forwarded and the bundle released from the storage, store the
+                # original bundle (not the per-hop serialization sent) again for a later attempt
+                bundle_information.unmark_forwarded_to(node)
+                bundle_information.retention_constraint = BundleInformation.RETENTION_CONSTRAINT_DISPATCH_PENDING
+
+                storage.delay_bundle(bundle_information)
+
+    def get_selectable_sockets(self) -> Optional[List]:
+        """
+        returns the sockets of all clas to wait on, None if at least one cla has to be polled periodically
+        """
+        return None
+
+    def get_next_deadline_millis(self) -> Optional[int]:
+        return None
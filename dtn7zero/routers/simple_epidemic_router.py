@@ -1,7 +1,7 @@
-from typing import Dict, Iterable, Union
+from typing import Dict, Iterable, List, Optional, Union
 
 from dtn7zero.configuration import CONFIGURATION
-from dtn7zero.convergence_layer_adapters import PullBasedCLA, PushBasedCLA
+from dtn7zero.convergence_layer_adapters import PullBasedCLA, PushBasedCLA, get_selectable_sockets_of, get_next_deadline_millis_of
 from dtn7zero.data import BundleInformation, Node, BundleStatusReportReasonCodes
 from dtn7zero.routers import Router
 from dtn7zero.storage import Storage
@@ -32,11 +32,12 @@ class SimpleEpidemicRouter(Router):
             if not self.storage.was_seen(bundle.bundle_id):
                 self.storage.store_seen(bundle.bundle_id, node_address)
 
-                bundle_information = BundleInformation(bundle)
+                # some clas (mtcp with spilled frames or payload memoryviews) already hand out a bundle information
+                bundle_information = bundle if isinstance(bundle, BundleInformation) else BundleInformation(bundle)
 
                 node = self.storage.get_node(node_address)
                 if node is not None:  # if node is known, prevent the bundle from being sent back to that same node
-                    bundle_information.forwarded_to_nodes.append(node)
+                    self.storage.mark_forwarded(bundle_information, node)
 
                 yield bundle_information
             bundle, node_address = cla.poll()
@@ -55,32 +56,40 @@ class SimpleEpidemicRouter(Router):
 
                     node = self.storage.get_node(node_polled_address)
                     if node is not None:  # if node is known, prevent the bundle from being sent back to that same node
-                        bundle_information.forwarded_to_nodes.append(node)
+                        self.storage.mark_forwarded(bundle_information, node)
 
                     yield bundle_information
                     break
 
     def immediate_forwarding_attempt(self, full_node_uri: str, bundle_information: BundleInformation) -> (bool, int):
-        serialized_bundle: bytes = self.prepare_and_serialize_bundle(full_node_uri, bundle_information)
+        # serialized on first use, a bundle without any node to go to is not copied at all
+        serialized_bundle: Optional[bytes] = None
 
         reason = BundleStatusReportReasonCodes.NO_TIMELY_CONTACT_WITH_NEXT_NODE_ON_ROUTE
 
         for node in self.storage.get_nodes():
-            if node in bundle_information.forwarded_to_nodes:
+            if bundle_information.is_forwarded_to(node):
                 continue
 
             for cla_id, cla in self.clas.items():
                 if cla_id in (CONFIGURATION.IPND.IDENTIFIER_ESPNOW, CONFIGURATION.IPND.IDENTIFIER_RF95_LORA):
                     continue
 
+                if serialized_bundle is None:
+                    serialized_bundle = self.prepare_and_serialize_bundle(full_node_uri, bundle_information)
+
                 success = cla.send_to(node, serialized_bundle)
                 if success:
-                    bundle_information.forwarded_to_nodes.append(node)
+                    self.storage.mark_forwarded(bundle_information, node)
+                    self._track_queued_delivery(cla, bundle_information)
                 else:
                     reason = BundleStatusReportReasonCodes.TRAFFIC_PARED
 
         # the espnow and rf95_lora clas are special because they broadcast the bundle
         # we get no information about how many nodes have received the bundle
+        if serialized_bundle is None and (CONFIGURATION.IPND.IDENTIFIER_ESPNOW in self.clas or CONFIGURATION.IPND.IDENTIFIER_RF95_LORA in self.clas):
+            serialized_bundle = self.prepare_and_serialize_bundle(full_node_uri, bundle_information)
+
         if CONFIGURATION.IPND.IDENTIFIER_ESPNOW in self.clas:
             self.clas[CONFIGURATION.IPND.IDENTIFIER_ESPNOW].send_to(None, serialized_bundle)
             # this is non-standard, but, it is a useful distinction
@@ -89,16 +98,29 @@ class SimpleEpidemicRouter(Router):
             self.clas[CONFIGURATION.IPND.IDENTIFIER_RF95_LORA].send_to(None, serialized_bundle)
             # this is non-standard, but, it is a useful distinction
             reason = BundleStatusReportReasonCodes.FORWARDED_OVER_UNIDIRECTIONAL_LINK
-            # todo: forwarded_to_nodes is not altered, messages are spammed because retry-wait-time is not set, dirty fix: SIMPLE_EPIDEMIC_ROUTER_MIN_NODES_TO_FORWARD_TO = 0
+            # todo: the forwarded bitmap is not altered, messages are spammed because retry-wait-time is not set, dirty fix: SIMPLE_EPIDEMIC_ROUTER_MIN_NODES_TO_FORWARD_TO = 0
+
+        return bundle_information.forwarded_count >= CONFIGURATION.SIMPLE_EPIDEMIC_ROUTER_MIN_NODES_TO_FORWARD_TO, reason
+
+    def forward_to_node(self, full_node_uri: str, bundle_information: BundleInformation, node: Node) -> bool:
+        serialized_bundle: bytes = self.prepare_and_serialize_bundle(full_node_uri, bundle_information)
 
-        return len(bundle_information.forwarded_to_nodes) >= CONFIGURATION.SIMPLE_EPIDEMIC_ROUTER_MIN_NODES_TO_FORWARD_TO, reason
+        for cla_id, cla in self.clas.items():
+            if cla_id in (CONFIGURATION.IPND.IDENTIFIER_ESPNOW, CONFIGURATION.IPND.IDENTIFIER_RF95_LORA):
+                continue  # broadcast only, covered by the regular forwarding attempts
+
+            if cla.send_to(node, serialized_bundle):
+                self.storage.mark_forwarded(bundle_information, node)
+                self._track_queued_delivery(cla, bundle_information)
+                return True
+        return False
 
     def send_to_previous_node(self, full_node_uri: str, bundle_information: BundleInformation) -> bool:
-        previous_node_address = self.storage.get_seen(bundle_information.bundle.bundle_id)
+        previous_node_address = self.storage.get_seen(bundle_information.bundle_id)
         previous_node = self.storage.get_node(previous_node_address)
 
         if previous_node_address is None or previous_node is None:
-            warning('Previous node of bundle-id {} is not known (any more). Ignoring request to send to previous node.'.format(bundle_information.bundle.bundle_id))
+            warning('Previous node of bundle-id {} is not known (any more). Ignoring request to send to previous node.'.format(bundle_information.bundle_id))
             return False
 
         bundle: bytes = self.prepare_and_serialize_bundle(full_node_uri, bundle_information)
@@ -110,3 +132,9 @@ class SimpleEpidemicRouter(Router):
             if cla.send_to(previous_node, bundle):
                 return True
         return False
+
+    def get_selectable_sockets(self) -> Optional[List]:
+        return get_selectable_sockets_of(self.clas.values())
+
+    def get_next_deadline_millis(self) -> Optional[int]:
+        return get_next_deadline_millis_of(self.clas.values())
@@ -2,13 +2,12 @@
 # Versi ini adalah modifikasi langsung dari simple_epidemic_router.py
 # untuk kebutuhan spesifik Mobile Node (Kurir) pada hardware half-duplex.
 
-import time
 import gc
-from typing import Dict, Iterable, Union
+from typing import Dict, Iterable, List, Optional, Union
 
 # Impor yang dibutuhkan, disalin dari file asli
 from dtn7zero.configuration import CONFIGURATION
-from dtn7zero.convergence_layer_adapters import PullBasedCLA, PushBasedCLA
+from dtn7zero.convergence_layer_adapters import PullBasedCLA, PushBasedCLA, get_selectable_sockets_of, get_next_deadline_millis_of
 from dtn7zero.data import BundleInformation, Node, BundleStatusReportReasonCodes
 from dtn7zero.routers import Router
 from dtn7zero.storage import Storage
@@ -37,10 +36,10 @@ class TimedEpidemicRouter(Router):
         while bundle is not None:
             if not self.storage.was_seen(bundle.bundle_id):
                 self.storage.store_seen(bundle.bundle_id, node_address)
-                bundle_information = BundleInformation(bundle)
+                bundle_information = bundle if isinstance(bundle, BundleInformation) else BundleInformation(bundle)
                 node = self.storage.get_node(node_address)
                 if node is not None:
-                    bundle_information.forwarded_to_nodes.append(node)
+                    self.storage.mark_forwarded(bundle_information, node)
                 yield bundle_information
             bundle, node_address = cla.poll()
 
@@ -60,18 +59,26 @@ class TimedEpidemicRouter(Router):
         # Iterasi melalui bundel yang akan dikirim ulang
         for bundle_info in self.storage.get_bundles_to_retry():
             if not bundle_info.bundle.is_expired():
-                print(f"Forwarding bundel: {bundle_info.bundle.bundle_id}")
+                print(f"Forwarding bundel: {bundle_info.bundle_id}")
                 serialized_bundle = self.prepare_and_serialize_bundle(full_node_uri, bundle_info)
                 
-                # Kirim melalui LoRa
+                # Kirim melalui LoRa, CLA mengantrekan frame dan mengirimnya sesuai duty cycle (tanpa jeda manual)
+                # bundel yang ditolak karena antrean penuh dikirim lagi pada siklus berikutnya
                 if CONFIGURATION.IPND.IDENTIFIER_RF95_LORA in self.clas:
                     self.clas[CONFIGURATION.IPND.IDENTIFIER_RF95_LORA].send_to(None, serialized_bundle)
-                
-                time.sleep_ms(150) # Jeda antar pengiriman untuk stabilitas radio
         
         print("--- Siklus forwarding selesai ---")
         gc.collect()
 
     # Fungsi sisa dari SimpleEpidemicRouter
     def send_to_previous_node(self, full_node_uri: str, bundle_information: BundleInformation) -> bool:
-        return False
\ No newline at end of file
+        return False
+
+    def forward_to_node(self, full_node_uri: str, bundle_information: BundleInformation, node: Node) -> bool:
+        return False  # hanya forwarding terjadwal, lihat scheduled_forward
+
+    def get_selectable_sockets(self) -> Optional[List]:
+        return get_selectable_sockets_of(self.clas.values())
+
+    def get_next_deadline_millis(self) -> Optional[int]:
+        return get_next_deadline_millis_of(self.clas.values())
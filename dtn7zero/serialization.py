@@ -0,0 +1,328 @@
+"""
+Forwarding without a full decode/encode round trip of the bundle.
+
+A bundle is an indefinite cbor array: 0x9f, primary block, canonical blocks, 0xff.
+Only the cbor item heads are read to find the byte span of every block. When forwarding, the primary block,
+the payload block and all other extension blocks are copied verbatim, only the per-hop blocks
+(previous node, bundle age, hop count) are re-encoded and spliced in. Block numbers are kept as they are.
+"""
+import struct
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from cbor2 import dumps, loads
+except ImportError:
+    from cbor import dumps, loads
+
+from dtn7zero.configuration import CONFIGURATION, RUNNING_MICROPYTHON
+from dtn7zero.data import BundleInformation
+from dtn7zero.utility import get_current_clock_millis
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PreviousNodeBlock, BlockProcessingControlFlags, PrimaryBlock
+
+
+BLOCK_TYPE_PAYLOAD = 1
+BLOCK_TYPE_PREVIOUS_NODE = 6
+BLOCK_TYPE_BUNDLE_AGE = 7
+BLOCK_TYPE_HOP_COUNT = 10
+
+# (block type code, block number, start offset, end offset, number of block array items)
+BlockSpan = Tuple[int, int, int, int, int]
+
+
+def read_head(data: bytes, offset: int) -> Tuple[int, Optional[int], int]:
+    """
+    reads one cbor item head, returns (major type, argument, offset after the head), the argument is None if indefinite
+    """
+    initial_byte = data[offset]
+    major_type, additional_information = initial_byte >> 5, initial_byte & 0x1f
+    offset += 1
+
+    if additional_information < 24:
+        return major_type, additional_information, offset
+    if additional_information == 24:
+        return major_type, data[offset], offset + 1
+    if additional_information == 25:
+        return major_type, struct.unpack_from('!H', data, offset)[0], offset + 2
+    if additional_information == 26:
+        return major_type, struct.unpack_from('!I', data, offset)[0], offset + 4
+    if additional_information == 27:
+        return major_type, struct.unpack_from('!Q', data, offset)[0], offset + 8
+    if additional_information == 31:
+        return major_type, None, offset
+
+    raise ValueError('malformed cbor head 0x{:02x} at offset {}'.format(initial_byte, offset - 1))
+
+
+def skip_item(data: bytes, offset: int) -> int:
+    """
+    returns the offset after the cbor item starting at offset, without decoding it
+    """
+    major_type, argument, offset = read_head(data, offset)
+
+    if major_type in (2, 3, 4, 5) and argument is None:
+        # indefinite string chunks, array items or map keys and values, terminated by a break
+        while data[offset] != 0xff:
+            offset = skip_item(data, offset)
+        return offset + 1
+
+    if major_type in (2, 3):
+        return offset + argument
+    if major_type == 4:
+        for _ in range(argument):
+            offset = skip_item(data, offset)
+        return offset
+    if major_type == 5:
+        for _ in range(argument * 2):
+            offset = skip_item(data, offset)
+        return offset
+    if major_type == 6:
+        return skip_item(data, offset)
+
+    return offset  # integers and simple values are complete with their head
+
+
+def index_blocks(serialized_bundle: bytes) -> Tuple[int, List[BlockSpan]]:
+    """
+    returns the end offset of the primary block and the spans of all canonical blocks of a serialized bundle
+    """
+    major_type, argument, offset = read_head(serialized_bundle, 0)
+    if major_type != 4 or argument is not None:
+        raise ValueError('a bundle must be an indefinite cbor array')
+
+    primary_block_end = skip_item(serialized_bundle, offset)
+
+    blocks = []
+    offset = primary_block_end
+
+    while serialized_bundle[offset] != 0xff:
+        major_type, number_of_items, position = read_head(serialized_bundle, offset)
+        if major_type != 4 or number_of_items is None:
+            raise ValueError('a canonical block must be a definite cbor array')
+
+        _, block_type_code, position = read_head(serialized_bundle, position)
+        _, block_number, position = read_head(serialized_bundle, position)
+
+        end = skip_item(serialized_bundle, offset)
+        blocks.append((block_type_code, block_number, offset, end, number_of_items))
+        offset = end
+
+    return primary_block_end, blocks
+
+
+def remove_extension_blocks(serialized_bundle: bytes, indices: List[int]) -> bytes:
+    """
+    returns the serialized bundle without the given extension blocks, all other blocks are copied verbatim
+
+    indices count the canonical blocks other than the payload and per-hop blocks in their serialized order, as they
+    are listed in Bundle.other_blocks (py_dtn7 renumbers blocks when decoding, the block numbers cannot be used)
+    """
+    primary_block_end, blocks = index_blocks(serialized_bundle)
+
+    parts = [serialized_bundle[:primary_block_end]]
+    index = 0
+    for block_type_code, _, start, end, _ in blocks:
+        if block_type_code not in (BLOCK_TYPE_PAYLOAD, BLOCK_TYPE_PREVIOUS_NODE, BLOCK_TYPE_BUNDLE_AGE, BLOCK_TYPE_HOP_COUNT):
+            index += 1
+            if index - 1 in indices:
+                continue
+        parts.append(serialized_bundle[start:end])
+    parts.append(b'\xff')
+
+    return b''.join(parts)
+
+
+def _format_bundle_id(primary_block: PrimaryBlock) -> str:
+    # same format as Bundle.bundle_id
+    return '{}-{}-{}'.format(primary_block.full_source_uri, primary_block.bundle_creation_time, primary_block.sequence_number)
+
+
+def read_bundle_id(serialized_bundle: bytes) -> str:
+    """
+    returns the bundle id of a serialized bundle, only the primary block is decoded
+    """
+    major_type, argument, offset = read_head(serialized_bundle, 0)
+    if major_type != 4 or argument is not None:
+        raise ValueError('a bundle must be an indefinite cbor array')
+
+    primary_block = PrimaryBlock.from_block_data(loads(serialized_bundle[offset:skip_item(serialized_bundle, offset)]))
+
+    return _format_bundle_id(primary_block)
+
+
+def read_header(serialized_bundle: bytes) -> tuple:
+    """
+    returns the header of a serialized bundle (see SerializedBundleInformation.get_header), only the primary block
+    and the bundle age block are decoded, the payload is skipped over by its length
+    """
+    primary_block_end, blocks = index_blocks(serialized_bundle)
+
+    # index_blocks checked the one byte indefinite array head
+    primary_block = PrimaryBlock.from_block_data(loads(serialized_bundle[1:primary_block_end]))
+
+    age_milliseconds = None
+    for block_type_code, _, start, end, _ in blocks:
+        if block_type_code == BLOCK_TYPE_BUNDLE_AGE:
+            age_milliseconds = loads(loads(serialized_bundle[start:end])[4])
+
+    return (
+        _format_bundle_id(primary_block),
+        primary_block.full_destination_uri,
+        primary_block.bundle_processing_control_flags.flags,
+        primary_block.bundle_creation_time,
+        primary_block.lifetime,
+        age_milliseconds
+    )
+
+
+def _find_payload(serialized_bundle: bytes) -> Tuple[int, Optional[int], int]:
+    """
+    returns the offsets of the payload byte-string of a serialized bundle: (head start, data start, end),
+    data start is None for an indefinite length byte-string
+    """
+    _, blocks = index_blocks(serialized_bundle)
+
+    for block_type_code, _, start, _, _ in blocks:
+        if block_type_code == BLOCK_TYPE_PAYLOAD:
+            # block type code, block number, flags and crc type heads, then the payload byte-string
+            position = read_head(serialized_bundle, start)[2]
+            for _ in range(4):
+                position = skip_item(serialized_bundle, position)
+
+            _, length, data_start = read_head(serialized_bundle, position)
+            if length is None:
+                return position, None, skip_item(serialized_bundle, position)
+            return position, data_start, data_start + length
+
+    raise ValueError('a bundle must have a payload block')
+
+
+def decode_without_payload(serialized_bundle: bytes) -> Bundle:
+    """
+    decodes a serialized bundle with an empty payload, for the processing steps that only look at the primary and
+    extension blocks (the payload of a large bundle is never copied into RAM)
+    """
+    head_start, _, end = _find_payload(serialized_bundle)
+
+    return Bundle.from_cbor(b''.join((serialized_bundle[:head_start], b'\x40', serialized_bundle[end:])))
+
+
+def decode_with_payload_view(serialized_bundle: bytes) -> Bundle:
+    """
+    decodes a serialized bundle with the payload as a read-only memoryview slice of serialized_bundle instead of a copy,
+    the returned bundle keeps serialized_bundle alive and cannot be encoded again (CPython 3.8+ only, see pyproject.toml)
+    """
+    head_start, data_start, end = _find_payload(serialized_bundle)
+
+    if data_start is None:
+        return Bundle.from_cbor(serialized_bundle)  # the chunks of an indefinite length payload have to be joined
+
+    bundle = Bundle.from_cbor(b''.join((serialized_bundle[:head_start], b'\x40', serialized_bundle[end:])))
+    bundle.payload_block.data = memoryview(serialized_bundle).toreadonly()[data_start:end]
+
+    return bundle
+
+
+class ForwardingEncoder:
+
+    def __init__(self, cache_size: int):
+        """ Produces the per-hop serialization of stored bundles by splicing re-encoded per-hop blocks into the stored bytes.
+
+        The serialized bundle and its block index are cached per bundle id for the next forwarding attempts
+        (for decoded bundles this saves the to_cbor call too). Once full, an arbitrary entry is dropped.
+        """
+        self.cache_size = cache_size
+
+        self._cache: Dict[str, Tuple[bytes, int, List[BlockSpan]]] = {}
+        self._previous_node_block_data: Dict[str, Tuple[int, bytes]] = {}
+
+    def encode(self, full_node_uri: str, bundle_information: BundleInformation) -> bytes:
+        serialized_bundle, primary_block_end, blocks = self._get_indexed(bundle_information)
+
+        if not RUNNING_MICROPYTHON:
+            # slices of a memoryview are no copies, the payload is only copied once by the join
+            serialized_bundle = memoryview(serialized_bundle)
+
+        parts = [serialized_bundle[:primary_block_end]]  # including the array head
+
+        if CONFIGURATION.ATTACH_PREVIOUS_NODE_BLOCK:
+            previous_node_block_number = None
+            for block in blocks:
+                if block[0] == BLOCK_TYPE_PREVIOUS_NODE:
+                    previous_node_block_number = block[1]
+            if previous_node_block_number is None:
+                previous_node_block_number = max([x[1] for x in blocks] + [1]) + 1
+
+            parts.append(self._encode_previous_node_block(full_node_uri, previous_node_block_number))
+
+        copy_start = None
+        for block_type_code, block_number, start, end, number_of_items in blocks:
+            if block_type_code in (BLOCK_TYPE_PREVIOUS_NODE, BLOCK_TYPE_BUNDLE_AGE, BLOCK_TYPE_HOP_COUNT):
+                if copy_start is not None:
+                    parts.append(serialized_bundle[copy_start:start])
+                    copy_start = None
+
+                if block_type_code == BLOCK_TYPE_BUNDLE_AGE:
+                    parts.append(self._encode_bundle_age_block(serialized_bundle[start:end], bundle_information.received_at_ms))
+                elif block_type_code == BLOCK_TYPE_HOP_COUNT:
+                    parts.append(self._encode_hop_count_block(serialized_bundle[start:end]))
+            elif copy_start is None:
+                copy_start = start
+
+        if copy_start is not None:
+            parts.append(serialized_bundle[copy_start:blocks[-1][3]])
+
+        parts.append(b'\xff')
+
+        return b''.join(parts)
+
+    def forget(self, bundle_id: str):
+        self._cache.pop(bundle_id, None)
+
+    def _get_indexed(self, bundle_information: BundleInformation) -> Tuple[bytes, int, List[BlockSpan]]:
+        entry = self._cache.get(bundle_information.bundle_id)
+
+        if entry is None:
+            serialized_bundle = bundle_information.serialized_bundle
+            primary_block_end, blocks = index_blocks(serialized_bundle)
+
+            for block in blocks:
+                # an attached crc (6 items) would be invalidated by re-encoding the per-hop block
+                if block[0] in (BLOCK_TYPE_PREVIOUS_NODE, BLOCK_TYPE_BUNDLE_AGE, BLOCK_TYPE_HOP_COUNT) and block[4] != 5:
+                    raise ValueError('per-hop blocks with crc are not supported')
+
+            entry = (serialized_bundle, primary_block_end, blocks)
+
+            if self.cache_size > 0:
+                while len(self._cache) >= self.cache_size:
+                    del self._cache[next(iter(self._cache))]
+                self._cache[bundle_information.bundle_id] = entry
+
+        return entry
+
+    def _encode_previous_node_block(self, full_node_uri: str, block_number: int) -> bytes:
+        if full_node_uri not in self._previous_node_block_data:
+            flags = BlockProcessingControlFlags(0)
+            flags.set_flag(4)  # discard block if block cant be processed
+
+            block = PreviousNodeBlock.from_objects(full_node_uri, flags)
+            self._previous_node_block_data[full_node_uri] = (flags.flags, block.data)
+
+        flags, data = self._previous_node_block_data[full_node_uri]
+        return dumps([BLOCK_TYPE_PREVIOUS_NODE, block_number, flags, 0, data])
+
+    @staticmethod
+    def _encode_bundle_age_block(encoded_block: bytes, received_at_ms: int) -> bytes:
+        block = loads(encoded_block)
+        # todo: assuming no wrap-around on micropython here -> test after which time this happens
+        age_milliseconds = loads(block[4]) + get_current_clock_millis() - received_at_ms
+        return dumps([block[0], block[1], block[2], block[3], dumps(age_milliseconds)])
+
+    @staticmethod
+    def _encode_hop_count_block(encoded_block: bytes) -> bytes:
+        block = loads(encoded_block)
+        hop_limit, hop_count = loads(block[4])
+        """ RFC 9171, 4.4.3 Hop Count
+        […] the hop count value SHOULD initially be zero and SHOULD be increased by 1 on each hop.
+        """
+        return dumps([block[0], block[1], block[2], block[3], dumps((hop_limit, hop_count + 1))])
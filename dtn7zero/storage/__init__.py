@@ -9,6 +9,12 @@ class Storage(ABC):
     def add_node(self, node: Node):
         raise NotImplementedError('do not instantiate Storage class directly')
 
+    def add_contact(self, node: Node):
+        """
+        queues a (re-)appeared node for a bulk hand-off of all stored bundles it has not received yet
+        """
+        raise NotImplementedError('do not instantiate Storage class directly')
+
     def get_node(self, node_address: str) -> Optional[Node]:
         raise NotImplementedError('do not instantiate Storage class directly')
 
@@ -32,3 +38,34 @@ class Storage(ABC):
 
     def get_bundles_to_retry(self):
         raise NotImplementedError('do not instantiate Storage class directly')
+
+    def mark_forwarded(self, bundle_information: BundleInformation, node: Node):
+        raise NotImplementedError('do not instantiate Storage class directly')
+
+    def unmark_forwarded(self, bundle_id: str, node: Node) -> bool:
+        """
+        reverts mark_forwarded after a failed (asynchronously reported) delivery, the bundle is offered to the node again
+
+        returns False if the bundle is not stored (any more)
+        """
+        raise NotImplementedError('do not instantiate Storage class directly')
+
+    def get_bundles_to_hand_off(self) -> Iterable[Tuple[Node, BundleInformation]]:
+        """
+        yields (node, bundle) pairs of queued contacts and the stored bundles that were not yet forwarded to them
+        """
+        raise NotImplementedError('do not instantiate Storage class directly')
+
+    def pop_expired_bundles(self, max_bundles: int) -> List[BundleInformation]:
+        """
+        removes and returns at most max_bundles stored bundles whose lifetime has expired, earliest expiry first
+        """
+        raise NotImplementedError('do not instantiate Storage class directly')
+
+    def get_next_expiry_millis(self) -> Optional[int]:
+        """
+        returns the clock time (get_current_clock_millis) of the earliest stored bundle expiry, None if unknown
+
+        may be earlier than the actual next expiry (already removed bundles), never later
+        """
+        raise NotImplementedError('do not instantiate Storage class directly')
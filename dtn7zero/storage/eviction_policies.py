@@ -0,0 +1,227 @@
+"""
+Eviction policies decide which stored bundle has to make room once a storage is full.
+
+Every policy keeps a min-heap over its eviction key, so adding a bundle and selecting a victim is O(log n).
+Heap entries are invalidated lazily: a changed key pushes a new entry, stale entries are skipped on selection.
+"""
+import heapq
+from abc import ABC
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from cbor2 import loads
+except ImportError:
+    from cbor import loads
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.data import BundleInformation
+from dtn7zero.utility import get_current_clock_millis, warning
+
+
+class EvictionPolicy(ABC):
+
+    def __init__(self, max_bundles: int):
+        self.max_bundles = max_bundles
+
+        self._keys: Dict[str, tuple] = {}
+        self._heap: List[Tuple[tuple, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, bundle_information: BundleInformation):
+        self._set_key(bundle_information.bundle_id, self.get_key(bundle_information))
+
+    def update(self, bundle_information: BundleInformation):
+        """
+        to be called after the bundle was handed to the router, keys depending on forwarding state are re-evaluated
+        """
+        if bundle_information.bundle_id in self._keys:
+            key = self.get_updated_key(bundle_information, self._keys[bundle_information.bundle_id])
+            if key != self._keys[bundle_information.bundle_id]:
+                self._set_key(bundle_information.bundle_id, key)
+
+    def remove(self, bundle_id: str):
+        # the heap entry is left behind and skipped lazily
+        self._keys.pop(bundle_id, None)
+
+    def is_full(self, bundle_information: BundleInformation) -> bool:
+        """
+        returns True if the given bundle does not fit into the storage without evicting another one
+        """
+        return len(self._keys) >= self.max_bundles
+
+    def fits_empty_storage(self, bundle_information: BundleInformation) -> bool:
+        return True
+
+    def pop_victim(self) -> Optional[str]:
+        """
+        removes and returns the bundle id that should be evicted next, None if there is none
+        """
+        while self._heap:
+            key, bundle_id = heapq.heappop(self._heap)
+
+            if self._keys.get(bundle_id) == key:
+                self.remove(bundle_id)
+                return bundle_id
+
+        return None
+
+    def get_key(self, bundle_information: BundleInformation) -> tuple:
+        raise NotImplementedError('do not instantiate EvictionPolicy class directly')
+
+    def get_updated_key(self, bundle_information: BundleInformation, key: tuple) -> tuple:
+        return key
+
+    def _set_key(self, bundle_id: str, key: tuple):
+        self._keys[bundle_id] = key
+
+        if len(self._heap) > 2 * len(self._keys) + 16:
+            self._heap = [(x, y) for x, y in self._heap if self._keys.get(y) == x]
+            heapq.heapify(self._heap)
+
+        heapq.heappush(self._heap, (key, bundle_id))
+
+
+class OldestReceivedEvictionPolicy(EvictionPolicy):
+    """
+    simplicity -> evicts the bundle that was received first
+
+    This eliminates bundles with extremely long lifetime blocking storage,
+    but it also discriminates packages with low hop count.
+    """
+
+    def get_key(self, bundle_information: BundleInformation) -> tuple:
+        return (bundle_information.received_at_ms,)
+
+
+class ByteBudgetLruEvictionPolicy(EvictionPolicy):
+    """
+    limits the summed serialized size of all stored bundles and evicts the least recently used one
+
+    A bundle counts as used when it is stored and whenever it was forwarded to another node.
+    A single bundle larger than the whole budget is rejected instead of emptying the storage.
+    """
+
+    def __init__(self, max_bundles: int, max_bytes: int):
+        super().__init__(max_bundles)
+        self.max_bytes = max_bytes
+        self.stored_bytes = 0
+
+        self._sizes: Dict[str, int] = {}
+        self._forwarded_counts: Dict[str, int] = {}
+        self._last_measured: Tuple[Optional[str], int] = (None, 0)
+
+    def add(self, bundle_information: BundleInformation):
+        bundle_id = bundle_information.bundle_id
+
+        if bundle_id not in self._sizes:
+            self._sizes[bundle_id] = self._measure(bundle_information)
+            self.stored_bytes += self._sizes[bundle_id]
+        self._forwarded_counts[bundle_id] = bundle_information.forwarded_count
+
+        super().add(bundle_information)
+
+    def remove(self, bundle_id: str):
+        super().remove(bundle_id)
+        self.stored_bytes -= self._sizes.pop(bundle_id, 0)
+        self._forwarded_counts.pop(bundle_id, None)
+
+    def is_full(self, bundle_information: BundleInformation) -> bool:
+        return super().is_full(bundle_information) or self.stored_bytes + self._measure(bundle_information) > self.max_bytes
+
+    def fits_empty_storage(self, bundle_information: BundleInformation) -> bool:
+        return self._measure(bundle_information) <= self.max_bytes
+
+    def get_key(self, bundle_information: BundleInformation) -> tuple:
+        return (get_current_clock_millis(),)
+
+    def get_updated_key(self, bundle_information: BundleInformation, key: tuple) -> tuple:
+        forwarded_count = bundle_information.forwarded_count
+
+        if forwarded_count == self._forwarded_counts[bundle_information.bundle_id]:
+            return key
+
+        self._forwarded_counts[bundle_information.bundle_id] = forwarded_count
+        return (get_current_clock_millis(),)
+
+    def _measure(self, bundle_information: BundleInformation) -> int:
+        # is_full is called repeatedly for the same new bundle while evicting, serializing it once is enough
+        if self._last_measured[0] != bundle_information.bundle_id:
+            self._last_measured = (bundle_information.bundle_id, len(bundle_information.serialized_bundle))
+        return self._last_measured[1]
+
+
+class ShortestRemainingLifetimeEvictionPolicy(EvictionPolicy):
+    """
+    evicts the bundle closest to its expiry, it is the least likely one to still reach its destination
+
+    Bundles without a known expiry (no bundle age block on clockless nodes) are evicted last, oldest received first.
+    """
+
+    def get_key(self, bundle_information: BundleInformation) -> tuple:
+        expires_at_ms = bundle_information.expires_at_ms
+
+        if expires_at_ms is None:
+            return True, bundle_information.received_at_ms
+
+        return False, expires_at_ms
+
+
+class MostForwardedEvictionPolicy(EvictionPolicy):
+    """
+    evicts the bundle that was already forwarded to the most nodes, as it has the most copies in the network
+
+    Ties are evicted oldest received first.
+    """
+
+    def get_key(self, bundle_information: BundleInformation) -> tuple:
+        return -bundle_information.forwarded_count, bundle_information.received_at_ms
+
+    def get_updated_key(self, bundle_information: BundleInformation, key: tuple) -> tuple:
+        return self.get_key(bundle_information)
+
+
+class PriorityClassEvictionPolicy(EvictionPolicy):
+    """
+    evicts bundles of the lowest priority class first, oldest received first within a class
+
+    The priority class is an unsigned integer (higher is more important) carried as cbor in an extension block
+    of type CONFIGURATION.PRIORITY_BLOCK_TYPE_CODE. Bundles without this block get DEFAULT_BUNDLE_PRIORITY.
+    """
+
+    def get_key(self, bundle_information: BundleInformation) -> tuple:
+        return get_bundle_priority(bundle_information), bundle_information.received_at_ms
+
+
+def get_bundle_priority(bundle_information: BundleInformation) -> int:
+    for block in bundle_information.bundle.other_blocks:
+        if block.block_type_code == CONFIGURATION.PRIORITY_BLOCK_TYPE_CODE:
+            try:
+                return int(loads(block.data))
+            except Exception as e:
+                warning('unreadable priority block in bundle {}, error: {}'.format(bundle_information.bundle_id, e))
+                break
+
+    return CONFIGURATION.DEFAULT_BUNDLE_PRIORITY
+
+
+def create_eviction_policy() -> EvictionPolicy:
+    """
+    returns the eviction policy configured with SIMPLE_IN_MEMORY_STORAGE_EVICTION_POLICY
+    """
+    policy = CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_EVICTION_POLICY
+    max_bundles = CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_MAX_STORED_BUNDLES
+
+    if policy == CONFIGURATION.EVICTION_POLICY_BYTE_BUDGET_LRU:
+        return ByteBudgetLruEvictionPolicy(max_bundles, CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_MAX_STORED_BYTES)
+    if policy == CONFIGURATION.EVICTION_POLICY_SHORTEST_REMAINING_LIFETIME:
+        return ShortestRemainingLifetimeEvictionPolicy(max_bundles)
+    if policy == CONFIGURATION.EVICTION_POLICY_MOST_FORWARDED:
+        return MostForwardedEvictionPolicy(max_bundles)
+    if policy == CONFIGURATION.EVICTION_POLICY_PRIORITY_CLASS:
+        return PriorityClassEvictionPolicy(max_bundles)
+    if policy == CONFIGURATION.EVICTION_POLICY_OLDEST_RECEIVED:
+        return OldestReceivedEvictionPolicy(max_bundles)
+
+    raise Exception('unknown eviction policy: {}'.format(policy))
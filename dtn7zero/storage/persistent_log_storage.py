@@ -0,0 +1,482 @@
+"""
+A store-carry-forward storage that survives reboots.
+
+Bundles are appended to segment files inside one directory, only a small index is kept in RAM:
+    bundle-id -> [segment, offset, length, received-at, expires-at, destination node uri, retention-constraint,
+                  locally-delivered, forwarded-to addresses]
+
+Record format (big-endian): type (1 byte), meta length (2 bytes), bundle length (4 bytes), cbor meta, bundle bytes
+    PUT    -> meta: [bundle-id, received-at, expires-at, destination node uri, retention-constraint, locally-delivered,
+                     forwarded-to addresses]
+    UPDATE -> meta: [bundle-id, retention-constraint, locally-delivered, forwarded-to addresses], no bundle bytes
+    DELETE -> meta: [bundle-id], no bundle bytes
+
+On startup the index is rebuilt by reading only the record headers and metas, bundle bytes are skipped.
+Like in the in-memory storage, the bundles pending per node and the bundles per destination are indexed in RAM,
+so a new contact is handed only its pending bundles (destined ones first) without scanning the whole index.
+Writing always starts a new segment, so a record torn by a reset is never appended to.
+Older segments are compacted incrementally: live records are copied to the active segment, then the old file is removed.
+
+Only os.listdir/mkdir/remove/stat and plain file objects are used, so this works on CPython and the MicroPython VFS.
+"""
+import heapq
+import os
+import struct
+from typing import Dict, Tuple, List, Optional, Iterable, Union, Set
+
+try:
+    from cbor2 import dumps, loads
+except ImportError:
+    from cbor import dumps, loads
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.data import BundleInformation, SerializedBundleInformation, Node
+from dtn7zero.storage import Storage
+from dtn7zero.storage.seen_bundle_ids import SeenBundleIdLedger, SeenBundleIdFilter, create_seen_bundle_ids
+from dtn7zero.utility import debug, warning, get_current_clock_millis, get_node_uri_of_endpoint_uri
+
+
+RECORD_TYPE_PUT = 1
+RECORD_TYPE_UPDATE = 2
+RECORD_TYPE_DELETE = 3
+
+RECORD_HEADER_FORMAT = '!BHI'
+RECORD_HEADER_SIZE = struct.calcsize(RECORD_HEADER_FORMAT)
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+
+# index entry positions
+_SEGMENT = 0
+_OFFSET = 1
+_LENGTH = 2
+_RECEIVED_AT_MS = 3
+_EXPIRES_AT_MS = 4
+_DESTINATION = 5
+_RETENTION_CONSTRAINT = 6
+_LOCALLY_DELIVERED = 7
+_FORWARDED_TO = 8
+
+
+class PersistentLogStorage(Storage):
+
+    def __init__(self, directory: str = None):
+        self.directory = directory if directory is not None else CONFIGURATION.PERSISTENT_LOG_STORAGE.DIRECTORY
+
+        self.index: Dict[str, list] = {}
+        self.bundle_ids: Union[SeenBundleIdLedger, SeenBundleIdFilter] = create_seen_bundle_ids()
+        self.nodes: Dict[str, Node] = {}
+        self._node_indexes: Dict[str, int] = {}
+
+        # segment number -> [total bytes, live bytes]
+        self.segments: Dict[int, list] = {}
+
+        # (expires-at, bundle-id) min-heap, entries of removed bundles are skipped lazily
+        self._expiry_heap: List[Tuple[int, str]] = []
+
+        # secondary indexes for targeted hand-off on a new contact, without scanning all stored bundles
+        self._pending_by_node: Dict[str, Set[str]] = {}  # node address -> ids of stored bundles not yet forwarded to it
+        self._bundles_by_destination: Dict[str, Set[str]] = {}  # destination node uri -> ids of stored bundles
+        self._contacts: List[Node] = []
+
+        try:
+            os.mkdir(self.directory)
+        except OSError:
+            pass  # already exists
+
+        self._rebuild_index()
+
+        self.active_segment = max(self.segments) + 1 if self.segments else 0
+        self.segments[self.active_segment] = [0, 0]
+        self._active_file = open(self._segment_path(self.active_segment), 'ab')
+
+    def close(self):
+        self._active_file.close()
+
+    def add_node(self, node: Node):
+        # nodes are interned to small integers by address, a re-created node keeps its bit in the forwarded bitmaps
+        if node.address not in self._node_indexes:
+            self._node_indexes[node.address] = len(self._node_indexes)
+        node.index = self._node_indexes[node.address]
+
+        if node.address not in self._pending_by_node:
+            self._pending_by_node[node.address] = set(x for x, entry in self.index.items() if node.address not in entry[_FORWARDED_TO])
+
+        self.nodes[node.address] = node
+        self.add_contact(node)
+
+    def add_contact(self, node: Node):
+        if node not in self._contacts:
+            self._contacts.append(node)
+
+    def get_node(self, node_address) -> Optional[Node]:
+        return self.nodes.get(node_address)
+
+    def get_nodes(self) -> Iterable[Node]:
+        return self.nodes.values()
+
+    def get_seen(self, bundle_id: str) -> Optional[str]:
+        return self.bundle_ids.get(bundle_id)
+
+    def was_seen(self, bundle_id: str) -> bool:
+        return bundle_id in self.bundle_ids
+
+    def store_seen(self, bundle_id: str, node_address):
+        if node_address is None and self.bundle_ids.get(bundle_id, None) is not None:
+            return  # we do not want to overwrite a valid node with None from an unknown source
+
+        self.bundle_ids.add(bundle_id, node_address)
+
+    def remove_bundle(self, bundle_id: str) -> bool:
+        if bundle_id not in self.index:
+            return False
+
+        self._delete(bundle_id)
+        return True
+
+    def delay_bundle(self, bundle_information: BundleInformation) -> Tuple[bool, List[BundleInformation]]:
+        removed_bundles = []
+        bundle_id = bundle_information.bundle_id
+
+        if bundle_id in self.index:
+            self._write_back(bundle_information)
+            return True, removed_bundles
+
+        if len(self.index) >= CONFIGURATION.PERSISTENT_LOG_STORAGE.MAX_STORED_BUNDLES:
+            self.garbage_collect()
+
+        if len(self.index) >= CONFIGURATION.PERSISTENT_LOG_STORAGE.MAX_STORED_BUNDLES:
+            oldest_bundle_id = min(self.index, key=lambda x: self.index[x][_RECEIVED_AT_MS])
+            oldest_bundle = self._load(oldest_bundle_id)  # an unreadable bundle is already deleted while loading
+            if oldest_bundle is not None:
+                self._delete(oldest_bundle_id)
+                removed_bundles.append(oldest_bundle)
+
+        self.store_seen(bundle_id, None)
+        self.bundle_ids.retain(bundle_id)
+
+        try:
+            self._put(bundle_id, bundle_information.serialized_bundle, self._build_meta_state(bundle_information), bundle_information.received_at_ms,
+                      bundle_information.expires_at_ms, get_node_uri_of_endpoint_uri(bundle_information.full_destination_uri))
+        except OSError as e:
+            warning('could not persist bundle {}, error: {}'.format(bundle_id, e))
+            self.bundle_ids.release(bundle_id)
+            return False, removed_bundles
+
+        return True, removed_bundles
+
+    def garbage_collect(self):
+        for bundle_id in [x for x, entry in self.index.items() if entry[_RETENTION_CONSTRAINT] is None]:
+            self._delete(bundle_id)
+
+    def get_bundles_to_retry(self):
+        # one incremental compaction step per retry pass keeps the segment files small in the background
+        self.compact_step()
+
+        for bundle_id in tuple(self.index):
+            if bundle_id not in self.index:
+                continue  # removed in the meantime (expired, canceled)
+
+            bundle_information = self._load(bundle_id)
+
+            if bundle_information is None:
+                continue
+
+            yield bundle_information
+
+            # the bpa is done with this bundle, persist what the dispatching changed (forwarded-to, retention)
+            if bundle_id in self.index:
+                self._write_back(bundle_information)
+
+    def mark_forwarded(self, bundle_information: BundleInformation, node: Node):
+        bundle_information.mark_forwarded_to(node)
+
+        if bundle_information.bundle_id in self.index:
+            self._write_back(bundle_information)
+
+    def unmark_forwarded(self, bundle_id: str, node: Node) -> bool:
+        entry = self.index.get(bundle_id)
+        if entry is None:
+            return False
+
+        if node.index is None or node.address not in entry[_FORWARDED_TO]:
+            return True
+
+        bundle_information = self._load(bundle_id)  # an unreadable bundle is already deleted while loading
+        if bundle_information is None:
+            return False
+
+        bundle_information.unmark_forwarded_to(node)
+        self._write_back(bundle_information)
+        return True
+
+    def get_bundles_to_hand_off(self):
+        # only the pending bundles of the contact are read from flash
+        while self._contacts:
+            node = self._contacts.pop(0)
+            pending = self._pending_by_node.get(node.address)
+
+            if not pending:
+                continue
+
+            # bundles destined for the contact itself are handed off first
+            destined = self._bundles_by_destination.get(node.full_node_uri, set()) & pending
+
+            for bundle_id in list(destined) + list(pending - destined):
+                if bundle_id not in pending or bundle_id not in self.index:
+                    continue
+
+                bundle_information = self._load(bundle_id)
+                if bundle_information is not None:
+                    yield node, bundle_information
+
+    def get_next_expiry_millis(self) -> Optional[int]:
+        return self._expiry_heap[0][0] if self._expiry_heap else None
+
+    def pop_expired_bundles(self, max_bundles: int) -> List[BundleInformation]:
+        expired_bundles = []
+        now = get_current_clock_millis()
+
+        while self._expiry_heap and self._expiry_heap[0][0] <= now and len(expired_bundles) < max_bundles:
+            expires_at_ms, bundle_id = heapq.heappop(self._expiry_heap)
+
+            entry = self.index.get(bundle_id)
+            if entry is None or entry[_EXPIRES_AT_MS] != expires_at_ms:
+                continue
+
+            bundle_information = self._load(bundle_id)  # an unreadable bundle is already deleted while loading
+            if bundle_information is not None:
+                self._delete(bundle_id)
+                expired_bundles.append(bundle_information)
+
+        return expired_bundles
+
+    def compact_step(self):
+        """
+        copies at most COMPACTION_RECORDS_PER_STEP live records of the oldest inactive segment into the active segment,
+        the old segment file is removed as soon as no live record is left in it
+        """
+        candidates = [x for x in self.segments if x != self.active_segment]
+        if not candidates:
+            return
+
+        segment = min(candidates)
+        total_bytes, live_bytes = self.segments[segment]
+
+        if live_bytes > 0 and live_bytes / total_bytes > 1 - CONFIGURATION.PERSISTENT_LOG_STORAGE.COMPACTION_MIN_DEAD_RATIO and len(candidates) < CONFIGURATION.PERSISTENT_LOG_STORAGE.COMPACTION_MAX_INACTIVE_SEGMENTS:
+            return  # not worth rewriting yet
+
+        moved = 0
+        for bundle_id, entry in tuple(self.index.items()):
+            if moved >= CONFIGURATION.PERSISTENT_LOG_STORAGE.COMPACTION_RECORDS_PER_STEP:
+                return
+            if entry[_SEGMENT] != segment:
+                continue
+
+            serialized_bundle = self._read(entry)
+            self._put(bundle_id, serialized_bundle, entry[_RETENTION_CONSTRAINT:], entry[_RECEIVED_AT_MS], entry[_EXPIRES_AT_MS], entry[_DESTINATION])
+            moved += 1
+
+        debug('persistent log storage: removing compacted segment {}'.format(segment))
+        os.remove(self._segment_path(segment))
+        del self.segments[segment]
+
+    def _build_meta_state(self, bundle_information: BundleInformation) -> list:
+        # addresses instead of the bitmap, as node indexes are only valid until a restart
+        # addresses of nodes that were not rediscovered since the last restart are kept
+        forwarded_to = [x.address for x in self.nodes.values() if bundle_information.is_forwarded_to(x)]
+        entry = self.index.get(bundle_information.bundle_id)
+        if entry is not None:
+            forwarded_to += [x for x in entry[_FORWARDED_TO] if x not in self.nodes]
+
+        return [
+            bundle_information.retention_constraint,
+            bundle_information.locally_delivered,
+            sorted(forwarded_to)
+        ]
+
+    def _put(self, bundle_id: str, serialized_bundle: bytes, meta_state: list, received_at_ms: int, expires_at_ms: Optional[int], destination_node_uri: str):
+        if self.segments[self.active_segment][0] >= CONFIGURATION.PERSISTENT_LOG_STORAGE.SEGMENT_MAX_BYTES:
+            self._roll_over()
+
+        if bundle_id in self.index:
+            old_entry = self.index[bundle_id]
+            self.segments[old_entry[_SEGMENT]][1] -= old_entry[_LENGTH]
+
+        offset = self._append(RECORD_TYPE_PUT, [bundle_id, received_at_ms, expires_at_ms, destination_node_uri] + list(meta_state), serialized_bundle)
+
+        self.segments[self.active_segment][1] += len(serialized_bundle)
+        self.index[bundle_id] = [self.active_segment, offset, len(serialized_bundle), received_at_ms, expires_at_ms, destination_node_uri] + list(meta_state)
+        self._push_expiry(bundle_id)
+        self._add_to_indexes(bundle_id)
+
+    def _write_back(self, bundle_information: BundleInformation):
+        bundle_id = bundle_information.bundle_id
+        entry = self.index[bundle_id]
+        meta_state = self._build_meta_state(bundle_information)
+
+        if entry[_RETENTION_CONSTRAINT:] == meta_state:
+            return
+
+        self._append(RECORD_TYPE_UPDATE, [bundle_id] + meta_state, b'')
+        self.index[bundle_id] = entry[:_RETENTION_CONSTRAINT] + meta_state
+        self._update_pending(bundle_id)
+
+    def _delete(self, bundle_id: str):
+        entry = self.index.pop(bundle_id)
+        self.segments[entry[_SEGMENT]][1] -= entry[_LENGTH]
+        self.bundle_ids.release(bundle_id)
+        self._remove_from_indexes(bundle_id, entry)
+
+        self._append(RECORD_TYPE_DELETE, [bundle_id], b'')
+
+    def _add_to_indexes(self, bundle_id: str):
+        destination_node_uri = self.index[bundle_id][_DESTINATION]
+        if destination_node_uri not in self._bundles_by_destination:
+            self._bundles_by_destination[destination_node_uri] = set()
+        self._bundles_by_destination[destination_node_uri].add(bundle_id)
+
+        self._update_pending(bundle_id)
+
+    def _update_pending(self, bundle_id: str):
+        forwarded_to = self.index[bundle_id][_FORWARDED_TO]
+        for node_address, pending in self._pending_by_node.items():
+            if node_address in forwarded_to:
+                pending.discard(bundle_id)
+            else:
+                pending.add(bundle_id)
+
+    def _remove_from_indexes(self, bundle_id: str, entry: list):
+        for pending in self._pending_by_node.values():
+            pending.discard(bundle_id)
+
+        destination = self._bundles_by_destination.get(entry[_DESTINATION])
+        if destination is not None:
+            destination.discard(bundle_id)
+            if not destination:
+                del self._bundles_by_destination[entry[_DESTINATION]]
+
+    def _append(self, record_type: int, meta: list, serialized_bundle: bytes) -> int:
+        """
+        appends one record to the active segment and returns the offset of the bundle bytes
+        """
+        encoded_meta = dumps(meta)
+
+        record_offset = self.segments[self.active_segment][0]
+
+        self._active_file.write(struct.pack(RECORD_HEADER_FORMAT, record_type, len(encoded_meta), len(serialized_bundle)))
+        self._active_file.write(encoded_meta)
+        if serialized_bundle:
+            self._active_file.write(serialized_bundle)
+        self._active_file.flush()
+
+        self.segments[self.active_segment][0] += RECORD_HEADER_SIZE + len(encoded_meta) + len(serialized_bundle)
+
+        return record_offset + RECORD_HEADER_SIZE + len(encoded_meta)
+
+    def _roll_over(self):
+        self._active_file.close()
+        self.active_segment += 1
+        self.segments[self.active_segment] = [0, 0]
+        self._active_file = open(self._segment_path(self.active_segment), 'ab')
+
+    def _read(self, entry: list) -> bytes:
+        with open(self._segment_path(entry[_SEGMENT]), 'rb') as f:
+            f.seek(entry[_OFFSET])
+            return f.read(entry[_LENGTH])
+
+    def _load(self, bundle_id: str) -> Optional[BundleInformation]:
+        entry = self.index[bundle_id]
+
+        try:
+            bundle_information = SerializedBundleInformation(self._read(entry))
+        except Exception as e:
+            warning('persistent log storage: dropping unreadable bundle {}, error: {}'.format(bundle_id, e))
+            self._delete(bundle_id)
+            return None
+
+        bundle_information.received_at_ms = entry[_RECEIVED_AT_MS]
+        bundle_information.retention_constraint = entry[_RETENTION_CONSTRAINT]
+        bundle_information.locally_delivered = entry[_LOCALLY_DELIVERED]
+        for node_address in entry[_FORWARDED_TO]:
+            if node_address in self.nodes:
+                bundle_information.mark_forwarded_to(self.nodes[node_address])
+
+        return bundle_information
+
+    def _push_expiry(self, bundle_id: str):
+        expires_at_ms = self.index[bundle_id][_EXPIRES_AT_MS]
+        if expires_at_ms is None:
+            return
+
+        if len(self._expiry_heap) > 2 * len(self.index) + 16:
+            self._expiry_heap = [x for x in self._expiry_heap if x[1] in self.index]
+            heapq.heapify(self._expiry_heap)
+
+        heapq.heappush(self._expiry_heap, (expires_at_ms, bundle_id))
+
+    def _segment_path(self, segment: int) -> str:
+        # no os.path on micropython
+        return '{}/{}{:08d}{}'.format(self.directory, SEGMENT_PREFIX, segment, SEGMENT_SUFFIX)
+
+    def _rebuild_index(self):
+        segments = []
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith(SEGMENT_PREFIX) and file_name.endswith(SEGMENT_SUFFIX):
+                segments.append(int(file_name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+
+        for segment in sorted(segments):
+            self.segments[segment] = [os.stat(self._segment_path(segment))[6], 0]
+            self._rebuild_segment(segment)
+
+        for bundle_id in self.index:
+            self.store_seen(bundle_id, None)
+            self.bundle_ids.retain(bundle_id)
+
+        self._expiry_heap = [(entry[_EXPIRES_AT_MS], bundle_id) for bundle_id, entry in self.index.items() if entry[_EXPIRES_AT_MS] is not None]
+        heapq.heapify(self._expiry_heap)
+
+        for bundle_id in self.index:
+            self._add_to_indexes(bundle_id)  # no nodes are known yet, add_node builds their pending sets
+
+        debug('persistent log storage: rebuilt index with {} bundles from {} segments'.format(len(self.index), len(segments)))
+
+    def _rebuild_segment(self, segment: int):
+        with open(self._segment_path(segment), 'rb') as f:
+            offset = 0
+
+            while True:
+                header = f.read(RECORD_HEADER_SIZE)
+                if len(header) < RECORD_HEADER_SIZE:
+                    break
+
+                record_type, meta_length, bundle_length = struct.unpack(RECORD_HEADER_FORMAT, header)
+
+                try:
+                    meta = loads(f.read(meta_length))
+                except Exception:
+                    warning('persistent log storage: segment {} is torn at offset {}, ignoring the rest'.format(segment, offset))
+                    break
+
+                offset += RECORD_HEADER_SIZE + meta_length
+
+                if offset + bundle_length > self.segments[segment][0]:
+                    warning('persistent log storage: segment {} is torn at offset {}, ignoring the rest'.format(segment, offset))
+                    break
+
+                bundle_id = meta[0]
+                old_entry = self.index.get(bundle_id)
+
+                if record_type == RECORD_TYPE_PUT:
+                    if old_entry is not None:
+                        self.segments[old_entry[_SEGMENT]][1] -= old_entry[_LENGTH]
+                    self.index[bundle_id] = [segment, offset, bundle_length] + meta[1:]
+                    self.segments[segment][1] += bundle_length
+                elif record_type == RECORD_TYPE_UPDATE and old_entry is not None:
+                    self.index[bundle_id] = old_entry[:_RETENTION_CONSTRAINT] + meta[1:]
+                elif record_type == RECORD_TYPE_DELETE and old_entry is not None:
+                    self.segments[old_entry[_SEGMENT]][1] -= old_entry[_LENGTH]
+                    del self.index[bundle_id]
+
+                offset += bundle_length
+                f.seek(offset)
@@ -0,0 +1,167 @@
+import hashlib
+import heapq
+import math
+import struct
+from typing import Dict, List, Optional, Tuple, Union
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.utility import get_bundle_id_age_key, get_current_clock_millis, is_timestamp_older_than_timeout
+
+
+class SeenBundleIdLedger:
+
+    def __init__(self, max_bundle_ids: int):
+        """ The exact record of all seen bundle ids and the node address each one was received from.
+
+        Once full, the oldest bundle id is forgotten (creation timestamp + sequence number, inaccurate clocks are newer).
+        A min-heap over the age key keeps insertion and eviction at O(log n), instead of scanning the whole table.
+        """
+        self.max_bundle_ids = max_bundle_ids
+
+        self.bundle_ids: Dict[str, Optional[str]] = {}
+        self._age_heap: List[Tuple[Tuple[bool, int, int], str]] = []
+
+    def __len__(self) -> int:
+        return len(self.bundle_ids)
+
+    def __contains__(self, bundle_id: str) -> bool:
+        return bundle_id in self.bundle_ids
+
+    def get(self, bundle_id: str, default: Optional[str] = None) -> Optional[str]:
+        return self.bundle_ids.get(bundle_id, default)
+
+    def add(self, bundle_id: str, node_address: Optional[str]):
+        if bundle_id in self.bundle_ids:
+            self.bundle_ids[bundle_id] = node_address
+            return
+
+        while len(self.bundle_ids) >= self.max_bundle_ids and self._age_heap:
+            self.discard(heapq.heappop(self._age_heap)[1])
+
+        self.bundle_ids[bundle_id] = node_address
+        heapq.heappush(self._age_heap, (get_bundle_id_age_key(bundle_id), bundle_id))
+
+    def discard(self, bundle_id: str):
+        # the heap entry is left behind and skipped lazily on eviction, until the stale entries outnumber the live ones
+        self.bundle_ids.pop(bundle_id, None)
+
+        if len(self._age_heap) > 2 * len(self.bundle_ids) + 16:
+            self._age_heap = [x for x in self._age_heap if x[1] in self.bundle_ids]
+            heapq.heapify(self._age_heap)
+
+    def oldest(self) -> Optional[str]:
+        while self._age_heap and self._age_heap[0][1] not in self.bundle_ids:
+            heapq.heappop(self._age_heap)
+
+        return self._age_heap[0][1] if self._age_heap else None
+
+    def retain(self, bundle_id: str):
+        pass  # every node address is kept until the bundle id is evicted
+
+    def release(self, bundle_id: str):
+        pass  # the bundle id stays known after its bundle left the storage
+
+
+class SeenBundleIdFilter:
+
+    def __init__(self, capacity: int, false_positive_rate: float, rotation_interval_milliseconds: int, max_pending_bundle_ids: int):
+        """ A time-rotated bloom filter as compact replacement of the exact seen bundle id ledger.
+
+        Two filter generations are kept, each sized for capacity bundle ids at the given false positive rate.
+        New ids go into the current generation, lookups check both. The current generation becomes the previous one
+        once it is full or older than the rotation interval, so every id is remembered for at least one generation.
+
+        A false positive means a new bundle is dropped as a duplicate, so the rate should be tuned to the deployment.
+
+        The exact bundle-id -> previous-node-address map is only kept for stored (retained) bundles and for a small
+        number of recently seen bundles that are still in the dispatch pipeline.
+        """
+        self.capacity = capacity
+        self.rotation_interval_milliseconds = rotation_interval_milliseconds
+
+        self.num_bits = max(8, math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+
+        self._current = bytearray((self.num_bits + 7) // 8)
+        self._current_count = 0
+        self._previous = bytearray((self.num_bits + 7) // 8)
+        self._previous_count = 0
+        self._rotated_at_ms = get_current_clock_millis()
+
+        self.pending: SeenBundleIdLedger = SeenBundleIdLedger(max_pending_bundle_ids)
+        self.retained: Dict[str, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        # approximation, as every bundle id that changed at least one bit is counted
+        return self._current_count + self._previous_count
+
+    def __contains__(self, bundle_id: str) -> bool:
+        if bundle_id in self.retained or bundle_id in self.pending:
+            return True
+
+        positions = self._bit_positions(bundle_id)
+        return self._contains_positions(self._current, positions) or self._contains_positions(self._previous, positions)
+
+    def get(self, bundle_id: str, default: Optional[str] = None) -> Optional[str]:
+        if bundle_id in self.retained:
+            return self.retained[bundle_id]
+        return self.pending.get(bundle_id, default)
+
+    def add(self, bundle_id: str, node_address: Optional[str]):
+        if self._current_count >= self.capacity or is_timestamp_older_than_timeout(self._rotated_at_ms, self.rotation_interval_milliseconds):
+            self._rotate()
+
+        changed = False
+        for position in self._bit_positions(bundle_id):
+            mask = 1 << (position & 7)
+            if not self._current[position >> 3] & mask:
+                self._current[position >> 3] |= mask
+                changed = True
+
+        if changed:
+            self._current_count += 1
+
+        if bundle_id in self.retained:
+            self.retained[bundle_id] = node_address
+        elif node_address is not None or bundle_id in self.pending:
+            self.pending.add(bundle_id, node_address)
+
+    def retain(self, bundle_id: str):
+        self.retained[bundle_id] = self.pending.get(bundle_id)
+        self.pending.discard(bundle_id)
+
+    def release(self, bundle_id: str):
+        self.retained.pop(bundle_id, None)
+
+    def _rotate(self):
+        self._previous, self._previous_count = self._current, self._current_count
+        self._current, self._current_count = bytearray((self.num_bits + 7) // 8), 0
+        self._rotated_at_ms = get_current_clock_millis()
+
+    def _bit_positions(self, bundle_id: str) -> List[int]:
+        # double hashing: k positions derived from two independent 32bit values of one digest
+        first, second = struct.unpack_from('!II', hashlib.sha1(bundle_id.encode(CONFIGURATION.ENCODING)).digest(), 0)
+        second |= 1
+
+        return [(first + i * second) % self.num_bits for i in range(self.num_hashes)]
+
+    @staticmethod
+    def _contains_positions(bits: bytearray, positions: List[int]) -> bool:
+        for position in positions:
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+def create_seen_bundle_ids() -> Union[SeenBundleIdLedger, SeenBundleIdFilter]:
+    """
+    returns the configured seen-set: the exact ledger, or the bloom filter if SEEN_FILTER_ENABLED is set
+    """
+    if CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_ENABLED:
+        return SeenBundleIdFilter(
+            CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_CAPACITY,
+            CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_FALSE_POSITIVE_RATE,
+            CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_ROTATION_MILLISECONDS,
+            CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_SEEN_FILTER_MAX_PENDING_BUNDLE_IDS
+        )
+    return SeenBundleIdLedger(CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_MAX_KNOWN_BUNDLE_IDS)
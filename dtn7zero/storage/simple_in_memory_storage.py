@@ -1,20 +1,46 @@
-from typing import Dict, Tuple, List, Optional, Iterable
+import heapq
+from typing import Dict, Tuple, List, Optional, Iterable, Union, Set
 
 from dtn7zero.configuration import CONFIGURATION
-from dtn7zero.data import BundleInformation, Node
+from dtn7zero.data import BundleInformation, SerializedBundleInformation, Node
 from dtn7zero.storage import Storage
-from dtn7zero.utility import get_oldest_bundle, get_oldest_bundle_id
+from dtn7zero.storage.eviction_policies import EvictionPolicy, create_eviction_policy
+from dtn7zero.storage.seen_bundle_ids import SeenBundleIdLedger, SeenBundleIdFilter, create_seen_bundle_ids
+from dtn7zero.utility import get_current_clock_millis, get_node_uri_of_endpoint_uri
 
 
 class SimpleInMemoryStorage(Storage):
 
-    def __init__(self):
+    def __init__(self, eviction_policy: EvictionPolicy = None):
         self.bundles: Dict[str, BundleInformation] = {}
-        self.bundle_ids: Dict[str, Optional[str]] = {}
+        self.eviction_policy: EvictionPolicy = eviction_policy if eviction_policy is not None else create_eviction_policy()
+        self.bundle_ids: Union[SeenBundleIdLedger, SeenBundleIdFilter] = create_seen_bundle_ids()
         self.nodes: Dict[str, Node] = {}
+        self._node_indexes: Dict[str, int] = {}
+
+        # (expires-at, bundle-id) min-heap, entries of removed bundles are skipped lazily
+        self._expiry_heap: List[Tuple[int, str]] = []
+
+        # secondary indexes for targeted hand-off on a new contact, without scanning all stored bundles
+        self._pending_by_node: Dict[str, Set[str]] = {}  # node address -> ids of stored bundles not yet forwarded to it
+        self._bundles_by_destination: Dict[str, Set[str]] = {}  # destination node uri -> ids of stored bundles
+        self._contacts: List[Node] = []
 
     def add_node(self, node: Node):
+        # nodes are interned to small integers by address, a re-created node keeps its bit in the forwarded bitmaps
+        if node.address not in self._node_indexes:
+            self._node_indexes[node.address] = len(self._node_indexes)
+        node.index = self._node_indexes[node.address]
+
+        if node.address not in self._pending_by_node:
+            self._pending_by_node[node.address] = set(x for x, y in self.bundles.items() if not y.is_forwarded_to(node))
+
         self.nodes[node.address] = node
+        self.add_contact(node)
+
+    def add_contact(self, node: Node):
+        if node not in self._contacts:
+            self._contacts.append(node)
 
     def get_node(self, node_address) -> Optional[Node]:
         return self.nodes.get(node_address)
@@ -32,39 +58,149 @@ class SimpleInMemoryStorage(Storage):
         if node_address is None and self.bundle_ids.get(bundle_id, None) is not None:
             return  # we do not want to overwrite a valid node with None from an unknown source
 
-        if len(self.bundle_ids) >= CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_MAX_KNOWN_BUNDLE_IDS:
-            del self.bundle_ids[get_oldest_bundle_id(self.bundle_ids)]
-        self.bundle_ids[bundle_id] = node_address
+        self.bundle_ids.add(bundle_id, node_address)
 
     def remove_bundle(self, bundle_id: str) -> bool:
-        return self.bundles.pop(bundle_id, False)  # if the bundle exists it is 'truthy'
+        self.bundle_ids.release(bundle_id)
+
+        if bundle_id not in self.bundles:
+            return False
+
+        self._remove(bundle_id)
+        return True
 
     def delay_bundle(self, bundle_information: BundleInformation) -> Tuple[bool, List[BundleInformation]]:
         removed_bundles = []
 
-        if bundle_information.bundle.bundle_id in self.bundles:
+        if bundle_information.bundle_id in self.bundles:
             return True, removed_bundles
 
-        if len(self.bundles) >= CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_MAX_STORED_BUNDLES:
+        if not self.eviction_policy.fits_empty_storage(bundle_information):
+            return False, removed_bundles
+
+        if self.eviction_policy.is_full(bundle_information):
             self.garbage_collect()
 
-        if len(self.bundles) >= CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_MAX_STORED_BUNDLES:
-            oldest_bundle = self.bundles.pop(get_oldest_bundle(self.bundles.values()).bundle.bundle_id)
-            removed_bundles.append(oldest_bundle)
+        while self.eviction_policy.is_full(bundle_information):
+            victim_bundle_id = self.eviction_policy.pop_victim()
+
+            if victim_bundle_id is None:
+                return False, removed_bundles
+
+            removed_bundles.append(self._remove(victim_bundle_id))
 
-        self.store_seen(bundle_information.bundle.bundle_id, None)
+        self.eviction_policy.add(bundle_information)
 
-        self.bundles[bundle_information.bundle.bundle_id] = bundle_information
+        self.store_seen(bundle_information.bundle_id, None)
+        self.bundle_ids.retain(bundle_information.bundle_id)
+
+        if CONFIGURATION.SIMPLE_IN_MEMORY_STORAGE_SERIALIZED_BUNDLES:
+            bundle_information = SerializedBundleInformation.from_bundle_information(bundle_information)
+
+        self.bundles[bundle_information.bundle_id] = bundle_information
+
+        expires_at_ms = bundle_information.expires_at_ms
+        if expires_at_ms is not None:
+            if len(self._expiry_heap) > 2 * len(self.bundles) + 16:
+                self._expiry_heap = [x for x in self._expiry_heap if x[1] in self.bundles]
+                heapq.heapify(self._expiry_heap)
+
+            heapq.heappush(self._expiry_heap, (expires_at_ms, bundle_information.bundle_id))
+
+        for node_address, pending in self._pending_by_node.items():
+            if not bundle_information.is_forwarded_to(self.nodes[node_address]):
+                pending.add(bundle_information.bundle_id)
+
+        destination_node_uri = get_node_uri_of_endpoint_uri(bundle_information.full_destination_uri)
+        if destination_node_uri not in self._bundles_by_destination:
+            self._bundles_by_destination[destination_node_uri] = set()
+        self._bundles_by_destination[destination_node_uri].add(bundle_information.bundle_id)
 
         return True, removed_bundles
 
+    def mark_forwarded(self, bundle_information: BundleInformation, node: Node):
+        bundle_information.mark_forwarded_to(node)
+
+        pending = self._pending_by_node.get(node.address)
+        if pending is not None:
+            pending.discard(bundle_information.bundle_id)
+
+    def unmark_forwarded(self, bundle_id: str, node: Node) -> bool:
+        bundle_information = self.bundles.get(bundle_id)
+        if bundle_information is None:
+            return False
+
+        if node.index is not None:
+            bundle_information.unmark_forwarded_to(node)
+
+        pending = self._pending_by_node.get(node.address)
+        if pending is not None:
+            pending.add(bundle_id)
+        return True
+
+    def get_bundles_for_destination(self, full_node_uri: str) -> Iterable[BundleInformation]:
+        return [self.bundles[x] for x in self._bundles_by_destination.get(full_node_uri, ())]
+
+    def get_bundles_to_hand_off(self):
+        while self._contacts:
+            node = self._contacts.pop(0)
+            pending = self._pending_by_node.get(node.address)
+
+            if not pending:
+                continue
+
+            # bundles destined for the contact itself are handed off first
+            destined = self._bundles_by_destination.get(node.full_node_uri, set()) & pending
+
+            for bundle_id in list(destined) + list(pending - destined):
+                if bundle_id in pending and bundle_id in self.bundles:
+                    yield node, self.bundles[bundle_id]
+
     def garbage_collect(self):
         for bundle_id in list(self.bundles):
             if self.bundles[bundle_id].retention_constraint is None:
-                del self.bundles[bundle_id]
+                self._remove(bundle_id)
 
     def get_bundles_to_retry(self):
         # simply yield all stored bundles
         # 1. reason: in-memory storage only stores a limited amount of bundles
         # 2. router only forwards bundles where they have not been forwarded yet -> router filters
-        return (i for i in tuple(self.bundles.values()))
+        for bundle_information in tuple(self.bundles.values()):
+            if bundle_information.bundle_id not in self.bundles:
+                continue  # removed in the meantime (expired, canceled)
+
+            yield bundle_information
+
+            # the router is done with this bundle, forwarding state may have changed its eviction rank
+            self.eviction_policy.update(bundle_information)
+
+    def get_next_expiry_millis(self) -> Optional[int]:
+        return self._expiry_heap[0][0] if self._expiry_heap else None
+
+    def pop_expired_bundles(self, max_bundles: int) -> List[BundleInformation]:
+        expired_bundles = []
+        now = get_current_clock_millis()
+
+        while self._expiry_heap and self._expiry_heap[0][0] <= now and len(expired_bundles) < max_bundles:
+            bundle_id = heapq.heappop(self._expiry_heap)[1]
+
+            if bundle_id in self.bundles:
+                expired_bundles.append(self._remove(bundle_id))
+
+        return expired_bundles
+
+    def _remove(self, bundle_id: str) -> BundleInformation:
+        bundle_information = self.bundles.pop(bundle_id)
+
+        self.bundle_ids.release(bundle_id)
+        self.eviction_policy.remove(bundle_id)
+
+        for pending in self._pending_by_node.values():
+            pending.discard(bundle_id)
+
+        destination_node_uri = get_node_uri_of_endpoint_uri(bundle_information.full_destination_uri)
+        self._bundles_by_destination[destination_node_uri].discard(bundle_id)
+        if not self._bundles_by_destination[destination_node_uri]:
+            del self._bundles_by_destination[destination_node_uri]
+
+        return bundle_information
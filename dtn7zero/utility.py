@@ -1,71 +1,86 @@
 import time
 import re
-from typing import Iterable
+from typing import Iterable, Tuple, Optional
 
-from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.configuration import CONFIGURATION, RUNNING_MICROPYTHON
+from py_dtn7.utils import to_dtn_timestamp
+
+if RUNNING_MICROPYTHON:
+    try:
+        import _thread
+    except ImportError:
+        _thread = None  # port without threading support
+else:
+    import threading
 
 NODE_URI_REGEX = re.compile(r'(^dtn://[^~/]+/$)|(^ipn://\d+(\.\d+)*$)')
 ENDPOINT_URI_REGEX = re.compile(r'(^dtn://none$)|(^dtn://[^~/]+/([^~/]+/)*[^~/]+$)|(^ipn://\d+(\.\d+)+$)')
 GROUP_URI_REGEX = re.compile(r'^dtn://[^~/]+/([^~]+/)*~[^/]+$')
 
 
+def get_bundle_id_age_key(bundle_id: str) -> Tuple[bool, int, int]:
+    """
+    returns a sort key for a bundle id, based on the creation timestamp and sequence number, with inaccurate packages being newer
+
+    the smallest key belongs to the oldest bundle id
+    """
+    _, bundle_time, bundle_num = bundle_id.rsplit('-', 2)  # source-uri might contain unforeseen character
+    bundle_time, bundle_num = int(bundle_time), int(bundle_num)
+
+    # prefer packages with no accurate clock -> newer
+    return bundle_time == 0, bundle_time, bundle_num
+
+
 def get_oldest_bundle_id(bundle_ids: Iterable[str]):
     """
     returns the oldest bundle, based on the creation timestamp and sequence number, with inaccurate packages being newer
     """
-
-    def is_x_older(x_time, x_num, y_time, y_num):
-        if x_time == 0:
-            if y_time == 0:
-                return x_num < y_num
-            else:
-                return False  # prefer packages with no accurate clock -> newer
-        elif y_time == 0:
-            return True  # prefer packages with no accurate clock -> newer
-        elif x_time == y_time:
-            return x_num < y_num
-        else:
-            return x_time < y_time
-
-    oldest, oldest_time, oldest_num = None, None, None
+    oldest, oldest_key = None, None
 
     for bundle_id in bundle_ids:
-        if oldest is None:
-            oldest = bundle_id
-            _, oldest_time, oldest_num = oldest.rsplit('-', 2)  # source-uri might contain unforeseen character
-            oldest_time, oldest_num = int(oldest_time), int(oldest_num)
-        else:
-            _, bundle_time, bundle_num = bundle_id.rsplit('-', 2)  # source-uri might contain unforeseen character
-            bundle_time, bundle_num = int(bundle_time), int(bundle_num)
+        bundle_key = get_bundle_id_age_key(bundle_id)
 
-            if is_x_older(bundle_time, bundle_num, oldest_time, oldest_num):
-                oldest, oldest_time, oldest_num = bundle_id, bundle_time, bundle_num
+        if oldest is None or bundle_key < oldest_key:
+            oldest, oldest_key = bundle_id, bundle_key
 
     return oldest
 
 
-def get_oldest_bundle(bundle_informations):
+def get_node_uri_of_endpoint_uri(full_endpoint_uri: str) -> str:
     """
-    simplicity -> returns the oldest bundle based on reception time
+    returns the node uri part of an endpoint uri, example: "dtn://node1/inbox" -> "dtn://node1/", "ipn://12.3" -> "ipn://12"
+    """
+    if full_endpoint_uri.startswith('ipn:'):
+        return full_endpoint_uri.split('.', 1)[0]
+
+    node_end = full_endpoint_uri.find('/', 6)  # after "dtn://"
+    return full_endpoint_uri if node_end < 0 else full_endpoint_uri[:node_end + 1]
 
-    This eliminates bundles with extremely long lifetime blocking storage,
-    but it also discriminates packages with low hop count.
+
+def get_expiry_clock_millis(bundle_creation_time: int, lifetime: int, age_milliseconds: Optional[int], received_at_ms: int) -> Optional[int]:
     """
-    oldest = None
+    returns the local clock time (as in get_current_clock_millis) at which a bundle expires, None if it is unknown
 
-    for bundle_information in bundle_informations:
-        if oldest is None:
-            oldest = bundle_information
-        elif bundle_information.received_at_ms < oldest.received_at_ms:
-            oldest = bundle_information
+    the bundle age block is preferred, as it is the only lifetime budget usable on nodes without an accurate clock
+    (creation time 0 or micropython), otherwise the creation time is compared against the current dtn time
+    """
+    if age_milliseconds is not None:
+        return received_at_ms + lifetime - age_milliseconds
 
-    return oldest
+    if not RUNNING_MICROPYTHON and bundle_creation_time != 0:
+        return get_current_clock_millis() + bundle_creation_time + lifetime - to_dtn_timestamp()
+
+    return None
 
 
 def get_current_clock_millis():
     return time.time_ns() // 1000000
 
 
+def get_current_clock_micros():
+    return time.time_ns() // 1000
+
+
 def is_timestamp_older_than_timeout(clock_timestamp_millis: int, timeout_millis: int):
     return time.time_ns() // 1000000 - clock_timestamp_millis >= timeout_millis
 
@@ -123,3 +138,43 @@ def build_broadcast_ipv4_address(address: str, subnet: str) -> str:
         address_parts[idx] = str(int(address_parts[idx]) & subnet_part | inverse_subnet_part)
 
     return '.'.join(address_parts)
+
+
+class _ReentrantLock:
+    """
+    MicroPython has no RLock, this one is built from a plain lock and the thread identity
+    """
+
+    def __init__(self):
+        self._lock = _thread.allocate_lock() if _thread is not None else None
+        self._owner = None
+        self._count = 0
+
+    def __enter__(self):
+        if self._lock is None:
+            return self
+
+        thread_id = _thread.get_ident()
+        if self._owner != thread_id:
+            self._lock.acquire()
+            self._owner = thread_id
+        self._count += 1
+        return self
+
+    def __exit__(self, *args):
+        if self._lock is None:
+            return
+
+        self._count -= 1
+        if self._count == 0:
+            self._owner = None
+            self._lock.release()
+
+
+def create_reentrant_lock():
+    """
+    returns a lock the holding thread can acquire again, e.g. an endpoint callback sending from within the bpa update
+    """
+    if RUNNING_MICROPYTHON:
+        return _ReentrantLock()
+    return threading.RLock()
@@ -60,8 +60,8 @@ class ControllableRf95LoRaCLA(RF95LoRaCLA):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.sending_enabled = True
-    def enable_sending(self): self.sending_enabled = True
-    def disable_sending(self): self.sending_enabled = False
+    def enable_sending(self): self.sending_enabled = True; self.resume_transmitting()
+    def disable_sending(self): self.sending_enabled = False; self.pause_transmitting()
     def send_to(self, node, bundle_bytes):
         if not self.sending_enabled: return False
         return super().send_to(node, bundle_bytes)
@@ -32,9 +32,12 @@ class ControllableRf95LoRaCLA(RF95LoRaCLA):
     
     def enable_sending(self): 
         self.sending_enabled = True
+        self.resume_transmitting()
         
     def disable_sending(self): 
         self.sending_enabled = False
+        # frames queued before the rx window must not go out during it
+        self.pause_transmitting()
         
     def send_to(self, node, bundle_bytes):
         if not self.sending_enabled: 
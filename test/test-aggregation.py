@@ -0,0 +1,87 @@
+"""
+To be run on CPython or MicroPython.
+
+Tests the multi-bundle aggregation of the broadcast CLAs: small bundles are packed into length-prefixed containers
+up to the MTU and unpacked again, single and oversized bundles go out plain, the collection delay flushes pending
+bundles, and sensor-sized bundles take less LoRa airtime in aggregates than one frame each.
+"""
+import time
+
+from dtn7zero.convergence_layer_adapters.aggregation import Aggregator, pack, unpack, AGGREGATE_MARKER
+from dtn7zero.convergence_layer_adapters.rf95_fragmentation import MAX_FRAGMENT_PAYLOAD_LENGTH, RH_HEADER_LENGTH
+from dtn7zero.convergence_layer_adapters.rf95_scheduling import time_on_air_millis
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, HopCountBlock, PayloadBlock
+
+
+SF11_BW125_CR45 = {'spreading_factor': 11, 'signal_bandwidth': 125E3, 'coding_rate': 5, 'preamble_length': 8, 'implicit_header': False, 'enable_CRC': True}
+
+
+def create_serialized_bundle(payload_size, sequence_number=0):
+    return Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri='ipn://2.1',
+            full_source_uri='ipn://1.1',
+            sequence_number=sequence_number,
+            lifetime=3600000
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(0),
+        hop_count_block=HopCountBlock.from_objects(32, 0),
+        payload_block=PayloadBlock.from_objects(data=bytes(i % 251 for i in range(payload_size)))
+    ).to_cbor()
+
+
+# a plain bundle is recognized by its first byte
+serialized_bundle = create_serialized_bundle(20)
+assert serialized_bundle[0] != AGGREGATE_MARKER
+assert unpack(serialized_bundle) == [serialized_bundle]
+
+bundles = [create_serialized_bundle(20, i) for i in range(3)]
+assert unpack(pack(bundles)) == bundles
+
+try:
+    unpack(pack(bundles)[:-1])
+except ValueError:
+    pass
+else:
+    assert False, 'truncated aggregate not rejected'
+
+# sensor bundles are packed up to the mtu, in order
+aggregator = Aggregator(MAX_FRAGMENT_PAYLOAD_LENGTH, 1000)
+sensor_bundles = [create_serialized_bundle(20, i) for i in range(12)]
+messages = []
+for sensor_bundle in sensor_bundles:
+    messages.extend(aggregator.add(sensor_bundle))
+messages.extend(aggregator.flush())
+
+assert 1 < len(messages) < len(sensor_bundles) // 2, len(messages)
+assert all(len(message) <= MAX_FRAGMENT_PAYLOAD_LENGTH for message in messages)
+assert [x for message in messages for x in unpack(message)] == sensor_bundles
+assert all(Bundle.from_cbor(x).primary_block.sequence_number == i for i, x in enumerate(unpack(messages[0])))
+assert aggregator.pending_bundles == 0 and aggregator.next_flush_millis() is None
+
+# a single pending bundle is sent plain, an oversized one bypasses the container (after the pending ones)
+assert aggregator.add(sensor_bundles[0]) == []
+assert aggregator.flush() == [sensor_bundles[0]]
+
+large_bundle = create_serialized_bundle(300)
+assert aggregator.add(sensor_bundles[1]) == []
+assert aggregator.add(large_bundle) == [sensor_bundles[1], large_bundle]
+
+# pending bundles are flushed once the delay of the first one is over
+aggregator = Aggregator(MAX_FRAGMENT_PAYLOAD_LENGTH, 50)
+aggregator.add(sensor_bundles[0])
+aggregator.add(sensor_bundles[1])
+assert aggregator.flush_due() == []
+assert aggregator.next_flush_millis() is not None
+time.sleep(0.1)
+assert unpack(aggregator.flush_due()[0]) == sensor_bundles[:2]
+
+# airtime of the sensor bundles at SF11, one frame each vs aggregated
+separate_airtime = sum(time_on_air_millis(RH_HEADER_LENGTH + len(x), SF11_BW125_CR45) for x in sensor_bundles)
+aggregated_airtime = sum(time_on_air_millis(RH_HEADER_LENGTH + len(x), SF11_BW125_CR45) for x in messages)
+assert aggregated_airtime < separate_airtime * 0.9, (aggregated_airtime, separate_airtime)
+print('{} bundles of {} bytes: {:.0f} ms airtime in {} frames, {:.0f} ms in {} aggregates'.format(
+    len(sensor_bundles), len(sensor_bundles[0]), separate_airtime, len(sensor_bundles), aggregated_airtime, len(messages)))
+
+print('ok')
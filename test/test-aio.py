@@ -0,0 +1,105 @@
+"""
+To be run on CPython.
+
+Tests the asyncio api: local delivery through awaited and iterated endpoints, many concurrent incoming mtcp
+connections and the reused outgoing mtcp connection of the AsyncMTcpCLA.
+"""
+import asyncio
+
+try:
+    from cbor2 import dumps
+except ImportError:
+    from cbor import dumps
+
+from dtn7zero import aio
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters.async_mtcp import read_frame
+from dtn7zero.data import Node
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, PayloadBlock
+
+
+CONCURRENT_PEERS = 200
+
+
+def create_serialized_bundle(sequence_number):
+    return Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri='dtn://node1/inbox',
+            full_source_uri='dtn://remote/sender',
+            sequence_number=sequence_number
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(0),
+        payload_block=PayloadBlock.from_objects(data=str(sequence_number).encode())
+    ).to_cbor()
+
+
+async def send_over_mtcp(serialized_bundle):
+    reader, writer = await asyncio.open_connection('127.0.0.1', CONFIGURATION.PORT.MTCP)
+    writer.write(dumps(serialized_bundle))
+    await writer.drain()
+    writer.close()
+
+
+async def main():
+    CONFIGURATION.IPND.ENABLED = False
+
+    await aio.setup('dtn://node1/')
+    echo = aio.register('echo')
+    inbox = aio.register('inbox')
+
+    # local delivery, awaited
+    echo.send(b'hello', 'dtn://node1/echo')
+    payload, full_source_uri, full_destination_uri, _ = await asyncio.wait_for(echo.receive(), 2)
+    assert (payload, full_source_uri, full_destination_uri) == (b'hello', 'dtn://node1/echo', 'dtn://node1/echo')
+
+    # many concurrent incoming mtcp peers, iterated
+    await asyncio.gather(*[send_over_mtcp(create_serialized_bundle(i)) for i in range(CONCURRENT_PEERS)])
+
+    received = set()
+
+    async def collect():
+        async for payload, full_source_uri, _, _ in inbox:
+            received.add(int(payload))
+            if len(received) == CONCURRENT_PEERS:
+                break
+
+    await asyncio.wait_for(collect(), 5)
+    assert received == set(range(CONCURRENT_PEERS))
+
+    # outgoing: the first attempt opens the connection, the following ones reuse it
+    frames = []
+
+    async def serve(reader, writer):
+        try:
+            while True:
+                frames.append(await read_frame(reader))
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    server = await asyncio.start_server(serve, '127.0.0.1', CONFIGURATION.PORT.MTCP + 1)
+    node = Node('127.0.0.1', (1, '//peer/'), {CONFIGURATION.IPND.IDENTIFIER_MTCP: CONFIGURATION.PORT.MTCP + 1}, 0)
+
+    assert not aio.MTCP_CLA.send_to(node, b'first')
+    await asyncio.sleep(0.1)
+    assert aio.MTCP_CLA.send_to(node, b'second')
+    assert aio.MTCP_CLA.send_to(node, b'third')
+    await asyncio.sleep(0.1)
+    assert frames == [b'second', b'third'], frames
+
+    # an unreachable peer loses its mtcp announcement, like with the MTcpCLA
+    unreachable = Node('127.0.0.1', (1, '//gone/'), {CONFIGURATION.IPND.IDENTIFIER_MTCP: CONFIGURATION.PORT.MTCP + 2}, 0)
+    assert not aio.MTCP_CLA.send_to(unreachable, b'lost')
+    await asyncio.sleep(0.1)
+    assert CONFIGURATION.IPND.IDENTIFIER_MTCP not in unreachable.clas
+
+    await aio.shutdown()
+    await asyncio.sleep(0.1)  # the test server sees the closed connection
+
+    server.close()
+    await server.wait_closed()
+
+    print('ok')
+
+
+asyncio.run(main())
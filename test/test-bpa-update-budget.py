@@ -0,0 +1,143 @@
+"""
+To be run on CPython or MicroPython.
+
+Tests the work budget of BundleProtocolAgent.update(): local and remote bundles are processed round-robin
+until the budget is used up, and update() reports whether work is left over. A long retry pass over stored bundles
+without any contact is no work left over, it is resumed at a deadline.
+"""
+import time
+
+from dtn7zero.bundle_protocol_agent import BundleProtocolAgent
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.data import BundleInformation, BundleStatusReportReasonCodes
+from dtn7zero.utility import get_current_clock_millis
+from dtn7zero.endpoints import LocalEndpoint
+from dtn7zero.routers import Router
+from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, PayloadBlock
+
+
+class QueueRouter(Router):
+    """
+    delivers queued remote bundles, never forwards anything
+    """
+
+    def __init__(self):
+        self.remote_bundles = []
+
+    def generator_poll_bundles(self):
+        while self.remote_bundles:
+            yield self.remote_bundles.pop(0)
+
+    def immediate_forwarding_attempt(self, full_node_uri, bundle_information):
+        return False, 0
+
+    def send_to_previous_node(self, full_node_uri, bundle_information):
+        return False
+
+    def forward_to_node(self, full_node_uri, bundle_information, node):
+        return False
+
+
+def create_remote_bundle_information(sequence_number):
+    bundle = Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri='dtn://node/receiver',
+            full_source_uri='dtn://remote/sender',
+            sequence_number=sequence_number
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(0),
+        payload_block=PayloadBlock.from_objects(data=b'remote')
+    )
+    return BundleInformation(bundle)
+
+
+received = []
+
+router = QueueRouter()
+bpa = BundleProtocolAgent('dtn://node/', SimpleInMemoryStorage(), router)
+
+sender_endpoint = LocalEndpoint('sender')
+receiver_endpoint = LocalEndpoint('receiver', receive_callback=lambda bundle: received.append(bundle.payload_block.data))
+bpa.register_endpoint(sender_endpoint)
+bpa.register_endpoint(receiver_endpoint)
+
+CONFIGURATION.BPA_UPDATE_MAX_BUNDLES = 8
+CONFIGURATION.BPA_UPDATE_MAX_MICROSECONDS = 0
+
+for i in range(5):
+    sender_endpoint.start_transmission(b'local', 'dtn://node/receiver')
+for i in range(20):
+    router.remote_bundles.append(create_remote_bundle_information(i))
+
+# the budget is shared fairly between the local dispatch queue and the router poll stage
+assert bpa.update()
+assert received.count(b'local') == 4 and received.count(b'remote') == 4, received
+
+updates = 2
+while bpa.update():
+    updates += 1
+assert len(received) == 25 and updates == 4, (len(received), updates)  # 8 + 8 + 8 + 1
+assert not bpa.update()
+
+# the time limit ends an update before the bundle limit is reached
+CONFIGURATION.BPA_UPDATE_MAX_BUNDLES = 10000
+CONFIGURATION.BPA_UPDATE_MAX_MICROSECONDS = 1
+
+for i in range(20, 40):
+    router.remote_bundles.append(create_remote_bundle_information(i))
+
+assert bpa.update()
+assert len(received) < 45
+
+while bpa.update():
+    pass
+assert len(received) == 45
+
+# throughput with one update per former 10ms sleep interval
+CONFIGURATION.BPA_UPDATE_MAX_BUNDLES = 256
+CONFIGURATION.BPA_UPDATE_MAX_MICROSECONDS = 20000
+
+for i in range(40, 1040):
+    router.remote_bundles.append(create_remote_bundle_information(i))
+
+start = time.time_ns()
+updates = 1
+while bpa.update():
+    updates += 1
+duration_ms = (time.time_ns() - start) / 1000000
+
+assert len(received) == 1045
+print('1000 remote bundles in {} updates, {:.1f} ms, {:.0f} bundles/s'.format(updates, duration_ms, 1000 / duration_ms * 1000))
+
+bpa.unregister_endpoint(sender_endpoint)
+bpa.unregister_endpoint(receiver_endpoint)
+
+
+class NoContactRouter(QueueRouter):
+    """
+    never finds a node to forward to, bundles stay stored
+    """
+
+    def immediate_forwarding_attempt(self, full_node_uri, bundle_information):
+        return False, BundleStatusReportReasonCodes.NO_TIMELY_CONTACT_WITH_NEXT_NODE_ON_ROUTE
+
+
+CONFIGURATION.BPA_UPDATE_MAX_BUNDLES = 8
+CONFIGURATION.BPA_UPDATE_MAX_MICROSECONDS = 0
+
+storage = SimpleInMemoryStorage()
+bpa = BundleProtocolAgent('dtn://node/', storage, NoContactRouter())
+for i in range(20):
+    storage.delay_bundle(create_remote_bundle_information(i))
+
+# the retry pass is spread over three updates, none of them asks to be called again right away
+assert not bpa.update()
+assert bpa.get_next_deadline_millis() <= get_current_clock_millis() + CONFIGURATION.BPA_RETRY_RESUME_MILLISECONDS
+assert not bpa.update()
+assert not bpa.update()
+assert bpa.retry_resume_at_ms is None and bpa.storage_retry_generator is None
+assert len(storage.bundles) == 20
+
+print('ok')
@@ -0,0 +1,62 @@
+"""
+To be run on CPython or MicroPython.
+
+Tests that stored bundles are purged in expiry order, based on the bundle age block (clockless nodes)
+or on the creation timestamp (CPython only), and that bundles without a known expiry are kept.
+"""
+import time
+
+from dtn7zero.configuration import RUNNING_MICROPYTHON
+from dtn7zero.data import BundleInformation
+from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
+from py_dtn7.bundle import Bundle, PrimaryBlock, BundleAgeBlock, PayloadBlock
+from py_dtn7.utils import to_dtn_timestamp
+
+
+def create_bundle_information(sequence_number, lifetime, bundle_creation_time=0, age_milliseconds=None):
+    primary_block = PrimaryBlock.from_objects(
+        full_destination_uri='dtn://receiver/inbox',
+        full_source_uri='dtn://sender/outbox',
+        bundle_creation_time=bundle_creation_time,
+        sequence_number=sequence_number,
+        lifetime=lifetime
+    )
+    bundle = Bundle(
+        primary_block=primary_block,
+        bundle_age_block=BundleAgeBlock.from_objects(age_milliseconds) if age_milliseconds is not None else None,
+        payload_block=PayloadBlock.from_objects(data=b'payload')
+    )
+    bundle_information = BundleInformation(bundle)
+    bundle_information.retention_constraint = BundleInformation.RETENTION_CONSTRAINT_FORWARD_PENDING
+    return bundle_information
+
+
+storage = SimpleInMemoryStorage()
+
+creation_time = to_dtn_timestamp()
+
+storage.delay_bundle(create_bundle_information(0, lifetime=3600 * 1000, bundle_creation_time=creation_time))  # no expiry known on micropython
+storage.delay_bundle(create_bundle_information(1, lifetime=1000, age_milliseconds=900))  # 100ms left
+storage.delay_bundle(create_bundle_information(2, lifetime=1000, age_milliseconds=500))  # 500ms left
+storage.delay_bundle(create_bundle_information(3, lifetime=3600 * 1000, age_milliseconds=0))
+
+if not RUNNING_MICROPYTHON:
+    storage.delay_bundle(create_bundle_information(4, lifetime=300, bundle_creation_time=creation_time))  # 300ms left
+
+assert storage.pop_expired_bundles(10) == []
+
+time.sleep(0.6)
+
+expired = [x.bundle_id for x in storage.pop_expired_bundles(1)]
+assert expired == ['dtn://sender/outbox-0-1'], expired
+
+expired = [x.bundle_id for x in storage.pop_expired_bundles(10)]
+if RUNNING_MICROPYTHON:
+    assert expired == ['dtn://sender/outbox-0-2'], expired
+else:
+    assert expired == ['dtn://sender/outbox-{}-4'.format(creation_time), 'dtn://sender/outbox-0-2'], expired
+
+assert sorted(storage.bundles) == ['dtn://sender/outbox-0-3', 'dtn://sender/outbox-{}-0'.format(creation_time)]
+assert len(list(storage.get_bundles_to_retry())) == 2
+
+print('ok')
@@ -6,6 +6,7 @@ Tests RAM usage of (de)-serialization of different payload bundles.
 import gc
 print("free: {}, used: {}".format(gc.mem_free(), gc.mem_alloc()))  # this should always be over 100000
 from py_dtn7 import Bundle
+from dtn7zero.data import BundleInformation, SerializedBundleInformation
 print("free: {}, used: {}".format(gc.mem_free(), gc.mem_alloc()))
 gc.collect()
 print("free: {}, used: {}".format(gc.mem_free(), gc.mem_alloc()))
@@ -46,3 +47,14 @@ print("\nbundle_bytes length (actual size of again serialized bundle): {}".forma
 
 print("\nthis show (garbage collected) that compared to the actual size that factors are: serialized bundle -> {}, deserialized bundle -> {}\n".format(serialized_bundle_size/actual_bundle_size, deserialized_bundle_size/actual_bundle_size))
 
+
+gc.collect()
+before = gc.mem_free()
+bundle_information = SerializedBundleInformation.from_bundle_information(BundleInformation(bundle))
+del bundle
+gc.collect()
+after_collect = gc.mem_free()
+
+# the decoded bundle is freed here, so a negative size means the stored information is smaller than the decoded bundle
+stored_bundle_information_size = before-after_collect+deserialized_bundle_size
+print("serialized bundle information (as stored with SIMPLE_IN_MEMORY_STORAGE_SERIALIZED_BUNDLES): object size with collect: {}, factor: {}\n".format(stored_bundle_information_size, stored_bundle_information_size/actual_bundle_size))
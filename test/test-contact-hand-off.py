@@ -0,0 +1,82 @@
+"""
+To be run on CPython or MicroPython.
+
+Tests the per-node and per-destination indexes of the in-memory storage: a new or re-appeared contact is offered
+exactly the stored bundles it has not received yet, bundles destined for the contact itself first.
+"""
+from dtn7zero.data import BundleInformation, Node
+from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
+from py_dtn7.bundle import Bundle, PrimaryBlock, BundleAgeBlock, PayloadBlock
+
+
+def create_bundle_information(sequence_number, full_destination_uri):
+    bundle = Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri=full_destination_uri,
+            full_source_uri='dtn://sender/outbox',
+            sequence_number=sequence_number
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(0),
+        payload_block=PayloadBlock.from_objects(data=b'payload')
+    )
+    bundle_information = BundleInformation(bundle)
+    bundle_information.retention_constraint = BundleInformation.RETENTION_CONSTRAINT_FORWARD_PENDING
+    return bundle_information
+
+
+def hand_off(storage):
+    return [(node.address, int(bundle_information.bundle_id.rsplit('-', 1)[1])) for node, bundle_information in storage.get_bundles_to_hand_off()]
+
+
+storage = SimpleInMemoryStorage()
+
+for i in range(6):
+    storage.delay_bundle(create_bundle_information(i, 'dtn://node-b/inbox' if i in (3, 5) else 'dtn://elsewhere/inbox'))
+
+assert sorted(x.bundle_id for x in storage.get_bundles_for_destination('dtn://node-b/')) == ['dtn://sender/outbox-0-3', 'dtn://sender/outbox-0-5']
+
+node_a = Node('192.168.2.10', (1, '//node-a/'), {}, 0)
+node_b = Node('192.168.2.11', (1, '//node-b/'), {}, 0)
+
+storage.add_node(node_a)
+assert sorted(hand_off(storage)) == [('192.168.2.10', i) for i in range(6)]
+assert hand_off(storage) == []  # the contact was consumed
+
+storage.mark_forwarded(storage.bundles['dtn://sender/outbox-0-0'], node_a)
+storage.mark_forwarded(storage.bundles['dtn://sender/outbox-0-1'], node_a)
+storage.remove_bundle('dtn://sender/outbox-0-2')
+
+storage.add_contact(node_a)
+assert sorted(hand_off(storage)) == [('192.168.2.10', i) for i in (3, 4, 5)]
+
+# bundles destined for the contact come first
+storage.add_node(node_b)
+handed_off = hand_off(storage)
+assert sorted(handed_off[:2]) == [('192.168.2.11', 3), ('192.168.2.11', 5)]
+assert sorted(handed_off[2:]) == [('192.168.2.11', i) for i in (0, 1, 4)]
+
+# newly stored bundles are pending for every known node, except the one they came from
+bundle_information = create_bundle_information(6, 'dtn://node-b/inbox')
+storage.mark_forwarded(bundle_information, node_a)
+storage.delay_bundle(bundle_information)
+
+storage.add_contact(node_a)
+assert sorted(hand_off(storage)) == [('192.168.2.10', i) for i in (3, 4, 5)]
+
+storage.add_contact(node_b)
+assert sorted(hand_off(storage)) == [('192.168.2.11', i) for i in (0, 1, 3, 4, 5, 6)]
+
+# the same for an ipn node, indexed by its node number
+storage = SimpleInMemoryStorage()
+for i in range(4):
+    storage.delay_bundle(create_bundle_information(i, 'ipn://12.3' if i in (1, 3) else 'ipn://13.1'))
+
+node_c = Node('192.168.2.12', (2, (12, 0)), {}, 0)
+assert node_c.full_node_uri == 'ipn://12'
+
+storage.add_node(node_c)
+handed_off = hand_off(storage)
+assert sorted(handed_off[:2]) == [('192.168.2.12', 1), ('192.168.2.12', 3)]
+assert sorted(handed_off[2:]) == [('192.168.2.12', i) for i in (0, 2)]
+
+print('ok')
@@ -0,0 +1,98 @@
+"""
+To be run on CPython or MicroPython.
+
+Tests which bundle the different storage eviction policies give up once the in-memory storage is full.
+"""
+try:
+    from cbor2 import dumps
+except ImportError:
+    from cbor import dumps
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.data import BundleInformation, Node
+from dtn7zero.storage.eviction_policies import OldestReceivedEvictionPolicy, ByteBudgetLruEvictionPolicy, \
+    ShortestRemainingLifetimeEvictionPolicy, MostForwardedEvictionPolicy, PriorityClassEvictionPolicy
+from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
+from py_dtn7.bundle import Bundle, PrimaryBlock, BundleAgeBlock, PayloadBlock, CanonicalBlock, BlockProcessingControlFlags
+
+
+def create_bundle_information(sequence_number, payload_size=10, lifetime=3600 * 1000, priority=None):
+    other_blocks = []
+    if priority is not None:
+        other_blocks.append(CanonicalBlock(CONFIGURATION.PRIORITY_BLOCK_TYPE_CODE, 0, BlockProcessingControlFlags(0), 0, dumps(priority)))
+
+    bundle = Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri='dtn://receiver/inbox',
+            full_source_uri='dtn://sender/outbox',
+            sequence_number=sequence_number,
+            lifetime=lifetime
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(0),
+        payload_block=PayloadBlock.from_objects(data=b'x' * payload_size),
+        other_blocks=other_blocks
+    )
+    bundle_information = BundleInformation(bundle)
+    bundle_information.retention_constraint = BundleInformation.RETENTION_CONSTRAINT_FORWARD_PENDING
+    bundle_information.received_at_ms = sequence_number
+    return bundle_information
+
+
+def evicted_sequence_numbers(storage, bundle_information):
+    success, removed_bundles = storage.delay_bundle(bundle_information)
+    assert success
+    return [int(x.bundle_id.rsplit('-', 1)[1]) for x in removed_bundles]
+
+
+# oldest received (default)
+storage = SimpleInMemoryStorage(OldestReceivedEvictionPolicy(3))
+for i in range(3):
+    storage.delay_bundle(create_bundle_information(i))
+assert evicted_sequence_numbers(storage, create_bundle_information(3)) == [0]
+
+# byte budget lru: a big bundle pushes out several small ones, forwarded bundles count as recently used
+node = Node('192.168.2.10', (1, '//node/'), {}, 0)
+other_node = Node('192.168.2.11', (1, '//other/'), {}, 0)
+
+storage = SimpleInMemoryStorage(ByteBudgetLruEvictionPolicy(100, 400))
+storage.add_node(node)
+for i in range(4):
+    storage.delay_bundle(create_bundle_information(i, payload_size=50))
+
+for bundle_information in storage.get_bundles_to_retry():
+    if bundle_information.bundle_id.endswith('-0'):
+        storage.mark_forwarded(bundle_information, node)
+
+assert evicted_sequence_numbers(storage, create_bundle_information(4, payload_size=250)) == [1, 2, 3]
+assert storage.eviction_policy.stored_bytes <= 400
+assert storage.delay_bundle(create_bundle_information(5, payload_size=500)) == (False, [])
+
+# shortest remaining lifetime
+storage = SimpleInMemoryStorage(ShortestRemainingLifetimeEvictionPolicy(3))
+for i, lifetime in enumerate((50000, 10000, 30000)):
+    storage.delay_bundle(create_bundle_information(i, lifetime=lifetime))
+assert evicted_sequence_numbers(storage, create_bundle_information(3)) == [1]
+
+# most forwarded
+storage = SimpleInMemoryStorage(MostForwardedEvictionPolicy(3))
+storage.add_node(node)
+storage.add_node(other_node)
+for i in range(3):
+    storage.delay_bundle(create_bundle_information(i))
+
+for bundle_information in storage.get_bundles_to_retry():
+    if bundle_information.bundle_id.endswith('-1'):
+        storage.mark_forwarded(bundle_information, node)
+        storage.mark_forwarded(bundle_information, other_node)
+
+assert evicted_sequence_numbers(storage, create_bundle_information(3)) == [1]
+
+# priority class from the extension block
+storage = SimpleInMemoryStorage(PriorityClassEvictionPolicy(3))
+storage.delay_bundle(create_bundle_information(0, priority=5))
+storage.delay_bundle(create_bundle_information(1, priority=0))
+storage.delay_bundle(create_bundle_information(2))
+assert evicted_sequence_numbers(storage, create_bundle_information(3, priority=5)) == [1]
+assert evicted_sequence_numbers(storage, create_bundle_information(4, priority=5)) == [2]
+
+print('ok')
@@ -0,0 +1,104 @@
+"""
+To be run on CPython or MicroPython.
+
+Tests that the splicing forwarding encoder produces the same bundle as the full decode/encode round trip,
+that extension blocks discarded on reception are not forwarded, that deleted bundles leave the cache, and benchmarks both per forwarding attempt for growing payload sizes.
+"""
+import time
+
+from dtn7zero.bundle_protocol_agent import BundleProtocolAgent
+from dtn7zero.configuration import RUNNING_MICROPYTHON
+from dtn7zero.data import BundleInformation, SerializedBundleInformation, BundleStatusReportReasonCodes
+from dtn7zero.routers.simple_epidemic_router import SimpleEpidemicRouter
+from dtn7zero.serialization import index_blocks, skip_item, remove_extension_blocks
+from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, HopCountBlock, PayloadBlock, PreviousNodeBlock, CanonicalBlock, \
+    BlockProcessingControlFlags
+
+
+def create_bundle(payload_size, with_previous_node_block):
+    bundle = Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri='dtn://receiver/inbox',
+            full_source_uri='dtn://sender/outbox',
+            sequence_number=payload_size
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(1234),
+        hop_count_block=HopCountBlock.from_objects(hop_limit=32, hop_count=3),
+        payload_block=PayloadBlock.from_objects(data=b'x' * payload_size),
+        other_blocks=[CanonicalBlock(193, 0, BlockProcessingControlFlags(0), 0, b'\x05')]
+    )
+    if with_previous_node_block:
+        bundle.insert_canonical_block(PreviousNodeBlock.from_objects('dtn://somewhere/', BlockProcessingControlFlags(0)))
+    return bundle
+
+
+router = SimpleEpidemicRouter({}, SimpleInMemoryStorage())
+
+# the head-only reader finds the same items as the decoder
+raw_bundle = create_bundle(100, True).to_cbor()
+primary_block_end, blocks = index_blocks(raw_bundle)
+assert skip_item(raw_bundle, 0) == len(raw_bundle)
+assert [x[0] for x in blocks] == [6, 7, 10, 1, 193], blocks
+
+# equivalence with the round trip (block numbers are renumbered by the decoder in both cases)
+for with_previous_node_block in (False, True):
+    for bundle_information in (BundleInformation(create_bundle(100, with_previous_node_block)),
+                               SerializedBundleInformation(create_bundle(100, with_previous_node_block).to_cbor())):
+        spliced = Bundle.from_cbor(router.prepare_and_serialize_bundle('dtn://forwarder/', bundle_information))
+        round_trip = Bundle.from_cbor(router._prepare_and_serialize_decoded_bundle('dtn://forwarder/', bundle_information))
+
+        assert abs(spliced.bundle_age_block.age_milliseconds - round_trip.bundle_age_block.age_milliseconds) < 100
+        spliced.bundle_age_block.age_milliseconds = round_trip.bundle_age_block.age_milliseconds
+
+        assert spliced == round_trip, (spliced, round_trip)
+        assert PrimaryBlock.to_full_uri(*spliced.previous_node_block.previous_node_id) == 'dtn://forwarder/'
+        assert spliced.hop_count_block.hop_count == 4
+
+# the original block numbers are kept, a new previous node block gets the next free number
+_, blocks = index_blocks(router.prepare_and_serialize_bundle('dtn://forwarder/', BundleInformation(create_bundle(10, False))))
+assert sorted(x[1] for x in blocks) == [1, 2, 3, 4, 5], blocks
+
+# unprocessable extension blocks flagged "discard block" are removed from the stored bytes on reception
+bundle = create_bundle(10, True)
+bundle.insert_canonical_block(CanonicalBlock(194, 0, BlockProcessingControlFlags(0x10), 0, b'\x06'))
+bundle.insert_canonical_block(CanonicalBlock(195, 0, BlockProcessingControlFlags(0), 0, b'\x07'))
+raw_bundle = bundle.to_cbor()
+assert [x[0] for x in index_blocks(remove_extension_blocks(raw_bundle, [0, 2]))[1]] == [6, 7, 10, 1, 194]
+
+for bundle_information in (BundleInformation(Bundle.from_cbor(raw_bundle)), SerializedBundleInformation(raw_bundle)):
+    storage = SimpleInMemoryStorage()
+    forwarding_router = SimpleEpidemicRouter({}, storage)
+    bpa = BundleProtocolAgent('dtn://forwarder/', storage, forwarding_router)
+    bpa.bundle_reception(bundle_information)
+
+    forwarded = Bundle.from_cbor(forwarding_router.prepare_and_serialize_bundle('dtn://forwarder/', bundle_information))
+    assert [x.block_type_code for x in forwarded.other_blocks] == [193, 195], forwarded.other_blocks
+
+    # a deleted bundle is not kept alive by the cache of the forwarding encoder
+    assert bundle_information.bundle_id in forwarding_router._forwarding_encoder._cache
+    bpa.bundle_deletion(bundle_information, BundleStatusReportReasonCodes.LIFETIME_EXPIRED)
+    assert bundle_information.bundle_id not in forwarding_router._forwarding_encoder._cache
+
+print('forwarded bundles are equivalent')
+
+
+# benchmark: per forwarding attempt of a stored (serialized) bundle
+payload_sizes = (100, 10000, 100000) if RUNNING_MICROPYTHON else (100, 10000, 1000000)
+iterations = 20
+
+for payload_size in payload_sizes:
+    bundle_information = SerializedBundleInformation(create_bundle(payload_size, True).to_cbor())
+
+    start = time.time_ns()
+    for _ in range(iterations):
+        router._prepare_and_serialize_decoded_bundle('dtn://forwarder/', bundle_information)
+    round_trip_us = (time.time_ns() - start) / iterations / 1000
+
+    start = time.time_ns()
+    for _ in range(iterations):
+        router.prepare_and_serialize_bundle('dtn://forwarder/', bundle_information)
+    spliced_us = (time.time_ns() - start) / iterations / 1000
+
+    print('payload: {:>8} bytes, round trip: {:>10.1f} us, spliced: {:>8.1f} us, speedup: {:.1f}x'.format(payload_size, round_trip_us, spliced_us, round_trip_us / spliced_us))
@@ -0,0 +1,145 @@
+"""
+To be run on CPython or MicroPython.
+
+Tests the link-local header compression of the broadcast CLAs: sensor bundles as created by
+LocalEndpoint.start_transmission and as forwarded by the ForwardingEncoder expand to their original bytes, the EID
+dictionary is learned per neighbor, lost definitions and late joiners never yield a wrong bundle and recover with
+the next refresh, and bundles the compressed form cannot express are sent plain.
+"""
+from dtn7zero.convergence_layer_adapters.aggregation import Aggregator, unpack
+from dtn7zero.convergence_layer_adapters.header_compression import HeaderCompressor, HeaderDecompressor, HEADER_COMPRESSION_MARKER
+from dtn7zero.convergence_layer_adapters.rf95_fragmentation import RH_HEADER_LENGTH, MAX_FRAGMENT_PAYLOAD_LENGTH
+from dtn7zero.convergence_layer_adapters.rf95_scheduling import time_on_air_millis
+from dtn7zero.data import BundleInformation
+from dtn7zero.serialization import ForwardingEncoder
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, HopCountBlock, PayloadBlock, CanonicalBlock, \
+    BundleProcessingControlFlags, BlockProcessingControlFlags
+
+
+SF11_BW125_CR45 = {'spreading_factor': 11, 'signal_bandwidth': 125E3, 'coding_rate': 5, 'preamble_length': 8, 'implicit_header': False, 'enable_CRC': True}
+SENSOR_PAYLOAD = b'\xa3\x61t\xfb\x40\x36\x80\x00\x00\x00\x00\x00\x61h\x18\x2a\x61p\x19\x03\xf2'  # {'t': 22.5, 'h': 42, 'p': 1010}
+
+REFRESH_INTERVAL = 8
+
+
+def create_serialized_bundle(sequence_number, creation_time=0, source='ipn://1.1', report_to='ipn://1.0', other_blocks=()):
+    # like LocalEndpoint.start_transmission (micropython: no clock, a bundle age block)
+    flags = BundleProcessingControlFlags(0)
+    flags.set_flag(2)
+    return Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri='ipn://2.1',
+            full_source_uri=source,
+            full_report_to_uri=report_to,
+            bundle_processing_control_flags=flags,
+            bundle_creation_time=creation_time,
+            sequence_number=sequence_number,
+            lifetime=3600 * 24 * 1000
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(sequence_number * 7) if creation_time == 0 else None,
+        hop_count_block=HopCountBlock.from_objects(32, 0),
+        payload_block=PayloadBlock.from_objects(data=SENSOR_PAYLOAD),
+        other_blocks=list(other_blocks)
+    ).to_cbor()
+
+
+# a stream of sensor bundles expands to the original bytes
+compressor = HeaderCompressor(16, REFRESH_INTERVAL)
+decompressor = HeaderDecompressor(8)
+
+serialized_bundles = [create_serialized_bundle(i) for i in range(40)]
+compressed_bundles = [compressor.compress(x) for x in serialized_bundles]
+
+assert all(x[0] == HEADER_COMPRESSION_MARKER for x in compressed_bundles)
+assert [decompressor.expand(x, 0x17) for x in compressed_bundles] == serialized_bundles
+assert Bundle.from_cbor(decompressor.expand(compressor.compress(serialized_bundles[5]), 0x17)) == Bundle.from_cbor(serialized_bundles[5])
+
+original_length = len(serialized_bundles[1])
+compressed_length = len(compressed_bundles[1])
+assert compressed_length < original_length * 0.6, (compressed_length, original_length)
+assert max(len(x) for x in compressed_bundles) < original_length * 0.8  # definitions included
+
+original_airtime = time_on_air_millis(RH_HEADER_LENGTH + original_length, SF11_BW125_CR45)
+compressed_airtime = time_on_air_millis(RH_HEADER_LENGTH + compressed_length, SF11_BW125_CR45)
+print('sensor bundle of {} bytes compressed to {} bytes, {:.0f} ms -> {:.0f} ms airtime at SF11'.format(
+    original_length, compressed_length, original_airtime, compressed_airtime))
+
+# with a creation time the sequence numbers restart on every new time
+compressor = HeaderCompressor(16, REFRESH_INTERVAL)
+serialized_bundles = [create_serialized_bundle(i % 3, 758000000000 + i // 3 * 1500) for i in range(30)]
+compressed_bundles = [compressor.compress(x) for x in serialized_bundles]
+assert [decompressor.expand(x, 0x18) for x in compressed_bundles] == serialized_bundles
+assert len(compressed_bundles[4]) < len(serialized_bundles[4]) * 0.6
+
+# forwarded bundles (previous node block, incremented hop count, bundle age) expand to the forwarded bytes
+encoder = ForwardingEncoder(0)
+forwarded_bundles = [encoder.encode('ipn://3.0', BundleInformation(Bundle.from_cbor(create_serialized_bundle(i)))) for i in range(20)]
+compressor = HeaderCompressor(16, REFRESH_INTERVAL)
+compressed_bundles = [compressor.compress(x) for x in forwarded_bundles]
+assert compressor.plain_count == 0
+assert [decompressor.expand(x, 0x19) for x in compressed_bundles] == [bytes(x) for x in forwarded_bundles]
+
+# the dictionary is kept per neighbor: two senders use the same indices for different eids
+compressor_a = HeaderCompressor(16, REFRESH_INTERVAL)
+compressor_b = HeaderCompressor(16, REFRESH_INTERVAL)
+decompressor = HeaderDecompressor(8)
+for i in range(10):
+    bundle_a = create_serialized_bundle(i, source='ipn://1.1', report_to='ipn://1.0')
+    bundle_b = create_serialized_bundle(i, source='ipn://5.3', report_to='ipn://5.0')
+    assert decompressor.expand(compressor_a.compress(bundle_a), 'a') == bundle_a
+    assert decompressor.expand(compressor_b.compress(bundle_b), 'b') == bundle_b
+
+# a lost definition and a late joiner never expand a wrong bundle and recover with the next refresh
+compressor = HeaderCompressor(16, REFRESH_INTERVAL)
+serialized_bundles = [create_serialized_bundle(i, source='ipn://1.{}'.format(i // 10)) for i in range(40)]
+compressed_bundles = [compressor.compress(x) for x in serialized_bundles]
+
+lossy_receiver = HeaderDecompressor(8)
+late_receiver = HeaderDecompressor(8)
+for i, compressed_bundle in enumerate(compressed_bundles):
+    if i in (0, 10):
+        continue  # the definitions of the first two sources are lost
+    expanded = lossy_receiver.expand(compressed_bundle, 1)
+    assert expanded is None or expanded == serialized_bundles[i], i
+    if i >= 10 + REFRESH_INTERVAL + 1:
+        assert expanded == serialized_bundles[i], i
+
+    if i >= 25:
+        expanded = late_receiver.expand(compressed_bundle, 1)
+        assert expanded is None or expanded == serialized_bundles[i], i
+        if i >= 30 + REFRESH_INTERVAL + 1:
+            assert expanded == serialized_bundles[i], i
+
+assert lossy_receiver.failed_count > 0 and late_receiver.failed_count > 0
+
+# the least recently used eid makes room in a full dictionary
+compressor = HeaderCompressor(4, REFRESH_INTERVAL)
+decompressor = HeaderDecompressor(8)
+for i in range(12):
+    serialized_bundle = create_serialized_bundle(i, source='ipn://{}.1'.format(i % 3 + 1), report_to='ipn://9.0')
+    assert decompressor.expand(compressor.compress(serialized_bundle), 1) == serialized_bundle
+assert decompressor.failed_count == 0
+
+# bundles with other extension blocks are sent plain, plain messages pass the receiver unchanged
+priority_block = CanonicalBlock(193, 0, BlockProcessingControlFlags(0), 0, b'\x02')
+serialized_bundle = create_serialized_bundle(1, other_blocks=[priority_block])
+assert compressor.compress(serialized_bundle) == serialized_bundle
+assert compressor.plain_count == 1
+assert decompressor.expand(serialized_bundle, 1) == serialized_bundle
+
+# compressed bundles are aggregated like plain ones, about twice as many fit one frame
+compressor = HeaderCompressor(16, REFRESH_INTERVAL)
+decompressor = HeaderDecompressor(8)
+aggregator = Aggregator(MAX_FRAGMENT_PAYLOAD_LENGTH, 1000)
+serialized_bundles = [create_serialized_bundle(i) for i in range(12)]
+
+messages = []
+for serialized_bundle in serialized_bundles:
+    messages.extend(aggregator.add(compressor.compress(serialized_bundle)))
+messages.extend(aggregator.flush())
+
+assert len(messages) == 2, len(messages)
+assert [decompressor.expand(x, 1) for message in messages for x in unpack(message)] == serialized_bundles
+
+print('ok')
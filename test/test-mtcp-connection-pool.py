@@ -0,0 +1,76 @@
+"""
+To be run on CPython.
+
+Tests the pooled outgoing connections of the MTcpCLA (sending to itself over localhost): many bundles are
+pipelined over one connection, a connection closed by the receiver is replaced, idle connections time out
+and the pool stays bounded.
+"""
+import socket
+import time
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters.mtcp import MTcpCLA
+from dtn7zero.data import Node
+
+
+BUNDLES = 2000
+
+
+def receive(cla, expected):
+    received = []
+    start = time.time()
+    while len(received) < expected and time.time() - start < 5:
+        serialized_bundle, _ = cla.poll_serialized()
+        if serialized_bundle is None:
+            time.sleep(0.001)
+        else:
+            received.append(serialized_bundle)
+    return received
+
+
+cla = MTcpCLA()
+node = Node('127.0.0.1', (1, '//self/'), {CONFIGURATION.IPND.IDENTIFIER_MTCP: CONFIGURATION.PORT.MTCP}, 0)
+
+# pipelined over a single connection
+start = time.time()
+for i in range(BUNDLES):
+    assert cla.send_to(node, str(i).encode() * 100)
+    if i % 100 == 99:
+        assert len(receive(cla, 100)) == 100
+seconds = time.time() - start
+
+assert len(cla.open_send_connections) == 1
+assert len(cla.open_receive_connections) == 1
+print('{} bundles over one connection in {:.3f} s ({:.0f} bundles/s)'.format(BUNDLES, seconds, BUNDLES / seconds))
+
+# the receiver closes the connection, the next send reconnects
+for address_tuple, (connection, _) in tuple(cla.open_receive_connections.items()):
+    cla._remove_receive_connection(address_tuple, connection)
+time.sleep(0.05)
+
+assert cla.send_to(node, b'after reconnect')
+assert receive(cla, 1) == [b'after reconnect']
+assert CONFIGURATION.IPND.IDENTIFIER_MTCP in node.clas
+
+# the pool is bounded, the least recently used connection is closed
+other_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+other_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+other_server.bind(('127.0.0.1', CONFIGURATION.PORT.MTCP + 1))
+other_server.listen(1)
+other_node = Node('127.0.0.1', (1, '//other/'), {CONFIGURATION.IPND.IDENTIFIER_MTCP: CONFIGURATION.PORT.MTCP + 1}, 0)
+
+CONFIGURATION.MTCP.MAX_CONNECTIONS_STATE_OPEN_SEND = 1
+assert cla.send_to(other_node, b'other')
+assert list(cla.open_send_connections) == [('127.0.0.1', CONFIGURATION.PORT.MTCP + 1)]
+
+# idle connections are closed after their timeout
+CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_INACTIVE_SEND = 50
+assert cla.get_next_deadline_millis() is not None
+time.sleep(0.1)
+cla.poll_serialized()
+assert not cla.open_send_connections
+
+cla.close()
+other_server.close()
+
+print('ok')
@@ -0,0 +1,122 @@
+"""
+To be run on CPython.
+
+Tests the incremental mtcp frame parser: frames of every length encoding, several frames per read, frames
+trickling in byte by byte without blocking, invalid headers, oversized length announcements and connections
+closed mid-frame.
+"""
+import socket
+import time
+
+try:
+    from cbor2 import dumps
+except ImportError:
+    from cbor import dumps
+
+from dtn7zero.convergence_layer_adapters.mtcp import _FrameReceiver, RemoteClosedConnectionException, ReceivedInvalidDataOnSocketException
+
+
+def create_connection():
+    receiving, sending = socket.socketpair()
+    receiving.setblocking(False)
+    return receiving, sending
+
+
+def poll_all(receiver, connection):
+    frames = []
+    while True:
+        frame = receiver.poll(connection)
+        if frame is None:
+            return frames
+        frames.append(frame)
+
+
+frames = [b'', b'tiny', bytes(range(200)), bytes(5000), bytes(300000)]  # all cbor length encodings up to uint32
+
+# several frames per read
+receiving, sending = create_connection()
+receiver = _FrameReceiver()
+sending.sendall(b''.join(dumps(frame) for frame in frames[:4]))
+time.sleep(0.05)
+assert poll_all(receiver, receiving) == frames[:4]
+
+# a large frame is completed over several polls
+sending.setblocking(False)
+message = dumps(frames[4])
+received = []
+while message or not received:
+    try:
+        message = message[sending.send(message):]
+    except OSError:
+        pass
+    received += poll_all(receiver, receiving)
+assert received == frames[4:]
+sending.setblocking(True)
+
+# byte by byte, the parser never blocks on a partial frame
+message = dumps(b'slowly received bundle')
+for i in range(len(message)):
+    assert receiver.poll(receiving) is None
+    sending.send(message[i:i + 1])
+    time.sleep(0.001)
+assert receiver.poll(receiving) == b'slowly received bundle'
+assert receiver.poll(receiving) is None
+
+# closed mid-frame
+sending.send(dumps(b'incomplete')[:5])
+sending.close()
+try:
+    poll_all(receiver, receiving)
+except RemoteClosedConnectionException:
+    pass
+else:
+    assert False, 'closed connection not detected'
+receiving.close()
+
+# only definite length byte-strings are accepted
+receiving, sending = create_connection()
+sending.send(dumps('text'))
+time.sleep(0.01)
+try:
+    _FrameReceiver().poll(receiving)
+except ReceivedInvalidDataOnSocketException:
+    pass
+else:
+    assert False, 'invalid header not detected'
+receiving.close()
+sending.close()
+
+# a header announcing more than the maximum frame length is rejected before anything is allocated
+receiving, sending = create_connection()
+sending.send(b'\x5b' + (2 ** 62).to_bytes(8, 'big'))
+time.sleep(0.01)
+try:
+    _FrameReceiver().poll(receiving)
+except ReceivedInvalidDataOnSocketException:
+    pass
+else:
+    assert False, 'oversized frame header not detected'
+receiving.close()
+sending.close()
+
+# throughput of one large frame
+receiving, sending = create_connection()
+receiver = _FrameReceiver()
+sending.setblocking(False)
+message = dumps(bytes(16 * 1024 * 1024))
+start = time.time()
+frame = None
+while frame is None:
+    if message:
+        try:
+            message = message[sending.send(message):]
+        except OSError:
+            pass
+    frame = receiver.poll(receiving)
+seconds = time.time() - start
+assert len(frame) == 16 * 1024 * 1024
+print('16 MiB frame received in {:.3f} s ({:.0f} MiB/s)'.format(seconds, 16 / seconds))
+receiving.close()
+sending.close()
+
+print('ok')
@@ -0,0 +1,85 @@
+"""
+To be run on CPython.
+
+Tests the MTcpCLA with many idle incoming connections: a poll only touches the readable connections,
+bundles from any connection are received, and inactive connections are closed by their timeout.
+"""
+import socket
+import time
+
+try:
+    from cbor2 import dumps
+except ImportError:
+    from cbor import dumps
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters.mtcp import MTcpCLA
+
+
+CONNECTIONS = 2000
+POLLS = 1000
+
+CONFIGURATION.MTCP.MAX_CONNECTIONS_STATE_WAITING = 128
+CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_INACTIVE_RECEIVE = 3000
+
+cla = MTcpCLA()
+clients = []
+
+for i in range(CONNECTIONS):
+    client = socket.create_connection(('127.0.0.1', CONFIGURATION.PORT.MTCP))
+    clients.append(client)
+    if i % 100 == 99:
+        cla.poll_serialized()  # accept the waiting connections
+
+start = time.time()
+while len(cla.open_receive_connections) < CONNECTIONS and time.time() - start < 5:
+    cla.poll_serialized()
+assert len(cla.open_receive_connections) == CONNECTIONS
+
+# idle connections cost nothing per poll
+start = time.time()
+for _ in range(POLLS):
+    assert cla.poll_serialized() == (None, None)
+idle_poll_us = (time.time() - start) / POLLS * 1000000
+print('{} idle connections, {:.1f} us per poll'.format(CONNECTIONS, idle_poll_us))
+
+# bundles from a few of the connections
+for i in (0, 777, CONNECTIONS - 1):
+    clients[i].sendall(dumps(str(i).encode()) + dumps(b'second'))
+time.sleep(0.05)
+
+received = []
+while True:
+    serialized_bundle, _ = cla.poll_serialized()
+    if serialized_bundle is None:
+        break
+    received.append(serialized_bundle)
+assert sorted(received) == sorted([b'0', b'777', str(CONNECTIONS - 1).encode()] + [b'second'] * 3), received
+
+# inactive connections time out, the next deadline tells the main loop when
+assert cla.get_next_deadline_millis() is not None
+time.sleep(2.5)
+clients[0].sendall(dumps(b'keeps the connection open'))
+time.sleep(0.05)
+assert cla.poll_serialized()[0] == b'keeps the connection open'
+
+time.sleep(1)
+cla.poll_serialized()
+assert len(cla.open_receive_connections) == 1
+assert len(cla.gracefully_shutdown_connections) == CONNECTIONS - 1
+
+clients[1].settimeout(1)
+assert clients[1].recv(1) == b''  # the client sees the shutdown
+
+for client in clients:
+    client.close()
+time.sleep(0.05)
+
+start = time.time()
+while cla.gracefully_shutdown_connections and time.time() - start < 5:
+    cla.poll_serialized()
+assert not cla.gracefully_shutdown_connections
+
+cla.close()
+
+print('ok')
@@ -0,0 +1,156 @@
+"""
+To be run on CPython.
+
+Tests the non-blocking send queues of the MTcpCLA: a large bundle to a slow peer does not block the caller,
+it is written in parts while the cla is polled, and the outcome is reported back. A failed delivery makes the
+router offer the bundle to the node again, also through the ThreadedCLA wrapper.
+"""
+import socket
+import time
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters.mtcp import MTcpCLA, _FrameReceiver
+from dtn7zero.convergence_layer_adapters.threaded_cla import ThreadedCLA
+from dtn7zero.data import Node, BundleInformation
+from dtn7zero.routers.simple_epidemic_router import SimpleEpidemicRouter
+from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, PayloadBlock
+
+
+PEER_PORT = CONFIGURATION.PORT.MTCP + 1
+
+
+def create_bundle(payload_size):
+    return Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri='dtn://peer/inbox',
+            full_source_uri='dtn://node1/sender',
+            lifetime=3600000
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(0),
+        payload_block=PayloadBlock.from_objects(data=bytes(payload_size))
+    )
+
+
+def poll_until_reported(cla, timeout_seconds):
+    start = time.time()
+    while time.time() - start < timeout_seconds:
+        cla.poll_serialized()
+
+        reports = cla.poll_delivery_reports()
+        if reports:
+            return reports
+        time.sleep(0.001)
+    return []
+
+
+peer_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+peer_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+peer_server.bind(('127.0.0.1', PEER_PORT))
+peer_server.listen(1)
+
+cla = MTcpCLA()
+node = Node('127.0.0.1', (1, '//peer/'), {CONFIGURATION.IPND.IDENTIFIER_MTCP: PEER_PORT}, 0)
+
+# a large bundle to a peer that does not read yet does not block the caller
+serialized_bundle = create_bundle(8 * 1024 * 1024).to_cbor()
+
+start = time.time()
+assert cla.send_to(node, serialized_bundle)
+queued_after = time.time() - start
+assert queued_after < 0.1, queued_after
+assert cla.get_next_deadline_millis() is not None  # the rest is written on the next polls
+
+connection, _ = peer_server.accept()
+connection.setblocking(False)
+frame_receiver = _FrameReceiver()
+
+# the peer reads slowly, the cla is polled in between
+received = None
+slowest_poll = 0
+start = time.time()
+while received is None and time.time() - start < 10:
+    received = frame_receiver.poll(connection)
+    poll_start = time.time()
+    cla.poll_serialized()
+    slowest_poll = max(slowest_poll, time.time() - poll_start)
+
+assert bytes(received) == serialized_bundle  # spilled to a memory-mapped file
+reports = poll_until_reported(cla, 1)
+assert reports == [(node, serialized_bundle, True)]
+print('8 MiB bundle queued in {:.1f} ms, slowest poll while sending {:.1f} ms'.format(queued_after * 1000, slowest_poll * 1000))
+
+connection.close()
+
+# a stalled peer (never reads): the delivery fails, the router offers the bundle to the node again
+CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_STALLED_SEND = 200
+
+stalled_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+stalled_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+stalled_server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+stalled_server.bind(('127.0.0.1', PEER_PORT + 1))
+stalled_server.listen(1)
+node = Node('127.0.0.1', (1, '//stalled/'), {CONFIGURATION.IPND.IDENTIFIER_MTCP: PEER_PORT + 1}, 0)
+
+storage = SimpleInMemoryStorage()
+storage.add_node(node)
+router = SimpleEpidemicRouter({CONFIGURATION.IPND.IDENTIFIER_MTCP: cla}, storage)
+
+bundle_information = BundleInformation(create_bundle(8 * 1024 * 1024))
+storage.delay_bundle(bundle_information)
+
+assert router.forward_to_node('dtn://node1/', bundle_information, node)
+assert bundle_information.is_forwarded_to(node)
+
+# the bpa polls the router (and so the cla) and lets it process the delivery reports
+start = time.time()
+while bundle_information.is_forwarded_to(node) and time.time() - start < 2:
+    cla.poll_serialized()
+    router.process_delivery_reports()
+    time.sleep(0.001)
+
+assert not bundle_information.is_forwarded_to(node)
+assert CONFIGURATION.IPND.IDENTIFIER_MTCP not in node.clas
+print('stalled peer reported after {:.0f} ms'.format((time.time() - start) * 1000))
+
+# a failed bundle already released from the storage is stored again
+node.clas[CONFIGURATION.IPND.IDENTIFIER_MTCP] = PEER_PORT + 1
+
+assert router.forward_to_node('dtn://node1/', bundle_information, node)
+storage.remove_bundle(bundle_information.bundle_id)
+
+start = time.time()
+while bundle_information.bundle_id not in storage.bundles and time.time() - start < 2:
+    cla.poll_serialized()
+    router.process_delivery_reports()
+    time.sleep(0.001)
+
+# stored as it was before forwarding (no previous node block of this hop), not to be garbage collected first
+stored_bundle_information = storage.bundles[bundle_information.bundle_id]
+assert not stored_bundle_information.is_forwarded_to(node)
+assert stored_bundle_information.serialized_bundle == bundle_information.serialized_bundle
+assert stored_bundle_information.retention_constraint == BundleInformation.RETENTION_CONSTRAINT_DISPATCH_PENDING
+assert not router._queued_deliveries
+
+cla.close()
+
+# wrapped in a ThreadedCLA the outcome of the mtcp send is reported, not that the bundle was queued
+cla = ThreadedCLA(MTcpCLA())
+unreachable = Node('127.0.0.1', (1, '//unreachable/'), {CONFIGURATION.IPND.IDENTIFIER_MTCP: PEER_PORT + 2}, 0)
+assert cla.send_to(unreachable, serialized_bundle)
+
+start = time.time()
+reports = []
+while not reports and time.time() - start < 2:
+    reports = cla.poll_delivery_reports()
+    time.sleep(0.01)
+assert reports == [(unreachable, serialized_bundle, False)], reports
+assert cla.cla.poll_delivery_reports() == []
+
+cla.close()
+cla.cla.close()
+peer_server.close()
+stalled_server.close()
+
+print('ok')
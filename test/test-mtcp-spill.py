@@ -0,0 +1,116 @@
+"""
+To be run on CPython.
+
+Tests the spilling of large incoming mtcp frames to a memory-mapped temporary file: the frame is received without
+being held in RAM, only the header of the bundle is decoded, the bpa reception checks skip the payload and the
+full bundle is still available on access and for forwarding.
+"""
+import socket
+import time
+import tracemalloc
+
+try:
+    from cbor2 import dumps
+except ImportError:
+    from cbor import dumps
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters.mtcp import MTcpCLA, is_spilled
+from dtn7zero.data import SerializedBundleInformation
+from dtn7zero.serialization import ForwardingEncoder, read_header, decode_without_payload
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, HopCountBlock, PayloadBlock
+
+
+PAYLOAD_SIZE = 32 * 1024 * 1024
+
+CONFIGURATION.MTCP.SPILL_THRESHOLD_BYTES = 64 * 1024
+
+
+def create_bundle(payload):
+    return Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri='dtn://node1/inbox',
+            full_source_uri='dtn://peer/sender',
+            lifetime=3600000
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(1234),
+        hop_count_block=HopCountBlock.from_objects(32, 2),
+        payload_block=PayloadBlock.from_objects(data=payload)
+    )
+
+
+def receive(cla, client, message):
+    message = memoryview(message)
+    client.setblocking(False)
+    start = time.time()
+    while time.time() - start < 10:
+        if message:
+            try:
+                message = message[client.send(message):]
+            except OSError:
+                pass
+
+        bundle, _ = cla.poll()
+        if bundle is not None:
+            return bundle
+    return None
+
+
+cla = MTcpCLA()
+client = socket.create_connection(('127.0.0.1', CONFIGURATION.PORT.MTCP))
+
+# a small bundle is received into RAM and decoded as before
+small_bundle = create_bundle(b'small')
+assert receive(cla, client, dumps(small_bundle.to_cbor())).bundle_id == small_bundle.bundle_id
+
+# a large bundle is received into the spill file, the payload is never copied into RAM
+payload = bytes(range(256)) * (PAYLOAD_SIZE // 256)
+serialized_bundle = create_bundle(payload).to_cbor()
+message = dumps(serialized_bundle)
+
+tracemalloc.start()
+start = time.time()
+bundle_information = receive(cla, client, message)
+seconds = time.time() - start
+_, peak_bytes = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+del message
+assert isinstance(bundle_information, SerializedBundleInformation)
+assert is_spilled(bundle_information.serialized_bundle)
+assert peak_bytes < PAYLOAD_SIZE // 16, peak_bytes
+print('{} MiB bundle spilled in {:.3f} s, {:.0f} KiB peak traced RAM'.format(PAYLOAD_SIZE // 1024 // 1024, seconds, peak_bytes / 1024))
+
+# the header matches a full decode
+reference = Bundle.from_cbor(serialized_bundle)
+assert read_header(serialized_bundle) == SerializedBundleInformation.get_header(reference)
+assert bundle_information.bundle_id == reference.bundle_id
+assert bundle_information.bundle_age_milliseconds == 1234
+
+# the reception checks see every block except the payload
+tracemalloc.start()
+without_payload = decode_without_payload(bundle_information.serialized_bundle)
+_, peak_bytes = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+assert peak_bytes < PAYLOAD_SIZE // 16, peak_bytes
+assert without_payload.payload_block.data == b''
+assert without_payload.hop_count_block.hop_count == 2
+assert without_payload.primary_block.full_destination_uri == 'dtn://node1/inbox'
+
+# the payload is loaded on request, and the bundle is forwarded unchanged apart from the per-hop blocks
+assert bundle_information.bundle.payload_block.data == payload
+
+forwarded = Bundle.from_cbor(ForwardingEncoder(0).encode('dtn://node1/', bundle_information))
+assert forwarded.payload_block.data == payload
+assert forwarded.hop_count_block.hop_count == 3
+
+# disabled spilling
+CONFIGURATION.MTCP.SPILL_THRESHOLD_BYTES = None
+assert isinstance(receive(cla, client, dumps(create_bundle(bytes(1024 * 1024)).to_cbor())), Bundle)
+
+client.close()
+cla.close()
+
+print('ok')
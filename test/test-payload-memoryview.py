@@ -0,0 +1,115 @@
+"""
+To be run on CPython.
+
+Tests the opt-in memoryview payloads: a bundle received over mtcp is kept as its receive buffer, the endpoint gets
+the payload as a read-only slice of it without a copy, a payload view can be sent on and forwarding splices the
+payload with a single copy.
+"""
+import socket
+import time
+import tracemalloc
+
+try:
+    from cbor2 import dumps
+except ImportError:
+    from cbor import dumps
+
+from dtn7zero.bundle_protocol_agent import BundleProtocolAgent
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters.mtcp import MTcpCLA
+from dtn7zero.data import SerializedBundleInformation
+from dtn7zero.endpoints import LocalEndpoint
+from dtn7zero.routers.simple_epidemic_router import SimpleEpidemicRouter
+from dtn7zero.serialization import ForwardingEncoder, decode_with_payload_view
+from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, HopCountBlock, PayloadBlock
+
+
+PAYLOAD_SIZE = 16 * 1024 * 1024
+
+CONFIGURATION.PAYLOAD_MEMORYVIEWS = True
+CONFIGURATION.MTCP.SPILL_THRESHOLD_BYTES = 1024 * 1024
+
+
+def create_serialized_bundle(payload, sequence_number=0):
+    return Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri='dtn://node/receiver',
+            full_source_uri='dtn://remote/sender',
+            sequence_number=sequence_number,
+            lifetime=3600000
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(0),
+        hop_count_block=HopCountBlock.from_objects(32, 0),
+        payload_block=PayloadBlock.from_objects(data=payload)
+    ).to_cbor()
+
+
+# the payload view is a slice of the serialized bundle
+serialized_bundle = create_serialized_bundle(b'small payload')
+bundle = decode_with_payload_view(serialized_bundle)
+assert isinstance(bundle.payload_block.data, memoryview)
+assert bundle.payload_block.data.readonly
+assert bundle.payload_block.data.obj is serialized_bundle
+assert bundle.payload_block.data == b'small payload'
+assert bundle.hop_count_block.hop_limit == 32
+
+# a bundle received over mtcp is delivered with a view into its receive buffer
+received = []
+
+cla = MTcpCLA()
+router = SimpleEpidemicRouter({CONFIGURATION.IPND.IDENTIFIER_MTCP: cla}, SimpleInMemoryStorage())
+bpa = BundleProtocolAgent('dtn://node/', router.storage, router)
+
+receiver_endpoint = LocalEndpoint('receiver', receive_callback=lambda x: received.append(x.payload_block.data))
+bpa.register_endpoint(receiver_endpoint)
+
+payload = bytes(range(256)) * (PAYLOAD_SIZE // 256)
+message = memoryview(dumps(create_serialized_bundle(payload, 1)))
+
+client = socket.create_connection(('127.0.0.1', CONFIGURATION.PORT.MTCP))
+client.setblocking(False)
+
+tracemalloc.start()
+start = time.time()
+while not received and time.time() - start < 10:
+    if message:
+        try:
+            message = message[client.send(message):]
+        except OSError:
+            pass
+    bpa.update()
+_, peak_bytes = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+assert isinstance(received[0], memoryview)
+assert received[0] == payload
+assert peak_bytes < PAYLOAD_SIZE // 16, peak_bytes
+print('{} MiB payload delivered as memoryview, {:.0f} KiB peak traced RAM'.format(PAYLOAD_SIZE // 1024 // 1024, peak_bytes / 1024))
+
+# a received payload view can be sent on
+sender_endpoint = LocalEndpoint('sender')
+bpa.register_endpoint(sender_endpoint)
+sender_endpoint.start_transmission(received[0], 'dtn://node/receiver')
+bpa.update()
+assert len(received) == 2 and received[1] == payload
+
+client.close()
+cla.close()
+
+# forwarding copies the payload once, into the joined result
+serialized_bundle = create_serialized_bundle(payload, 2)
+bundle_information = SerializedBundleInformation(serialized_bundle)
+encoder = ForwardingEncoder(0)
+
+tracemalloc.start()
+forwarded = encoder.encode('dtn://node/', bundle_information)
+_, peak_bytes = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+assert peak_bytes < PAYLOAD_SIZE * 1.25, peak_bytes
+assert Bundle.from_cbor(forwarded).payload_block.data == payload
+print('forwarding peak {:.2f}x the payload size'.format(peak_bytes / PAYLOAD_SIZE))
+
+print('ok')
@@ -0,0 +1,108 @@
+"""
+To be run on CPython (or MicroPython with enough flash).
+
+Tests that the persistent log storage keeps delayed bundles, forwarding state and deletions across a restart,
+that a contact is handed exactly its pending bundles (destined ones first), and that compaction removes old segments
+without losing live bundles.
+"""
+import os
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.data import BundleInformation, Node
+from dtn7zero.storage.persistent_log_storage import PersistentLogStorage
+from py_dtn7.bundle import Bundle, PrimaryBlock, HopCountBlock, PayloadBlock
+
+
+DIRECTORY = 'test_persistent_log_storage'
+
+CONFIGURATION.PERSISTENT_LOG_STORAGE.SEGMENT_MAX_BYTES = 2048
+
+
+def clear_directory():
+    try:
+        for file_name in os.listdir(DIRECTORY):
+            os.remove('{}/{}'.format(DIRECTORY, file_name))
+        os.rmdir(DIRECTORY)
+    except OSError:
+        pass
+
+
+def create_bundle_information(sequence_number, full_destination_uri='dtn://receiver/inbox'):
+    primary_block = PrimaryBlock.from_objects(
+        full_destination_uri=full_destination_uri,
+        full_source_uri='dtn://sender/outbox',
+        bundle_creation_time=1000,
+        sequence_number=sequence_number
+    )
+    bundle = Bundle(
+        primary_block=primary_block,
+        hop_count_block=HopCountBlock.from_objects(hop_limit=32, hop_count=0),
+        payload_block=PayloadBlock.from_objects(data='payload {}'.format(sequence_number).encode() * 20)
+    )
+    bundle_information = BundleInformation(bundle)
+    bundle_information.retention_constraint = BundleInformation.RETENTION_CONSTRAINT_FORWARD_PENDING
+    return bundle_information
+
+
+clear_directory()
+
+node = Node('192.168.2.10', (1, '//receiver/'), {}, 0)
+
+storage = PersistentLogStorage(DIRECTORY)
+storage.add_node(node)
+
+for i in range(40):
+    assert storage.delay_bundle(create_bundle_information(i))[0]
+
+for bundle_information in storage.get_bundles_to_retry():
+    if bundle_information.bundle.primary_block.sequence_number % 2 == 0:
+        storage.mark_forwarded(bundle_information, node)
+
+for i in range(0, 40, 4):
+    assert storage.remove_bundle('dtn://sender/outbox-1000-{}'.format(i))
+
+storage.close()
+
+# restart
+storage = PersistentLogStorage(DIRECTORY)
+storage.add_node(node)
+
+assert len(storage.index) == 30
+assert storage.was_seen('dtn://sender/outbox-1000-1')
+assert not storage.was_seen('dtn://sender/outbox-1000-4')
+
+for bundle_information in storage.get_bundles_to_retry():
+    sequence_number = bundle_information.bundle.primary_block.sequence_number
+    assert bundle_information.bundle.payload_block.data == 'payload {}'.format(sequence_number).encode() * 20
+    assert bundle_information.is_forwarded_to(node) == (sequence_number % 2 == 0)
+
+# the pending bundles are indexed again after the restart, destined bundles are handed off first
+handed_off = [(x.address, y.bundle.primary_block.sequence_number) for x, y in storage.get_bundles_to_hand_off()]
+assert sorted(handed_off) == [(node.address, i) for i in range(1, 40, 2)], handed_off
+
+other_node = Node('192.168.2.11', (1, '//other/'), {}, 0)
+for i in (40, 41):
+    assert storage.delay_bundle(create_bundle_information(i, 'dtn://other/inbox'))[0]
+
+storage.add_node(other_node)
+handed_off = [y.bundle.primary_block.sequence_number for x, y in storage.get_bundles_to_hand_off()]
+assert sorted(handed_off[:2]) == [40, 41] and len(handed_off) == 32, handed_off
+storage.remove_bundle('dtn://sender/outbox-1000-40')
+storage.remove_bundle('dtn://sender/outbox-1000-41')
+
+segments_before = len(storage.segments)
+for _ in range(50):
+    storage.compact_step()
+
+print('segments before compaction: {}, after: {}'.format(segments_before, len(storage.segments)))
+assert len(storage.segments) < segments_before
+storage.close()
+
+storage = PersistentLogStorage(DIRECTORY)
+assert len(storage.index) == 30
+assert len(list(storage.get_bundles_to_retry())) == 30
+storage.close()
+
+clear_directory()
+
+print('ok')
@@ -0,0 +1,107 @@
+"""
+To be run on CPython.
+
+Tests the event-driven main loop: an idle bpa blocks instead of polling, and is woken up by an incoming mtcp bundle
+as well as by a transmission started from another thread.
+"""
+import socket
+import threading
+import time
+
+from dtn7zero.bundle_protocol_agent import BundleProtocolAgent
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters.mtcp import MTcpCLA, _send_message
+from dtn7zero.endpoints import LocalEndpoint
+from dtn7zero.reactor import ReadinessSelector, Reactor
+from dtn7zero.routers.simple_epidemic_router import SimpleEpidemicRouter
+from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
+from dtn7zero.utility import get_current_clock_millis
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, PayloadBlock
+
+try:
+    from cbor2 import dumps
+except ImportError:
+    from cbor import dumps
+
+
+# the selector only reports readable sockets
+receiver, sender = socket.socketpair()
+selector = ReadinessSelector()
+selector.set_sockets([receiver])
+assert not selector.wait(20)
+sender.send(b'x')
+assert selector.wait(20)
+receiver.close()
+selector.set_sockets([])  # a closed socket is unregistered without error
+selector.close()
+sender.close()
+
+CONFIGURATION.IPND.ENABLED = False
+
+received = []
+
+storage = SimpleInMemoryStorage()
+router = SimpleEpidemicRouter({CONFIGURATION.IPND.IDENTIFIER_MTCP: MTcpCLA()}, storage)
+bpa = BundleProtocolAgent('dtn://node/', storage, router)
+
+sender_endpoint = LocalEndpoint('sender')
+receiver_endpoint = LocalEndpoint('receiver', receive_callback=lambda bundle: received.append((bundle.payload_block.data, get_current_clock_millis())))
+bpa.register_endpoint(sender_endpoint)
+bpa.register_endpoint(receiver_endpoint)
+
+updates = [0]
+original_update = bpa.update
+
+
+def counting_update():
+    updates[0] += 1
+    return original_update()
+
+
+bpa.update = counting_update
+
+reactor = Reactor(bpa)
+
+# idle: one update per wait instead of one every 10ms
+start = get_current_clock_millis()
+while get_current_clock_millis() - start < 500:
+    reactor.run_once(start + 500)
+assert updates[0] <= 3, updates[0]
+
+# a transmission started from another thread wakes the reactor up
+threading.Timer(0.1, lambda: sender_endpoint.start_transmission(b'local', 'dtn://node/receiver')).start()
+sent_at = get_current_clock_millis() + 100
+
+start = get_current_clock_millis()
+while not received and get_current_clock_millis() - start < 2000:
+    reactor.run_once()
+assert received and received[0][0] == b'local' and received[0][1] - sent_at < 100, received
+local_latency = received[0][1] - sent_at
+
+# an incoming mtcp bundle wakes the reactor up
+bundle = Bundle(
+    primary_block=PrimaryBlock.from_objects(
+        full_destination_uri='dtn://node/receiver',
+        full_source_uri='dtn://remote/sender',
+        sequence_number=1
+    ),
+    bundle_age_block=BundleAgeBlock.from_objects(0),
+    payload_block=PayloadBlock.from_objects(data=b'remote')
+)
+threading.Timer(0.1, lambda: _send_message('127.0.0.1', CONFIGURATION.PORT.MTCP, dumps(bundle.to_cbor()))).start()
+sent_at = get_current_clock_millis() + 100
+
+start = get_current_clock_millis()
+while len(received) < 2 and get_current_clock_millis() - start < 2000:
+    reactor.run_once()
+assert len(received) == 2 and received[1][0] == b'remote' and received[1][1] - sent_at < 100, received
+
+print('woken up after {} ms (local) and {} ms (mtcp), {} updates in total'.format(local_latency, received[1][1] - sent_at, updates[0]))
+
+reactor.close()
+bpa.unregister_endpoint(sender_endpoint)
+bpa.unregister_endpoint(receiver_endpoint)
+
+time.sleep(0.1)
+print('ok')
@@ -0,0 +1,94 @@
+"""
+To be run on CPython or MicroPython.
+
+Tests the link-layer fragmentation of the RF95 LoRa CLA: multi-KB bundles are split into frames that fit the SX127x
+FIFO and reassembled in any order, interleaved with other senders, single frames keep the plain RH_RF95 header,
+and incomplete messages are dropped on timeout or on the memory cap.
+"""
+import time
+
+from dtn7zero.convergence_layer_adapters.rf95_fragmentation import fragment, Reassembler, MAX_FRAME_LENGTH, MAX_MESSAGE_LENGTH
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, PayloadBlock
+
+
+def create_serialized_bundle(payload_size):
+    return Bundle(
+        primary_block=PrimaryBlock.from_objects(
+            full_destination_uri='ipn://2.1',
+            full_source_uri='ipn://1.1',
+            lifetime=3600000
+        ),
+        bundle_age_block=BundleAgeBlock.from_objects(0),
+        payload_block=PayloadBlock.from_objects(data=bytes(i % 251 for i in range(payload_size)))
+    ).to_cbor()
+
+
+# a small bundle is one frame with the plain RH_RF95 broadcast header
+small_bundle = create_serialized_bundle(20)
+frames = fragment(small_bundle, 0x17, 5)
+assert frames == [b'\xff\x17\x00\x00' + small_bundle]
+
+reassembler = Reassembler(1000, 8 * 1024)
+assert reassembler.add(b'\xff\xff\x00\x00' + small_bundle) == (small_bundle, 0xff)  # as sent by older nodes
+
+# a multi-KB bundle is split into frames that fit the FIFO
+large_bundle = create_serialized_bundle(3000)
+frames = fragment(large_bundle, 0x17, 5)
+assert len(frames) == 13
+assert all(len(frame) <= MAX_FRAME_LENGTH for frame in frames)
+assert all(frame[2] == 5 and frame[3] >> 4 == 12 for frame in frames)
+
+# reassembled in any order, with duplicates and interleaved with another sender
+other_bundle = create_serialized_bundle(600)
+other_frames = fragment(other_bundle, 0x42, 5)
+
+received = []
+for frame in list(reversed(frames[1:])) + [frames[3]] + other_frames + [frames[0]]:
+    message, from_address = reassembler.add(frame)
+    if message is not None:
+        received.append((message, from_address))
+
+assert received == [(other_bundle, 0x42), (large_bundle, 0x17)]
+assert Bundle.from_cbor(received[1][0]).payload_block.data == Bundle.from_cbor(large_bundle).payload_block.data
+assert reassembler.stored_bytes == 0
+
+# too large for 16 fragments
+try:
+    fragment(bytes(MAX_MESSAGE_LENGTH + 1), 0x17, 6)
+except ValueError:
+    pass
+else:
+    assert False, 'oversized message not rejected'
+
+# an incomplete message is dropped after the timeout
+reassembler = Reassembler(50, 8 * 1024)
+for frame in frames[:-1]:
+    assert reassembler.add(frame) == (None, None)
+assert reassembler.stored_bytes > 0
+time.sleep(0.1)
+reassembler.expire()
+assert reassembler.stored_bytes == 0 and reassembler.dropped_messages == 1
+assert reassembler.add(frames[-1]) == (None, None)  # the rest of a dropped message starts over
+
+# the memory cap drops the oldest incomplete message first
+reassembler = Reassembler(1000, 2 * 1024)
+first_frames = fragment(create_serialized_bundle(1500), 0x01, 1)
+second_frames = fragment(create_serialized_bundle(1500), 0x02, 1)
+
+for frame in first_frames[:-1]:
+    reassembler.add(frame)
+for frame in second_frames[:-1]:
+    reassembler.add(frame)
+assert reassembler.stored_bytes <= 2 * 1024
+assert reassembler.dropped_messages == 1
+
+assert reassembler.add(first_frames[-1]) == (None, None)
+assert reassembler.add(second_frames[-1])[1] == 0x02
+
+# a message larger than the cap is never kept
+reassembler = Reassembler(1000, 1024)
+assert all(reassembler.add(frame) == (None, None) for frame in frames)
+assert reassembler.stored_bytes <= 1024
+
+print('ok')
@@ -0,0 +1,158 @@
+"""
+To be run on CPython.
+
+Tests the listen-before-talk of the RF95 LoRa CLA: the channel activity detection on the SX127x registers, the
+exponential randomized backoff with its retry limit and the transmit scheduler holding frames back.
+
+A simulated shared channel compares the goodput of ten nodes sending without (pure ALOHA) and with listen-before-talk.
+A transmission is detected by CAD once two of its symbols are on air and is received if it overlaps no other one.
+"""
+import math
+import random
+
+from dtn7zero.convergence_layer_adapters.rf95_channel_access import detect_channel_activity, ListenBeforeTalk, \
+    REG_OP_MODE, REG_IRQ_FLAGS, MODE_LONG_RANGE_MODE, MODE_CAD, IRQ_CAD_DONE_MASK, IRQ_CAD_DETECTED_MASK, IRQ_RX_DONE_MASK
+from dtn7zero.convergence_layer_adapters.rf95_scheduling import TransmitScheduler, time_on_air_millis, get_symbol_millis
+
+
+SF7_BW125_CR45 = {'spreading_factor': 7, 'signal_bandwidth': 125E3, 'coding_rate': 5, 'preamble_length': 8, 'implicit_header': False, 'enable_CRC': True}
+
+
+class SimulatedRadio:
+    """the CAD relevant registers of an SX127x, listening to a shared channel"""
+
+    def __init__(self, is_channel_busy):
+        self.is_channel_busy = is_channel_busy
+        self.irq_flags = 0
+        self.cad_finishes = True
+
+    def read_register(self, address):
+        assert address == REG_IRQ_FLAGS
+        return self.irq_flags
+
+    def write_register(self, address, value):
+        if address == REG_IRQ_FLAGS:
+            self.irq_flags &= ~value
+        elif address == REG_OP_MODE and value == MODE_LONG_RANGE_MODE | MODE_CAD and self.cad_finishes:
+            self.irq_flags |= IRQ_CAD_DONE_MASK | (IRQ_CAD_DETECTED_MASK if self.is_channel_busy() else 0)
+
+
+# CAD on a clear and a busy channel, a pending received frame is not touched
+radio = SimulatedRadio(lambda: False)
+radio.irq_flags = IRQ_RX_DONE_MASK
+assert not detect_channel_activity(radio, 100)
+assert radio.irq_flags == IRQ_RX_DONE_MASK
+
+radio.is_channel_busy = lambda: True
+assert detect_channel_activity(radio, 100)
+assert radio.irq_flags == IRQ_RX_DONE_MASK
+
+# a CAD that never finishes counts as busy
+radio.cad_finishes = False
+assert detect_channel_activity(radio, 10)
+
+# the backoff window doubles up to its maximum, then the frame is dropped
+random.seed(1)
+listen_before_talk = ListenBeforeTalk(100, 400, 8)
+for attempt, window in enumerate((100, 200, 400, 400)):
+    delays = []
+    for _ in range(200):
+        listen_before_talk._attempt = attempt
+        delays.append(listen_before_talk.channel_busy(1000) - 1000)
+    assert 1 <= min(delays) and max(delays) <= window, (window, min(delays), max(delays))
+    assert max(delays) > window // 2, (window, max(delays))
+
+listen_before_talk = ListenBeforeTalk(100, 400, 4)
+assert all(listen_before_talk.channel_busy(0) is not None for _ in range(4))
+assert listen_before_talk.channel_busy(0) is None
+assert listen_before_talk.busy_channel_count == 5 and listen_before_talk.backoff_count == 4 and listen_before_talk.dropped_frame_count == 1
+listen_before_talk.channel_busy(0)
+listen_before_talk.channel_clear()
+assert listen_before_talk.channel_busy(0) <= 100
+
+# a deferred frame is due after the backoff, a dropped message takes its remaining fragments along
+scheduler = TransmitScheduler(None, 3600000, None, 8)
+scheduler.queue([(b'a0', 10.0), (b'a1', 10.0)])
+scheduler.queue([(b'b0', 10.0)])
+scheduler.defer(500)
+assert not scheduler.is_due(0) and scheduler.pop_due(0) is None
+assert scheduler.next_release_millis(0) == 500
+assert scheduler.is_due(500)
+scheduler.drop_message()
+assert scheduler.pop_due(500) == b'b0' and scheduler.queued_frames == 0
+
+
+def simulate(use_listen_before_talk, node_count=10, offered_load=1.0, duration_milliseconds=600000):
+    """returns (goodput as share of the channel time, collided transmissions, backoffs, dropped frames)"""
+    rng = random.Random(3)
+    random.seed(3)
+
+    airtime = int(time_on_air_millis(100, SF7_BW125_CR45))
+    detection_delay = 2 * get_symbol_millis(SF7_BW125_CR45)
+    mean_interval = node_count * airtime / offered_load
+
+    transmissions = []  # (start, end, sender)
+    now = 0
+
+    def is_channel_busy():
+        return any(start + detection_delay <= now < end for start, end, _ in transmissions[-node_count:])
+
+    nodes = []
+    for _ in range(node_count):
+        arrivals, t = [], 0.0
+        while t < duration_milliseconds:
+            t += -math.log(1.0 - rng.random()) * mean_interval
+            arrivals.append(int(t))
+        nodes.append({
+            'arrivals': arrivals,
+            'next_attempt': 0,
+            'radio': SimulatedRadio(is_channel_busy),
+            'lbt': ListenBeforeTalk(airtime, 16 * airtime, 6)
+        })
+
+    while True:
+        candidates = [(max(node['arrivals'][0], node['next_attempt']), i) for i, node in enumerate(nodes) if node['arrivals']]
+        if not candidates:
+            break
+        now, i = min(candidates)
+        if now >= duration_milliseconds:
+            break
+        node = nodes[i]
+
+        if use_listen_before_talk:
+            if detect_channel_activity(node['radio'], 100):
+                next_attempt = node['lbt'].channel_busy(now)
+                if next_attempt is None:
+                    node['arrivals'].pop(0)
+                else:
+                    node['next_attempt'] = next_attempt
+                continue
+            node['lbt'].channel_clear()
+
+        node['arrivals'].pop(0)
+        transmissions.append((now, now + airtime, i))
+        node['next_attempt'] = now + airtime  # the radio blocks while sending
+
+    collided = set()
+    for a in range(len(transmissions)):
+        for b in range(a + 1, len(transmissions)):
+            if transmissions[b][0] >= transmissions[a][1]:
+                break
+            collided.add(a)
+            collided.add(b)
+
+    goodput = (len(transmissions) - len(collided)) * airtime / duration_milliseconds
+    return goodput, len(collided), sum(node['lbt'].backoff_count for node in nodes), sum(node['lbt'].dropped_frame_count for node in nodes)
+
+
+aloha_goodput, aloha_collided, _, _ = simulate(False)
+lbt_goodput, lbt_collided, backoffs, dropped = simulate(True)
+
+print('without listen-before-talk: goodput {:.1f}%, {} collided transmissions'.format(aloha_goodput * 100, aloha_collided))
+print('with listen-before-talk:    goodput {:.1f}%, {} collided transmissions, {} backoffs, {} frames dropped'.format(lbt_goodput * 100, lbt_collided, backoffs, dropped))
+
+assert backoffs > 0
+assert lbt_collided < aloha_collided / 4
+assert lbt_goodput > 2 * aloha_goodput
+
+print('ok')
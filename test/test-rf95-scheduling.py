@@ -0,0 +1,68 @@
+"""
+To be run on CPython or MicroPython.
+
+Tests the airtime-aware transmit scheduler of the RF95 LoRa CLA: the time-on-air matches the SX1276 datasheet
+formula, queued frames are released at the earliest time the duty cycle allows (never exceeding it in any window,
+while using nearly all of it) and frames over the dwell time are refused.
+"""
+from dtn7zero.convergence_layer_adapters.rf95_scheduling import time_on_air_millis, TransmitScheduler
+
+
+SF7_BW125_CR45 = {'spreading_factor': 7, 'signal_bandwidth': 125E3, 'coding_rate': 5, 'preamble_length': 8, 'implicit_header': False, 'enable_CRC': True}
+
+# known values: 13 bytes at SF7 -> 46.336 ms, 64 bytes at SF12 (low data rate optimization) -> 2793.472 ms
+assert abs(time_on_air_millis(13, SF7_BW125_CR45) - 46.336) < 0.001
+assert abs(time_on_air_millis(20, SF7_BW125_CR45) - 56.576) < 0.001
+assert abs(time_on_air_millis(64, dict(SF7_BW125_CR45, spreading_factor=12)) - 2793.472) < 0.001
+assert time_on_air_millis(100, dict(SF7_BW125_CR45, coding_rate=8)) > time_on_air_millis(100, SF7_BW125_CR45)
+
+# without limits every frame is due at once
+scheduler = TransmitScheduler(None, 3600000, None, 4)
+assert scheduler.queue([(b'a', 100.0), (b'b', 100.0)])
+assert scheduler.pop_due(0) == b'a' and scheduler.pop_due(0) == b'b' and scheduler.pop_due(0) is None
+assert scheduler.next_release_millis(0) is None
+
+# a full queue refuses the whole message
+assert scheduler.queue([(b'x', 1.0)] * 4)
+assert not scheduler.queue([(b'y', 1.0)])
+assert scheduler.queued_frames == 4
+
+# dwell time (AS923)
+scheduler = TransmitScheduler(None, 3600000, 400, 4)
+assert not scheduler.queue([(b'short', 100.0), (b'too long', 500.0)])
+assert scheduler.queued_frames == 0
+
+# 1% duty cycle (EU868), a continuously full queue over three hours
+WINDOW = 3600000
+BUDGET = 0.01 * WINDOW
+AIRTIME = time_on_air_millis(255, dict(SF7_BW125_CR45, spreading_factor=9))
+
+scheduler = TransmitScheduler(0.01, WINDOW, None, 16)
+assert not scheduler.queue([(b'over budget', BUDGET + 1)])
+
+transmissions = []
+now = 0
+while now < 3 * WINDOW:
+    while scheduler.queued_frames < 16:
+        scheduler.queue([(b'frame', AIRTIME)])
+
+    frame = scheduler.pop_due(now)
+    if frame is not None:
+        transmissions.append(now)
+        now += int(AIRTIME) + 1  # the radio is busy while sending
+        continue
+
+    release = scheduler.next_release_millis(now)
+    assert release > now
+    now = release  # an event-driven main loop sleeps until then
+
+# never more than the budget in any window
+for i, start in enumerate(transmissions):
+    in_window = [x for x in transmissions[i:] if x < start + WINDOW]
+    assert len(in_window) * AIRTIME <= BUDGET + 0.001, (start, len(in_window))
+
+used = len(transmissions) * AIRTIME / (3 * BUDGET)
+assert used > 0.9, used
+print('{:.0f} ms frames, {} sent in 3 h, {:.1f}% of the duty cycle budget used'.format(AIRTIME, len(transmissions), used * 100))
+
+print('ok')
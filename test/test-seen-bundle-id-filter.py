@@ -0,0 +1,50 @@
+"""
+To be run on CPython or MicroPython.
+
+Tests the bloom filter seen-set: all seen bundle ids are rejected as duplicates, the measured false positive rate
+stays near the configured one, and the exact previous node is only kept for retained (stored) bundles.
+"""
+from dtn7zero.storage.seen_bundle_ids import SeenBundleIdFilter
+
+
+capacity = 20000
+false_positive_rate = 0.01
+
+seen = SeenBundleIdFilter(capacity, false_positive_rate, 3600 * 1000, 16)
+
+print('filter size: {} bytes per generation, {} hash functions'.format((seen.num_bits + 7) // 8, seen.num_hashes))
+
+for i in range(capacity):
+    seen.add('dtn://sensor/temperature-{}-0'.format(i + 1), '192.168.2.{}'.format(i % 250))
+
+for i in range(capacity):
+    assert 'dtn://sensor/temperature-{}-0'.format(i + 1) in seen
+
+false_positives = sum(1 for i in range(capacity) if 'dtn://other/humidity-{}-0'.format(i) in seen)
+print('measured false positive rate: {:.4f}, configured: {}'.format(false_positives / capacity, false_positive_rate))
+assert false_positives / capacity < false_positive_rate * 2
+
+# only the most recent previous nodes are kept exactly, unless the bundle is retained
+assert seen.get('dtn://sensor/temperature-1-0') is None
+assert seen.get('dtn://sensor/temperature-{}-0'.format(capacity)) is not None
+
+seen.add('dtn://sensor/stored-1-0', '192.168.2.42')
+seen.retain('dtn://sensor/stored-1-0')
+
+for i in range(100):
+    seen.add('dtn://sensor/burst-{}-0'.format(i), '192.168.2.1')
+
+assert seen.get('dtn://sensor/stored-1-0') == '192.168.2.42'
+
+seen.release('dtn://sensor/stored-1-0')
+assert seen.get('dtn://sensor/stored-1-0') is None
+assert 'dtn://sensor/stored-1-0' in seen
+
+# retained bundle ids leave no stale entries behind in the age heap of the pending ids
+for i in range(10000):
+    seen.add('dtn://sensor/retained-{}-0'.format(i), '192.168.2.1')
+    seen.retain('dtn://sensor/retained-{}-0'.format(i))
+    seen.release('dtn://sensor/retained-{}-0'.format(i))
+assert len(seen.pending._age_heap) <= 2 * len(seen.pending) + 16, len(seen.pending._age_heap)
+
+print('ok')
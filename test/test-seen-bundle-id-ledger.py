@@ -0,0 +1,60 @@
+"""
+To be run on CPython.
+
+Tests the oldest-first eviction of the seen bundle id ledger and benchmarks the per-bundle cost of store_seen
+with a full ledger of 1k up to 1M known bundle ids. The cost per bundle has to stay (nearly) flat, a coarse bound
+allows the 1M ledger a small factor over the 1k one (cache misses, not a linear scan).
+"""
+import random
+import time
+
+from dtn7zero.storage.seen_bundle_ids import SeenBundleIdLedger
+from dtn7zero.utility import get_oldest_bundle_id
+
+
+def build_bundle_id(creation_time, sequence_number):
+    return 'dtn://node-{}/sensor-{}-{}'.format(sequence_number % 7, creation_time, sequence_number)
+
+
+# correctness: the ledger always evicts the same bundle id as the linear scan
+ledger = SeenBundleIdLedger(50)
+reference = {}
+
+for i in range(1000):
+    bundle_id = build_bundle_id(random.choice((0, random.randint(1, 100))), i)
+
+    if len(reference) >= 50:
+        del reference[get_oldest_bundle_id(reference)]
+    reference[bundle_id] = None
+
+    ledger.add(bundle_id, None)
+
+    assert set(reference) == set(ledger.bundle_ids)
+    assert ledger.oldest() == get_oldest_bundle_id(reference)
+
+print('eviction order matches the linear scan')
+
+
+# benchmark: per-bundle insert cost with a full ledger
+measured_inserts = 10000
+per_bundle_costs = {}
+
+for known_bundle_ids in (1000, 10000, 100000, 1000000):
+    ledger = SeenBundleIdLedger(known_bundle_ids)
+
+    for i in range(known_bundle_ids):
+        ledger.add(build_bundle_id(1000 + i, i), None)
+
+    start = time.perf_counter()
+    for i in range(known_bundle_ids, known_bundle_ids + measured_inserts):
+        ledger.add(build_bundle_id(1000 + i, i), '192.168.2.1')
+    duration = time.perf_counter() - start
+
+    assert len(ledger) == known_bundle_ids
+    per_bundle_costs[known_bundle_ids] = duration / measured_inserts
+
+    print('known bundle ids: {:>8}, per-bundle store_seen cost: {:.2f} us'.format(known_bundle_ids, duration / measured_inserts * 1000000))
+
+assert per_bundle_costs[1000000] < 5 * per_bundle_costs[1000]
+
+print('ok')
@@ -0,0 +1,120 @@
+"""
+To be run on CPython.
+
+Tests the ThreadedCLA wrapper: a stalled peer does not delay the other peers, bundle order per peer is kept,
+full peer queues push back and every send outcome is reported. A failed send makes the router offer the bundle
+to the node again.
+"""
+import threading
+import time
+
+from dtn7zero.configuration import CONFIGURATION
+from dtn7zero.convergence_layer_adapters import PushBasedCLA
+from dtn7zero.convergence_layer_adapters.threaded_cla import ThreadedCLA
+from dtn7zero.data import Node, BundleInformation
+from dtn7zero.routers.simple_epidemic_router import SimpleEpidemicRouter
+from dtn7zero.storage.simple_in_memory_storage import SimpleInMemoryStorage
+from py_dtn7 import Bundle
+from py_dtn7.bundle import PrimaryBlock, BundleAgeBlock, PayloadBlock
+
+
+class SlowPeerCLA(PushBasedCLA):
+    """
+    sends to the 'stalled' peer take as long as the mtcp stalled-send timeout and fail
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.to_receive = [('bundle-1', '10.0.0.9'), ('bundle-2', '10.0.0.9')]
+        self.lock = threading.Lock()
+
+    def poll(self, bundle_id=None, node=None):
+        with self.lock:
+            if self.to_receive:
+                return self.to_receive.pop(0)
+        return None, None
+
+    def send_to(self, node, serialized_bundle):
+        if node.address == 'stalled':
+            time.sleep(CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_STALLED_SEND / 1000)
+            return False
+
+        with self.lock:
+            self.sent.append((node.address, serialized_bundle, time.time()))
+        return True
+
+
+stalled = Node('stalled', (1, '//stalled/'), {}, 0)
+fast_nodes = [Node('10.0.0.{}'.format(i), (1, '//fast-{}/'.format(i)), {}, 0) for i in range(3)]
+
+slow_peer_cla = SlowPeerCLA()
+cla = ThreadedCLA(slow_peer_cla, workers=2)
+
+start = time.time()
+assert cla.send_to(stalled, b'stuck')
+for i in range(10):
+    for node in fast_nodes:
+        assert cla.send_to(node, str(i).encode())
+assert time.time() - start < 0.05  # queueing never blocks the caller
+
+while len(slow_peer_cla.sent) < 30 and time.time() - start < 1:
+    time.sleep(0.01)
+
+assert len(slow_peer_cla.sent) == 30
+assert max(x[2] for x in slow_peer_cla.sent) - start < 0.5  # not delayed by the stalled peer
+for node in fast_nodes:
+    assert [x[1] for x in slow_peer_cla.sent if x[0] == node.address] == [str(i).encode() for i in range(10)]
+
+# the stalled peer is still being served, its queue pushes back once full
+for i in range(CONFIGURATION.THREADED_CLA_MAX_QUEUED_PER_PEER):
+    assert cla.send_to(stalled, b'waiting')
+assert not cla.send_to(stalled, b'rejected')
+assert cla.get_queued_bundles(stalled) == CONFIGURATION.THREADED_CLA_MAX_QUEUED_PER_PEER
+
+reports = cla.poll_delivery_reports()
+assert len(reports) == 30 and all(x[2] for x in reports)
+
+# received bundles are handed over through the queue
+received = []
+while len(received) < 2 and time.time() - start < 2:
+    bundle, address = cla.poll()
+    if bundle is None:
+        time.sleep(0.01)
+    else:
+        received.append(bundle)
+assert received == ['bundle-1', 'bundle-2']
+
+# the stalled send is reported as failed
+while not cla.poll_delivery_reports() and time.time() - start < 5:
+    time.sleep(0.1)
+print('stalled peer reported after {:.1f} s, fast peers done after {:.3f} s'.format(time.time() - start, max(x[2] for x in slow_peer_cla.sent) - start))
+
+cla.close()
+
+# the router processes the reports of the wrapper, the bundle is offered to the stalled node again
+CONFIGURATION.MTCP.TIMEOUT_MILLISECONDS_STALLED_SEND = 100
+
+cla = ThreadedCLA(SlowPeerCLA(), workers=1)
+storage = SimpleInMemoryStorage()
+storage.add_node(stalled)
+router = SimpleEpidemicRouter({CONFIGURATION.IPND.IDENTIFIER_MTCP: cla}, storage)
+
+bundle_information = BundleInformation(Bundle(
+    primary_block=PrimaryBlock.from_objects(full_destination_uri='dtn://stalled/inbox', full_source_uri='dtn://node1/sender'),
+    bundle_age_block=BundleAgeBlock.from_objects(0),
+    payload_block=PayloadBlock.from_objects(data=b'stuck')
+))
+storage.delay_bundle(bundle_information)
+
+assert router.forward_to_node('dtn://node1/', bundle_information, stalled)
+assert bundle_information.is_forwarded_to(stalled)
+
+start = time.time()
+while bundle_information.is_forwarded_to(stalled) and time.time() - start < 2:
+    router.process_delivery_reports()
+    time.sleep(0.01)
+assert not bundle_information.is_forwarded_to(stalled)
+
+cla.close()
+
+print('ok')